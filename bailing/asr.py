@@ -1,9 +1,17 @@
+import multiprocessing
 import os
+import queue
+import tempfile
+import threading
+import time
 import uuid
 import wave
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+import numpy as np
+
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
 
@@ -11,15 +19,26 @@ from bailing import logger
 
 
 class ASR(ABC):
+    @staticmethod
+    def _to_int16(audio_data):
+        """将 bytes 列表或数组统一为一维 int16 数组"""
+        if isinstance(audio_data, np.ndarray):
+            return audio_data.astype(np.int16, copy=False).reshape(-1)
+        return np.frombuffer(b"".join(audio_data), dtype=np.int16)
+
     @staticmethod
     def _save_audio_to_file(audio_data, file_path):
-        """将音频数据保存为WAV文件"""
+        """将音频数据（bytes 列表或 int16 数组）保存为WAV文件"""
         try:
+            if isinstance(audio_data, np.ndarray):
+                frames = audio_data.astype(np.int16, copy=False).tobytes()
+            else:
+                frames = b"".join(audio_data)
             with wave.open(file_path, "wb") as wf:
                 wf.setnchannels(1)
                 wf.setsampwidth(2)
                 wf.setframerate(16000)
-                wf.writeframes(b"".join(audio_data))
+                wf.writeframes(frames)
             logger.info(f"ASR识别文件录音保存到：{file_path}")
         except Exception as e:
             logger.error(f"保存音频文件时发生错误: {e}")
@@ -30,11 +49,54 @@ class ASR(ABC):
         """处理输入音频流并返回识别的文本，子类必须实现"""
         pass
 
+    def warmup(self):
+        """用一段低幅噪声做一次识别，完成模型的首次分配与 JIT"""
+        audio = (np.random.default_rng(0).standard_normal(8000) * 100).astype(np.int16)
+        self.recognizer(audio)
+
+    def recognize_batch(self, batch):
+        """批量识别多段音频，返回 [(text, file), ...]；默认逐段识别"""
+        return [self.recognizer(audio) for audio in batch]
+
+    # 是否支持边说边识别，支持时为 StreamingASR 的子类
+    supports_streaming = False
+
+
+class StreamingASR(ASR):
+    """
+    支持边说边识别的 ASR，一次只能进行一段流式识别。
+    子类的 recognizer 需使用独立的解码状态，不能影响进行中的流式识别。
+    """
+
+    supports_streaming = True
+
+    @abstractmethod
+    def start_stream(self):
+        """开始一段新的流式识别"""
+        pass
+
+    @abstractmethod
+    def accept_stream(self, audio_data):
+        """送入一段音频，返回截至目前的部分识别结果，无新结果时返回 None"""
+        pass
+
+    @abstractmethod
+    def finish_stream(self):
+        """结束当前流式识别，返回 (最终文本, 录音文件)"""
+        pass
+
 
 class FunASR(ASR):
     def __init__(self, config):
         self.model_dir = config.get("model_dir")
         self.output_dir = config.get("output_file")
+        # 是否将识别的语音归档到 output_dir，归档在后台线程中进行，不阻塞识别
+        self.save_audio = config.get("save_audio", False)
+        self._archive_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr-archive")
+            if self.save_audio
+            else None
+        )
 
         self.model = AutoModel(
             model=self.model_dir,
@@ -43,16 +105,113 @@ class FunASR(ASR):
             hub="hf",
             # device="cuda:0",  # 如果有GPU，可以解开这行并指定设备
         )
+        # 旧流程（写临时 WAV 再读回解码）的耗时模型：固定开销（秒）与每采样耗时（秒）
+        self._file_handoff_cost = self._benchmark_file_handoff()
 
-    def recognizer(self, stream_in_audio):
+    def _file_handoff_once(self, audio_int16):
+        """按旧流程写临时 WAV 再读回解码一次，返回耗时（秒）"""
+        directory = (
+            self.output_dir
+            if self.output_dir and os.path.isdir(self.output_dir)
+            else tempfile.gettempdir()
+        )
+        path = os.path.join(directory, f"asr-bench-{uuid.uuid4().hex}.wav")
+        start_time = time.perf_counter()
+        try:
+            with wave.open(path, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(16000)
+                wf.writeframes(audio_int16.tobytes())
+            with wave.open(path, "rb") as wf:
+                frames = wf.readframes(wf.getnframes())
+            np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+            return time.perf_counter() - start_time
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _benchmark_file_handoff(self, repeats=3):
+        """
+        用 1 秒与 10 秒两段音频各测一次旧流程耗时（取多次最小值），拟合出固定开销与每采样耗时，
+        用于估算每段语音内存传入节省的时间。测量失败时返回 None，不影响识别。
+        """
+        sizes = (16000, 160000)
         try:
-            tmpfile = os.path.join(
-                self.output_dir, f"asr-{datetime.now().date()}@{uuid.uuid4().hex}.wav"
+            costs = [
+                min(
+                    self._file_handoff_once(np.zeros(n, dtype=np.int16))
+                    for _ in range(repeats)
+                )
+                for n in sizes
+            ]
+        except OSError as e:
+            logger.warning(f"测量临时文件传入耗时失败: {e}")
+            return None
+        per_sample = max(costs[1] - costs[0], 0.0) / (sizes[1] - sizes[0])
+        fixed = max(costs[0] - per_sample * sizes[0], 0.0)
+        logger.info(
+            f"临时文件传入耗时: 1 秒音频 {costs[0] * 1000:.2f} ms，"
+            f"10 秒音频 {costs[1] * 1000:.2f} ms"
+        )
+        return fixed, per_sample
+
+    def _archive(self, audio_int16):
+        """
+        后台归档录音，立即返回文件路径。
+        文件先写入临时文件，完成后再重命名，写入完成前该路径不存在，存在时内容一定完整。
+        """
+        tmpfile = os.path.join(
+            self.output_dir, f"asr-{datetime.now().date()}@{uuid.uuid4().hex}.wav"
+        )
+
+        def save():
+            start_time = time.time()
+            partial = tmpfile + ".part"
+            try:
+                self._save_audio_to_file(audio_int16, partial)
+                os.replace(partial, tmpfile)
+            except Exception:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                return
+            # 这部分写盘耗时原先位于识别的关键路径上
+            logger.debug(
+                f"ASR录音归档耗时 {(time.time() - start_time) * 1000:.1f} ms，已移出识别关键路径"
+            )
+
+        self._archive_executor.submit(save)
+        return tmpfile
+
+    def _log_in_memory(self, audios, prepare_time):
+        """记录内存传入音频的耗时，与按启动时测得的临时文件耗时估算出的节省时间"""
+        samples = sum(len(audio) for audio in audios)
+        message = (
+            f"ASR音频内存传入耗时 {prepare_time * 1000:.2f} ms，"
+            f"省去 {(samples * 2 + 44 * len(audios)) / 1024:.1f} KB WAV 的写盘与解码"
+        )
+        if self._file_handoff_cost is not None:
+            fixed, per_sample = self._file_handoff_cost
+            file_time = fixed * len(audios) + per_sample * samples
+            message += (
+                f"，临时文件方式约需 {file_time * 1000:.2f} ms，"
+                f"节省约 {(file_time - prepare_time) * 1000:.2f} ms"
             )
-            self._save_audio_to_file(stream_in_audio, tmpfile)
+        logger.info(message)
+
+    def recognizer(self, stream_in_audio):
+        try:
+            prepare_start = time.time()
+            audio_int16 = self._to_int16(stream_in_audio)
+            # 直接传入 float32 波形，省去写入临时文件再由模型读取解码的过程
+            waveform = audio_int16.astype(np.float32) / 32768.0
+            self._log_in_memory([audio_int16], time.time() - prepare_start)
+            tmpfile = self._archive(audio_int16) if self.save_audio else None
 
+            start_time = time.time()
             res = self.model.generate(
-                input=tmpfile,
+                input=waveform,
+                fs=16000,
                 cache={},
                 language="auto",  # 语言选项: "zn", "en", "yue", "ja", "ko", "nospeech"
                 use_itn=True,
@@ -60,13 +219,293 @@ class FunASR(ASR):
             )
 
             text = rich_transcription_postprocess(res[0]["text"])
-            logger.info(f"识别文本: {text}")
+            logger.info(
+                f"识别文本: {text}，音频 {len(audio_int16) / 16000:.2f} 秒，"
+                f"识别耗时 {time.time() - start_time:.3f} 秒"
+            )
             return text, tmpfile
 
         except Exception as e:
             logger.error(f"ASR识别过程中发生错误: {e}")
             return None, None
 
+    def recognize_batch(self, batch):
+        """多段音频合并为一次 generate 调用"""
+        if len(batch) == 1:
+            return [self.recognizer(batch[0])]
+        try:
+            prepare_start = time.time()
+            audios = [self._to_int16(audio) for audio in batch]
+            waveforms = [audio.astype(np.float32) / 32768.0 for audio in audios]
+            self._log_in_memory(audios, time.time() - prepare_start)
+            tmpfiles = [
+                self._archive(audio) if self.save_audio else None for audio in audios
+            ]
+
+            start_time = time.time()
+            res = self.model.generate(
+                input=waveforms,
+                fs=16000,
+                cache={},
+                language="auto",
+                use_itn=True,
+                batch_size=len(audios),
+                batch_size_s=60,
+            )
+
+            texts = [rich_transcription_postprocess(r["text"]) for r in res]
+            logger.info(
+                f"批量识别 {len(audios)} 段音频，识别耗时 {time.time() - start_time:.3f} 秒"
+            )
+            return list(zip(texts, tmpfiles))
+        except Exception as e:
+            logger.error(f"ASR批量识别过程中发生错误: {e}")
+            return [(None, None)] * len(batch)
+
+
+class FunASRStreaming(StreamingASR):
+    """
+    基于 FunASR paraformer 流式模型的识别，说话过程中按 chunk 增量解码，
+    语音结束时只需解码最后不足一个 chunk 的尾部音频。
+    """
+
+    def __init__(self, config):
+        self.model_dir = config.get("model_dir", "paraformer-zh-streaming")
+        # [0, 10, 5] 表示每个 chunk 600ms，向后看 300ms
+        self.chunk_size = config.get("chunk_size", [0, 10, 5])
+        self.encoder_chunk_look_back = config.get("encoder_chunk_look_back", 4)
+        self.decoder_chunk_look_back = config.get("decoder_chunk_look_back", 1)
+        self.chunk_stride = self.chunk_size[1] * 960  # 每个 chunk 的采样点数
+
+        self.model = AutoModel(
+            model=self.model_dir,
+            disable_update=True,
+            hub=config.get("hub", "ms"),
+        )
+        # 麦克风当前进行中的流式识别，None 表示没有
+        self._stream = None
+
+    def _decode(self, stream, audio, is_final):
+        res = self.model.generate(
+            input=audio,
+            cache=stream.cache,
+            is_final=is_final,
+            chunk_size=self.chunk_size,
+            encoder_chunk_look_back=self.encoder_chunk_look_back,
+            decoder_chunk_look_back=self.decoder_chunk_look_back,
+        )
+        text = res[0]["text"] if res else ""
+        if text:
+            stream.texts.append(text)
+        return text
+
+    def _accept(self, stream, audio_data):
+        audio = self._to_int16(audio_data).astype(np.float32) / 32768.0
+        stream.pending = np.concatenate([stream.pending, audio])
+        updated = False
+        while len(stream.pending) >= self.chunk_stride:
+            chunk = stream.pending[: self.chunk_stride]
+            stream.pending = stream.pending[self.chunk_stride :]
+            updated = bool(self._decode(stream, chunk, is_final=False)) or updated
+        return "".join(stream.texts) if updated else None
+
+    def _finish(self, stream):
+        try:
+            end_time = time.time()
+            self._decode(stream, stream.pending, is_final=True)
+            text = "".join(stream.texts)
+            logger.info(
+                f"识别文本: {text}，语音结束后解码耗时 {time.time() - end_time:.3f} 秒，"
+                f"整段流式识别 {end_time - stream.start_time:.2f} 秒"
+            )
+            return text, None
+        except Exception as e:
+            logger.error(f"ASR识别过程中发生错误: {e}")
+            return None, None
+
+    def start_stream(self):
+        self._stream = _StreamState()
+
+    def accept_stream(self, audio_data):
+        if self._stream is None:
+            raise RuntimeError("没有进行中的流式识别")
+        return self._accept(self._stream, audio_data)
+
+    def finish_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return None, None
+        return self._finish(stream)
+
+    def recognizer(self, stream_in_audio):
+        """整段识别使用独立的解码状态，不影响进行中的流式识别"""
+        stream = _StreamState()
+        try:
+            self._accept(stream, stream_in_audio)
+        except Exception as e:
+            logger.error(f"ASR识别过程中发生错误: {e}")
+            return None, None
+        return self._finish(stream)
+
+
+class _StreamState:
+    """一段流式识别的解码状态：模型缓存、未满一个 chunk 的音频与已识别的文本"""
+
+    def __init__(self):
+        self.cache = {}
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.texts = []
+        self.start_time = time.time()
+
+
+class ASRBatchScheduler:
+    """
+    ASR 微批调度器：收集短时间窗口内来自不同会话的识别请求，
+    合并为一次 recognize_batch 调用，再把结果分别返回给各调用方。
+    """
+
+    def __init__(self, asr, window_ms=5, max_batch=16, lock=None):
+        """
+        Args:
+            asr: 提供 recognize_batch 的 ASR 实例
+            window_ms: 收到第一个请求后继续等待其它请求的时间
+            max_batch: 单批最多包含的请求数
+            lock: 与其它调用方共享模型时用于串行调用的锁
+        """
+        self.asr = asr
+        self.lock = lock or threading.Lock()
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.utterances = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, audio):
+        """提交一段音频，返回 Future，结果为 (text, file)"""
+        future = Future()
+        self.requests.put((audio, future))
+        return future
+
+    def recognizer(self, audio):
+        """阻塞式识别，接口与 ASR.recognizer 相同"""
+        return self.submit(audio).result()
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(a, f) for a, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                with self.lock:
+                    results = list(
+                        self.asr.recognize_batch([audio for audio, _ in batch])
+                    )
+                # 结果数量不符时无法对应到请求，整批失败，避免调用方永远等待
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"recognize_batch 返回 {len(results)} 条结果，请求为 {len(batch)} 条"
+                    )
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"ASR批量调度出错: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.utterances += len(batch)
+            logger.debug(
+                f"ASR微批: 本批 {len(batch)} 段，平均批大小 "
+                f"{self.utterances / self.batches:.2f}"
+            )
+
+
+# 进程池中每个工作进程常驻的 ASR 实例
+_worker_asr = None
+
+
+def _init_asr_worker(class_name, config):
+    global _worker_asr
+    _worker_asr = create_instance(class_name, config)
+    _worker_asr.warmup()
+    logger.info(f"ASR工作进程 {os.getpid()} 已加载模型 {class_name}")
+
+
+def _recognize_in_worker(audio):
+    return _worker_asr.recognizer(audio)
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+class ASRWorkerPool:
+    """
+    ASR 识别工作池，识别在独立线程或进程中执行，结果通过 Future 返回，
+    调用方（双工循环）无需等待识别完成即可继续处理 VAD 事件。
+    进程模式下每个工作进程在启动时加载一份模型并常驻，识别不受主进程 GIL 影响。
+    """
+
+    def __init__(self, asr, class_name, config, kind="thread", workers=1, lock=None):
+        """
+        Args:
+            asr: 主进程中的 ASR 实例，线程模式下直接使用，进程模式下为 None
+            class_name: ASR 类名，进程模式下用于在工作进程中创建实例
+            config: ASR 配置
+            kind: thread 或 process
+            workers: 工作线程/进程数；线程模式下各线程共享同一个模型，识别串行执行
+            lock: 线程模式下与其它调用方共享模型时用于串行调用的锁
+        """
+        self.asr = asr
+        self.lock = lock or threading.Lock()
+        self.kind = kind
+        if kind == "process":
+            # 工作池在其它线程加载模型时创建，fork 可能复制被持有的锁导致死锁，使用 spawn 启动
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_asr_worker,
+                initargs=(class_name, config),
+            )
+            # 提前拉起所有工作进程，让模型在启动阶段而不是第一次识别时加载
+            for future in [self.executor.submit(_worker_ready) for _ in range(workers)]:
+                future.result()
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="asr-worker"
+            )
+        else:
+            raise ValueError(f"Unknown ASR worker type {kind}")
+
+    def submit(self, audio):
+        """提交一段 int16 音频，返回结果为 (text, file) 的 Future"""
+        if self.kind == "process":
+            return self.executor.submit(_recognize_in_worker, audio)
+        return self.executor.submit(self._recognize, audio)
+
+    def _recognize(self, audio):
+        with self.lock:
+            return self.asr.recognizer(audio)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
@@ -76,3 +515,53 @@ def create_instance(class_name, *args, **kwargs):
         return cls(*args, **kwargs)
     else:
         raise ValueError(f"Class {class_name} not found")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ASR 微批调度吞吐与延迟测试")
+    parser.add_argument("--model-dir", default="FunAudioLLM/SenseVoiceSmall")
+    parser.add_argument("--wav", help="16kHz 单声道测试音频，默认使用 3 秒合成噪声")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--utterances", type=int, default=8, help="每路请求次数")
+    parser.add_argument("--window-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    if args.wav:
+        with wave.open(args.wav, "rb") as wf:
+            test_audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    else:
+        test_audio = (np.random.default_rng(0).standard_normal(48000) * 1000).astype(
+            np.int16
+        )
+
+    funasr = FunASR({"model_dir": args.model_dir, "output_file": "tmp/"})
+    funasr.recognizer(test_audio)  # 预热
+
+    def run(scheduler, streams):
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(args.utterances):
+                t = time.perf_counter()
+                scheduler.recognizer(test_audio)
+                with lock:
+                    latencies.append(time.perf_counter() - t)
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(streams)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        elapsed = time.perf_counter() - start
+        return len(latencies) / elapsed, np.percentile(latencies, 95) * 1000
+
+    print(f"{'streams':>8} {'mode':>10} {'utt/s':>8} {'p95 ms':>9}")
+    for streams in args.streams:
+        for mode, max_batch in (("unbatched", 1), ("batched", streams)):
+            scheduler = ASRBatchScheduler(funasr, args.window_ms, max_batch)
+            throughput, p95 = run(scheduler, streams)
+            print(f"{streams:>8} {mode:>10} {throughput:>8.2f} {p95:>9.1f}")
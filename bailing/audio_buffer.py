@@ -0,0 +1,154 @@
+import threading
+
+import numpy as np
+
+from bailing import logger
+
+
+class AudioRingBuffer:
+    """
+    预分配的 int16 环形缓冲区，用于录音线程与 VAD 线程之间传递音频帧。
+
+    单生产者/单消费者：写线程只修改 write_seq，读线程只修改 read_seq，
+    两者都是单调递增的帧序号，依靠 GIL 保证整数赋值的原子性，无需加锁。
+    读线程无数据时阻塞在条件变量上，由写线程写入整帧后唤醒，空闲时不占用 CPU。
+    读取返回的是缓冲区内部的视图（零拷贝），在被覆盖前（capacity 帧内）有效。
+    """
+
+    def __init__(self, capacity=1875, frame_size=512):
+        """
+        Args:
+            capacity: 缓冲区可容纳的帧数，默认 1875 帧（16kHz 下约 60 秒）
+            frame_size: 每帧采样点数
+        """
+        self.capacity = capacity
+        self.frame_size = frame_size
+        self._data_ready = threading.Condition()
+        # 同时等待多个缓冲区的读线程（如批量 VAD）注册的事件，有新数据时置位
+        self._listeners = []
+        self._buf = np.zeros((capacity, frame_size), dtype=np.int16)
+        # 下一个写入/读取的帧序号
+        self.write_seq = 0
+        self.read_seq = 0
+        # 读线程落后超过 capacity 时被覆盖丢弃的次数与帧数
+        self.overruns = 0
+        self.dropped_frames = 0
+        # 读取时观察到的最大积压帧数
+        self.high_water = 0
+        # 不足一帧的尾部数据，等待下一次写入补齐
+        self._pending = np.zeros(frame_size, dtype=np.int16)
+        self._pending_len = 0
+
+    def put(self, data):
+        """写入 PCM 数据（bytes 或 int16 数组），接口与 queue.Queue.put 兼容"""
+        samples = (
+            data.reshape(-1)
+            if isinstance(data, np.ndarray)
+            else np.frombuffer(data, dtype=np.int16)
+        )
+        written = self.write_seq
+        if self._pending_len:
+            need = self.frame_size - self._pending_len
+            take = samples[:need]
+            self._pending[self._pending_len : self._pending_len + len(take)] = take
+            self._pending_len += len(take)
+            samples = samples[len(take) :]
+            if self._pending_len < self.frame_size:
+                return
+            self._write_frame(self._pending)
+            self._pending_len = 0
+
+        full = len(samples) // self.frame_size
+        for i in range(full):
+            self._write_frame(samples[i * self.frame_size : (i + 1) * self.frame_size])
+
+        rest = samples[full * self.frame_size :]
+        if len(rest):
+            self._pending[: len(rest)] = rest
+            self._pending_len = len(rest)
+        if self.write_seq != written:
+            self._notify()
+
+    def add_listener(self, event):
+        """注册一个 threading.Event，有新数据或缓冲区刷新时置位"""
+        self._listeners.append(event)
+        event.set()
+
+    def _notify(self):
+        with self._data_ready:
+            self._data_ready.notify_all()
+        for event in self._listeners:
+            event.set()
+
+    def _write_frame(self, frame):
+        self._buf[self.write_seq % self.capacity] = frame
+        self.write_seq += 1
+
+    def flush(self):
+        """将不足一帧的尾部数据补零后写入，并唤醒等待的读线程（流结束时调用）"""
+        if self._pending_len:
+            self._pending[self._pending_len :] = 0
+            self._write_frame(self._pending)
+            self._pending_len = 0
+        self._notify()
+
+    def qsize(self):
+        """尚未读取的帧数"""
+        return min(self.write_seq - self.read_seq, self.capacity)
+
+    def empty(self):
+        return self.write_seq == self.read_seq
+
+    def get(self, timeout=None):
+        """
+        读取下一帧，返回 (seq, view)。view 为缓冲区内部视图，不做拷贝。
+        无数据时阻塞等待写线程唤醒，超时返回 (None, None)。
+        """
+        if self.write_seq == self.read_seq:
+            with self._data_ready:
+                if not self._data_ready.wait_for(
+                    lambda: self.write_seq != self.read_seq, timeout
+                ):
+                    return None, None
+
+        lag = self.write_seq - self.read_seq
+        self.high_water = max(self.high_water, lag)
+        if lag > self.capacity:
+            # 读线程落后太多，最旧的数据已被覆盖，跳到仍然有效的最早一帧
+            dropped = lag - self.capacity
+            self.overruns += 1
+            self.dropped_frames += dropped
+            self.read_seq += dropped
+            logger.warning(f"音频缓冲区溢出，丢弃 {dropped} 帧")
+
+        seq = self.read_seq
+        self.read_seq += 1
+        return seq, self._buf[seq % self.capacity]
+
+    def is_valid(self, seq):
+        """该序号的帧是否仍在缓冲区中（未被覆盖）"""
+        return self.write_seq - self.capacity <= seq < self.write_seq
+
+    def frame(self, seq):
+        """按序号获取单帧视图"""
+        if not self.is_valid(seq):
+            raise IndexError(f"frame {seq} is no longer buffered")
+        return self._buf[seq % self.capacity]
+
+    def gather(self, seqs):
+        """按序号列表拼接音频，返回一维 int16 数组（一次性拷贝），已被覆盖的帧会被跳过"""
+        valid = [s for s in seqs if self.is_valid(s)]
+        if len(valid) < len(seqs):
+            logger.warning(f"语音片段过长，{len(seqs) - len(valid)} 帧已被覆盖")
+        if not valid:
+            return np.zeros(0, dtype=np.int16)
+        return self._buf[np.asarray(valid) % self.capacity].reshape(-1)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "backlog": self.qsize(),
+            "overruns": self.overruns,
+            "dropped_frames": self.dropped_frames,
+            "high_water": self.high_water,
+        }
@@ -1,9 +1,25 @@
 import os.path
+import re
+import threading
 import uuid
 from typing import List, Dict
 from datetime import datetime
 from bailing.utils import write_json_file
+from bailing import logger
 
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text) -> int:
+    """
+    估算文本的 token 数，不依赖具体模型的分词器：
+    中文字符约 0.6 个 token，其它字符约 0.3 个 token，另加每条消息的格式开销
+    """
+    if not text:
+        return 4
+    text = str(text)
+    cjk = len(_CJK_PATTERN.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 4
 
 
 class Message:
@@ -30,38 +46,214 @@ class Message:
         self.vad_status = vad_status
         self.tool_calls = tool_calls
         self.tool_call_id = tool_call_id
+        self._token_count = None
+
+    @property
+    def token_count(self) -> int:
+        """消息的估算 token 数，首次访问时计算并缓存"""
+        if self._token_count is None:
+            content = self.content if self.tool_calls is None else str(self.tool_calls)
+            self._token_count = estimate_tokens(content)
+        return self._token_count
+
+    def to_llm(self) -> Dict[str, str]:
+        if self.tool_calls is not None:
+            return {"role": self.role, "tool_calls": self.tool_calls}
+        if self.role == "tool":
+            return {
+                "role": self.role,
+                "tool_call_id": self.tool_call_id,
+                "content": self.content,
+            }
+        return {"role": self.role, "content": self.content}
 
 
 class Dialogue:
-    def __init__(self, dialogue_history_path):
+    """
+    对话历史。self.dialogue 保存完整历史（用于落盘），发送给 LLM 的是按 token 预算裁剪后的窗口。
+
+    超出 max_tokens 时从最早的轮次开始丢弃，一次裁剪到 max_tokens * keep_ratio，
+    之后的若干轮只在窗口末尾追加，消息前缀保持不变，也不必每轮重新序列化。
+    policy 为 summarize 时，被丢弃的轮次交给 summarizer 在后台生成摘要，作为系统消息放在窗口开头。
+    """
+
+    POLICIES = ("truncate", "summarize")
+
+    def __init__(
+        self,
+        dialogue_history_path,
+        max_tokens=None,
+        policy="truncate",
+        keep_ratio=0.6,
+        summarizer=None,
+    ):
+        """
+        Args:
+            dialogue_history_path: 对话记录保存目录
+            max_tokens: 发送给 LLM 的上下文 token 上限，None 表示不限制
+            policy: 超出预算时的处理方式，truncate 直接丢弃，summarize 丢弃并生成摘要
+            keep_ratio: 裁剪后保留的 token 比例
+            summarizer: 摘要函数 (previous_summary, dropped_text) -> summary，
+                policy 为 summarize 时使用
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown dialogue policy {policy}, expected {self.POLICIES}"
+            )
         self.dialogue_history_path = dialogue_history_path
         self.dialogue: List[Message] = []
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.keep_ratio = keep_ratio
+        self.summarizer = summarizer
         # 获取当前时间
         self.current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+        self._lock = threading.Lock()
+        # 窗口中第一条非系统消息在 self.dialogue 中的下标
+        self._window_start = 0
+        # 窗口已序列化到的下标，以及序列化结果与 token 合计
+        self._serialized_upto = 0
+        self._serialized: List[Dict[str, str]] = []
+        self._window_tokens = 0
+        self.summary = ""
+        self._summary_tokens = 0
+        self._summarizing = False
+        self._pending_summary: List[Message] = []
+        self.trimmed_messages = 0
+
     def put(self, message: Message):
         self.dialogue.append(message)
 
-    def get_llm_dialogue(self) -> List[Dict[str, str]]:
-        dialogue = []
-        for m in self.dialogue:
-            if m.tool_calls is not None:
-                dialogue.append({"role": m.role, "tool_calls": m.tool_calls})
-            elif m.role == "tool":
-                dialogue.append(
-                    {
-                        "role": m.role,
-                        "tool_call_id": m.tool_call_id,
-                        "content": m.content,
-                    }
-                )
+    def set_system(self, content: str):
+        """设置（或替换）开头的系统提示词"""
+        with self._lock:
+            message = Message(role="system", content=content)
+            if self.dialogue and self.dialogue[0].role == "system":
+                self.dialogue[0] = message
             else:
-                dialogue.append({"role": m.role, "content": m.content})
-        return dialogue
+                # 系统提示词不进入增量序列化的窗口，插入后下标整体后移
+                self.dialogue.insert(0, message)
+                self._window_start += 1
+                self._serialized_upto += 1
+
+    def _header(self, include_summary: bool = True) -> List[Dict[str, str]]:
+        """窗口开头固定的系统提示词与历史摘要"""
+        header = []
+        if self.dialogue and self.dialogue[0].role == "system":
+            header.append(self.dialogue[0].to_llm())
+        if include_summary and self.summary:
+            header.append(
+                {"role": "system", "content": f"更早的对话摘要:\n{self.summary}"}
+            )
+        return header
+
+    def _header_tokens(self) -> int:
+        tokens = self._summary_tokens
+        if self.dialogue and self.dialogue[0].role == "system":
+            tokens += self.dialogue[0].token_count
+        return tokens
+
+    def get_llm_dialogue(self, include_summary: bool = True) -> List[Dict[str, str]]:
+        """
+        返回发送给 LLM 的消息列表。include_summary 为 False 时不在开头插入更早的对话摘要，
+        由调用方放到历史之后，避免摘要更新改变前缀。
+        """
+        with self._lock:
+            if (
+                self._serialized_upto == 0
+                and self.dialogue
+                and self.dialogue[0].role == "system"
+            ):
+                # 通过 put 加入的系统提示词
+                self._window_start = self._serialized_upto = 1
+            # 增量序列化新追加的消息
+            for m in self.dialogue[self._serialized_upto :]:
+                self._serialized.append(m.to_llm())
+                self._window_tokens += m.token_count
+            self._serialized_upto = len(self.dialogue)
+            if (
+                self.max_tokens
+                and self._header_tokens() + self._window_tokens > self.max_tokens
+            ):
+                self._trim()
+            return self._header(include_summary) + self._serialized
+
+    def _trim(self):
+        """
+        从最早的轮次开始丢弃，直到窗口降到 max_tokens * keep_ratio。
+        只在用户消息处截断，保证工具调用与其结果成组保留。
+        """
+        target = int(self.max_tokens * self.keep_ratio) - self._header_tokens()
+        end = len(self.dialogue)
+        # 当前这一轮（最后一条用户消息及之后）始终保留
+        last_user = end - 1
+        while (
+            last_user > self._window_start and self.dialogue[last_user].role != "user"
+        ):
+            last_user -= 1
+        cut = self._window_start
+        tokens = self._window_tokens
+        while cut < last_user and (
+            tokens > target or self.dialogue[cut].role != "user"
+        ):
+            tokens -= self.dialogue[cut].token_count
+            cut += 1
+        if cut == self._window_start:
+            logger.warning(
+                f"对话上下文约 {self._window_tokens} tokens，超过预算 {self.max_tokens}，但没有可丢弃的历史轮次"
+            )
+            return
+        dropped = self.dialogue[self._window_start : cut]
+        self._serialized = self._serialized[cut - self._window_start :]
+        self._window_start = cut
+        self._window_tokens = tokens
+        self.trimmed_messages += len(dropped)
+        logger.info(
+            f"对话上下文超过 {self.max_tokens} tokens，丢弃最早的 {len(dropped)} 条消息，剩余约 {tokens} tokens"
+        )
+        if self.policy == "summarize" and self.summarizer is not None:
+            self._summarize(dropped)
+
+    def _summarize(self, dropped: List[Message]):
+        """在后台线程中把被丢弃的消息合并进历史摘要，完成前窗口按直接截断处理"""
+        if self._summarizing:
+            # 上一次摘要尚未完成，本次丢弃的内容并入下一次摘要
+            self._pending_summary.extend(dropped)
+            return
+        self._summarizing = True
+        self._pending_summary = list(dropped)
+
+        def run():
+            while True:
+                with self._lock:
+                    messages, self._pending_summary = self._pending_summary, []
+                    if not messages:
+                        self._summarizing = False
+                        return
+                    previous = self.summary
+                text = "\n".join(
+                    f"{m.role}: {m.content}"
+                    for m in messages
+                    if m.role in ("user", "assistant") and m.content
+                )
+                try:
+                    summary = self.summarizer(previous, text)
+                except Exception as e:
+                    logger.error(f"对话摘要生成失败: {e}")
+                    summary = None
+                if summary:
+                    with self._lock:
+                        self.summary = summary.strip()
+                        self._summary_tokens = estimate_tokens(self.summary)
+                    logger.info(f"对话摘要已更新，长度 {len(self.summary)}")
+
+        threading.Thread(target=run, daemon=True).start()
 
     def dump_dialogue(self):
+        """保存完整的对话历史，不受上下文窗口裁剪影响"""
         dialogue = []
-        for d in self.get_llm_dialogue():
+        for d in (m.to_llm() for m in self.dialogue):
             if d["role"] not in ("user", "assistant"):
                 continue
             dialogue.append(d)
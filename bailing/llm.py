@@ -1,18 +1,37 @@
 from abc import ABC, abstractmethod
+import bisect
+import queue
+import threading
+import time
+from collections import deque
+
 import openai
 
 
-from bailing import logger
+from bailing import logger, transport
+from bailing.utils import CancellationToken
+
+
+class IncompleteStreamError(RuntimeError):
+    """流式响应在收到 finish_reason 之前结束（连接中断或服务端异常）"""
 
 
 class LLM(ABC):
+    # 最近一次 response 的错误（请求失败或流式输出中断），正常结束时为 None
+    last_error = None
+
     @abstractmethod
-    def response(self, dialogue):
+    def response(self, dialogue, cancel_token=None):
+        """流式返回回复内容，cancel_token 被取消时应尽快停止生成"""
         pass
 
-    def response_call(self, dialogue, functions_call):
+    def warmup(self):
+        """提前建立到服务端的连接，默认不做任何操作"""
+        pass
+
+    def response_call(self, dialogue, functions_call, cancel_token=None):
         # 默认降级实现：直接调用 response，tool_calls 设为 None
-        for chunk in self.response(dialogue):
+        for chunk in self.response(dialogue, cancel_token):
             yield chunk, None
 
 
@@ -21,41 +40,362 @@ class OpenAILLM(LLM):
         self.model_name = config.get("model_name")
         self.api_key = config.get("api_key")
         self.base_url = config.get("url")
-        self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # 复用共享连接池，多轮对话之间保持长连接
+        self.client = openai.OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=transport.get_client(),
+            max_retries=config.get("max_retries", openai.DEFAULT_MAX_RETRIES),
+        )
+        # 流式响应末尾附带 token 用量（含缓存命中数），部分兼容服务不支持时可关闭
+        self.include_usage = config.get("include_usage", False)
+        self.last_usage = None
+        self.usage_totals = {
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
         # 检查是否支持 function call
         self.supports_function_call = True
         # 可以根据模型名或配置判断是否支持 function call
         # 这里假设所有 openai 模型都支持，如需更细致可扩展
 
-    def response(self, dialogue):
+    def warmup(self):
+        transport.prewarm(self.client.base_url)
+
+    @staticmethod
+    def _stream(responses, cancel_token):
+        """遍历流式响应，取消时从打断线程直接关闭 HTTP 流，不再等待剩余 token"""
+        if cancel_token is not None:
+            cancel_token.add_callback(responses.close)
         try:
-            responses = self.client.chat.completions.create(
-                model=self.model_name, messages=dialogue, stream=True
-            )
             for chunk in responses:
-                yield chunk.choices[0].delta.content
+                if cancel_token is not None and cancel_token.cancelled:
+                    break
+                yield chunk
+        except Exception:
+            if cancel_token is None or not cancel_token.cancelled:
+                raise
+        finally:
+            responses.close()
+        if cancel_token is not None and cancel_token.cancelled:
+            logger.info("LLM 流式输出已取消")
+
+    @staticmethod
+    def _cached_tokens(usage):
+        """服务端前缀缓存命中的 token 数：OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return cached or 0
+
+    def _record_usage(self, usage):
+        cached = self._cached_tokens(usage)
+        self.last_usage = {
+            "prompt_tokens": usage.prompt_tokens,
+            "cached_tokens": cached,
+            "completion_tokens": usage.completion_tokens,
+        }
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] += value or 0
+        hit_ratio = cached / usage.prompt_tokens if usage.prompt_tokens else 0
+        total_ratio = (
+            self.usage_totals["cached_tokens"] / self.usage_totals["prompt_tokens"]
+            if self.usage_totals["prompt_tokens"]
+            else 0
+        )
+        logger.info(
+            f"LLM token 用量: prompt={usage.prompt_tokens}（缓存命中 {cached}，{hit_ratio:.0%}），"
+            f"completion={usage.completion_tokens}，累计缓存命中率 {total_ratio:.0%}"
+        )
+
+    def _create(self, dialogue, **kwargs):
+        if self.include_usage:
+            kwargs["stream_options"] = {"include_usage": True}
+        return self.client.chat.completions.create(
+            model=self.model_name, messages=dialogue, stream=True, **kwargs
+        )
+
+    def _deltas(self, responses, cancel_token):
+        """
+        逐个返回增量内容；用量统计位于最后一个 choices 为空的分片中。
+        未取消却没有收到 finish_reason 时抛出 IncompleteStreamError。
+        """
+        finished = False
+        for chunk in self._stream(responses, cancel_token):
+            if getattr(chunk, "usage", None):
+                self._record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                finished = True
+            yield chunk.choices[0].delta
+        if not finished and (cancel_token is None or not cancel_token.cancelled):
+            raise IncompleteStreamError("流式响应在 finish_reason 之前结束")
+
+    def response(self, dialogue, cancel_token=None):
+        self.last_error = None
+        try:
+            responses = self._create(dialogue)
+            for delta in self._deltas(responses, cancel_token):
+                yield delta.content
         except Exception as e:
+            self.last_error = e
             logger.error(f"Error in response generation: {e}")
 
-    def response_call(self, dialogue, functions_call):
+    def response_call(self, dialogue, functions_call, cancel_token=None):
         if not getattr(self, "supports_function_call", True):
             # 不支持 function call，降级为普通 response
-            for chunk in self.response(dialogue):
+            for chunk in self.response(dialogue, cancel_token):
                 yield chunk, None
             return
+        self.last_error = None
         try:
-            responses = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=dialogue,
-                stream=True,
-                tools=functions_call,
-            )
-            for chunk in responses:
-                yield chunk.choices[0].delta.content, chunk.choices[0].delta.tool_calls
+            responses = self._create(dialogue, tools=functions_call)
+            for delta in self._deltas(responses, cancel_token):
+                yield delta.content, delta.tool_calls
         except Exception as e:
+            self.last_error = e
             logger.error(f"Error in response generation: {e}")
 
 
+class TTFTHistogram:
+    """首 token 延迟统计：固定分桶计数，外加最近若干次样本用于计算分位数"""
+
+    BUCKETS_MS = (100, 200, 300, 500, 800, 1200, 2000, 3000, 5000)
+
+    def __init__(self, window=200):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.samples = deque(maxlen=window)
+        self.failures = 0
+
+    def record(self, ttft_ms):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ttft_ms)] += 1
+        self.samples.append(ttft_ms)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def summary(self):
+        labels = [f"<={b}" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}"]
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "count": len(self.samples),
+            "failures": self.failures,
+            "p50_ms": round(p50) if p50 is not None else None,
+            "p95_ms": round(p95) if p95 is not None else None,
+            "buckets": {k: v for k, v in zip(labels, self.counts) if v},
+        }
+
+
+class HedgedLLM(LLM):
+    """
+    多服务商对冲请求：先向首选服务商发起请求，超过 hedge_after_ms 仍未收到首 token
+    （或请求出错）时再向下一个服务商发起同样的请求，采用最先返回首 token 的流，其余请求立即取消。
+    hedge_after_ms 为 0 时同时向 max_parallel 个服务商发起请求。
+
+    各服务商的首 token 延迟记录在 TTFTHistogram 中，adaptive_order 开启时按 p50 从低到高决定发起顺序。
+
+    被取消的请求如果还在等待响应头，只能等到收到响应头后才能关闭，因此每个请求设置 attempt_timeout
+    （连接与两次读取之间的最长等待），并用 max_inflight 限制包括这类残留请求在内的并发请求数，
+    达到上限时不再发起对冲请求。
+    胜出的流在输出过程中出错时不会切换到其它服务商：已输出的内容可能已经在播放，
+    重新请求会重复播放，此时记录错误并结束本轮回复。
+    """
+
+    def __init__(self, config):
+        self.providers = []
+        for provider_config in config.get("providers") or []:
+            # 出错时由下一个服务商补上，不在单个服务商上重试
+            provider = OpenAILLM({"max_retries": 0, **provider_config})
+            provider.name = provider_config.get("name") or provider.base_url
+            self.providers.append(provider)
+        if not self.providers:
+            raise ValueError("HedgedLLM requires at least one provider")
+        self.hedge_after = config.get("hedge_after_ms", 800) / 1000
+        self.max_parallel = config.get("max_parallel", len(self.providers))
+        self.attempt_timeout = config.get("attempt_timeout", 10)
+        self.max_inflight = config.get("max_inflight", self.max_parallel * 2)
+        # 仍在运行的请求线程数，包括已取消但尚未收到响应头的请求
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self.adaptive_order = config.get("adaptive_order", True)
+        self.stats_interval = config.get("stats_interval", 20)
+        self.histograms = {p.name: TTFTHistogram() for p in self.providers}
+        self.wins = {p.name: 0 for p in self.providers}
+        self.requests = 0
+        self.base_url = self.providers[0].base_url
+        self.supports_function_call = True
+
+    def warmup(self):
+        for provider in self.providers:
+            provider.warmup()
+
+    def _ordered_providers(self):
+        if not self.adaptive_order:
+            return list(self.providers)
+
+        def key(item):
+            index, provider = item
+            p50 = self.histograms[provider.name].percentile(50)
+            # 还没有样本的服务商保持配置顺序
+            return (p50 is None, p50 or 0, index)
+
+        return [p for _, p in sorted(enumerate(self.providers), key=key)]
+
+    def _attempt(self, index, provider, dialogue, events, token, kwargs):
+        """在线程中执行一次请求，把增量内容和结束/出错事件放入 events"""
+        start_time = time.time()
+        first = True
+        try:
+            responses = provider._create(
+                dialogue, timeout=self.attempt_timeout, **kwargs
+            )
+            for delta in provider._deltas(responses, token):
+                if first and (delta.content or delta.tool_calls):
+                    first = False
+                    ttft_ms = (time.time() - start_time) * 1000
+                    self.histograms[provider.name].record(ttft_ms)
+                    events.put((index, "first", ttft_ms))
+                events.put((index, "delta", delta))
+            events.put((index, "done", None))
+        except Exception as e:
+            if not token.cancelled:
+                self.histograms[provider.name].failures += 1
+            events.put((index, "error", e))
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+
+    def _race(self, dialogue, cancel_token, **kwargs):
+        """对冲发起请求，返回胜出请求的增量内容"""
+        self.last_error = None
+        providers = self._ordered_providers()
+        events = queue.Queue()
+        tokens = []
+        buffered = {}
+        finished = set()
+        winner = None
+
+        def launch():
+            index = len(tokens)
+            with self._inflight_lock:
+                self._inflight += 1
+            token = CancellationToken()
+            tokens.append(token)
+            buffered[index] = []
+            threading.Thread(
+                target=self._attempt,
+                args=(index, providers[index], dialogue, events, token, kwargs),
+                daemon=True,
+            ).start()
+            if index:
+                logger.info(
+                    f"对冲请求：向 {providers[index].name} 发起第 {index + 1} 个请求"
+                )
+
+        def cancel_all():
+            for token in tokens:
+                token.cancel()
+
+        if cancel_token is not None:
+            cancel_token.add_callback(cancel_all)
+        limit = min(self.max_parallel, len(providers))
+        launch()
+        while not self.hedge_after and len(tokens) < limit:
+            launch()
+        deadline = time.time() + self.hedge_after
+
+        try:
+            while winner is None:
+                if cancel_token is not None and cancel_token.cancelled:
+                    return
+                can_hedge = len(tokens) < limit
+                timeout = max(0, deadline - time.time()) if can_hedge else None
+                try:
+                    index, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    if self._inflight >= self.max_inflight:
+                        logger.warning(
+                            f"进行中的请求已达 {self.max_inflight} 个，暂不发起对冲请求"
+                        )
+                        deadline = time.time() + self.hedge_after
+                        continue
+                    launch()
+                    deadline = time.time() + self.hedge_after
+                    continue
+                if kind == "first":
+                    winner = index
+                elif kind == "delta":
+                    buffered[index].append(payload)
+                else:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        return
+                    finished.add(index)
+                    if kind == "error":
+                        logger.warning(f"{providers[index].name} 请求失败: {payload}")
+                    if len(finished) == len(tokens):
+                        if not can_hedge:
+                            logger.error("所有服务商均未返回内容")
+                            self.last_error = RuntimeError("所有服务商均未返回内容")
+                            return
+                        # 出错的请求立即由下一个服务商补上
+                        launch()
+                        deadline = time.time() + self.hedge_after
+
+            for index, token in enumerate(tokens):
+                if index != winner:
+                    token.cancel()
+            name = providers[winner].name
+            self.wins[name] += 1
+            self.requests += 1
+            logger.debug(f"对冲请求由 {name} 胜出（共发起 {len(tokens)} 个请求）")
+            if self.stats_interval and self.requests % self.stats_interval == 0:
+                self.log_stats()
+
+            yield from buffered[winner]
+            while True:
+                index, kind, payload = events.get()
+                if cancel_token is not None and cancel_token.cancelled:
+                    return
+                if index != winner:
+                    continue
+                if kind == "delta":
+                    yield payload
+                elif kind == "error":
+                    if not tokens[winner].cancelled:
+                        # 已输出的内容可能已在播放，不切换服务商重新请求
+                        logger.error(f"{name} 流式输出中断，不再切换服务商: {payload}")
+                        self.last_error = payload
+                    return
+                elif kind == "done":
+                    return
+        finally:
+            cancel_all()
+
+    def response(self, dialogue, cancel_token=None):
+        for delta in self._race(dialogue, cancel_token):
+            yield delta.content
+
+    def response_call(self, dialogue, functions_call, cancel_token=None):
+        for delta in self._race(dialogue, cancel_token, tools=functions_call):
+            yield delta.content, delta.tool_calls
+
+    def stats(self):
+        return {
+            name: {**histogram.summary(), "wins": self.wins[name]}
+            for name, histogram in self.histograms.items()
+        }
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            logger.info(f"服务商 {name} 首 token 延迟统计: {stats}")
+
+
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
     cls = globals().get(class_name)
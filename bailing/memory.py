@@ -7,7 +7,7 @@ import openai
 
 from bailing.utils import read_json_file, write_json_file
 
-from bailing import logger
+from bailing import logger, transport
 
 memory_prompt_template = """
 你是一个对话记录员，负责提取和记录用户与助手之间的对话信息。请根据以下内容生成最新、最完整的对话摘要，突出与用户相关的有用信息，并确保摘要不超过800个字。历史对话摘要包含了之前记录的对话摘要，涉及用户的需求、偏好和关键问题。最近一次对话历史是最近的对话记录，包含用户和助手之间的具体交流内容。
@@ -25,6 +25,16 @@ ${dialogue_history}
 - 输出对话摘要，用户对话偏好，用户对话风格，以及下次应该采取的对话策略
 """
 
+dialogue_summary_template = """
+请把下面的对话内容合并进已有的对话摘要，生成一份新的摘要，保留用户的需求、偏好、关键事实和尚未解决的问题，不超过300个字，只输出摘要内容。
+
+# 已有对话摘要
+${summary}
+
+# 新的对话内容
+${dialogue}
+"""
+
 
 class Memory:
     def __init__(self, config):
@@ -38,7 +48,11 @@ class Memory:
         self.model_name = config.get("model_name")
         self.api_key = config.get("api_key")
         self.base_url = config.get("url")
-        self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = openai.OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=transport.get_client(),
+        )
 
         self.read_dialogues_in_order(file_path)
 
@@ -69,6 +83,20 @@ class Memory:
             self.memory["history_memory_file"].append(file_name)
             self.memory["memory"] = new_memory
 
+    def summarize(self, summary, dialogue_text):
+        """把当前会话中被移出上下文窗口的对话合并进会话内摘要，供 Dialogue 的 summarize 策略使用"""
+        prompt = (
+            dialogue_summary_template.replace("${summary}", summary or "无")
+            .replace("${dialogue}", dialogue_text)
+            .strip()
+        )
+        responses = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            stream=False,
+        )
+        return responses.choices[0].message.content
+
     @staticmethod
     def extract_time_from_filename(filename):
         """从文件名中提取时间信息"""
@@ -3,16 +3,13 @@ import queue
 import subprocess
 import threading
 import wave
-import pyaudio
-from pydub import AudioSegment
-import pygame
-import sounddevice as sd
 import numpy as np
-from playsound3 import playsound
 
 
 from bailing import logger
 
+# 各播放器的第三方依赖在类初始化时按需导入，未选用的播放器缺少依赖不影响其它播放器
+
 
 class AbstractPlayer(object):
     def __init__(self, *args, **kwargs):
@@ -20,11 +17,15 @@ class AbstractPlayer(object):
         self.is_playing = False
         self.play_queue = queue.Queue()
         self._stop_event = threading.Event()
+        # 打断当前正在播放的音频，支持分块播放的子类在播放过程中检查
+        self._interrupt = threading.Event()
         self.consumer_thread = threading.Thread(target=self._playing)
         self.consumer_thread.start()
 
     @staticmethod
     def to_wav(audio_file):
+        from pydub import AudioSegment
+
         tmp_file = audio_file + ".wav"
         wav_file = AudioSegment.from_file(audio_file)
         wav_file.export(tmp_file, format="wav")
@@ -34,6 +35,7 @@ class AbstractPlayer(object):
         while not self._stop_event.is_set():
             data = self.play_queue.get()
             self.is_playing = True
+            self._interrupt.clear()
             try:
                 self.do_playing(data)
             except Exception as e:
@@ -47,8 +49,18 @@ class AbstractPlayer(object):
         audio_file = self.to_wav(data)
         self.play_queue.put(audio_file)
 
+    def play_stream(self, stream):
+        """
+        播放流式合成的音频。默认等待合成完成后按文件播放，
+        支持分块写入的播放器覆盖此方法，收到第一个音频块即开始播放。
+        """
+        audio_file = stream.wait()
+        if audio_file is not None:
+            self.play(audio_file)
+
     def stop(self):
         self._clear_queue()
+        self._interrupt.set()
 
     def shutdown(self):
         self._clear_queue()
@@ -71,6 +83,8 @@ class AbstractPlayer(object):
 
 class CmdPlayer(AbstractPlayer):
     def __init__(self, *args, **kwargs):
+        import pyaudio
+
         super(CmdPlayer, self).__init__(*args, **kwargs)
         self.p = pyaudio.PyAudio()
 
@@ -79,7 +93,13 @@ class CmdPlayer(AbstractPlayer):
         cmd = ["afplay", audio_file] if system == "Darwin" else ["play", audio_file]
         logger.debug(f"Executing command: {' '.join(cmd)}")
         try:
-            subprocess.run(cmd, shell=False, universal_newlines=True)
+            process = subprocess.Popen(cmd, shell=False, universal_newlines=True)
+            while process.poll() is None:
+                if self._interrupt.wait(0.05):
+                    process.terminate()
+                    process.wait()
+                    logger.debug(f"播放被打断：{audio_file}")
+                    return
             logger.debug(f"播放完成：{audio_file}")
         except subprocess.CalledProcessError as e:
             logger.error(f"命令执行失败: {e}")
@@ -89,10 +109,36 @@ class CmdPlayer(AbstractPlayer):
 
 class PyaudioPlayer(AbstractPlayer):
     def __init__(self, *args, **kwargs):
+        import pyaudio
+
         super(PyaudioPlayer, self).__init__(*args, **kwargs)
         self.p = pyaudio.PyAudio()
 
+    def play_stream(self, stream):
+        logger.info(f"play stream {stream.file}")
+        self.play_queue.put(stream)
+
+    def _play_pcm_stream(self, stream):
+        out = self.p.open(
+            format=self.p.get_format_from_width(2),
+            channels=1,
+            rate=stream.sample_rate,
+            output=True,
+        )
+        try:
+            for data in stream:
+                if self._interrupt.is_set():
+                    logger.debug(f"播放被打断：{stream.file}")
+                    break
+                out.write(data)
+        finally:
+            out.stop_stream()
+            out.close()
+        logger.debug(f"播放完成：{stream.file}")
+
     def do_playing(self, audio_file):
+        if not isinstance(audio_file, str):
+            return self._play_pcm_stream(audio_file)
         chunk = 1024
         try:
             with wave.open(audio_file, "rb") as wf:
@@ -103,7 +149,7 @@ class PyaudioPlayer(AbstractPlayer):
                     output=True,
                 )
                 data = wf.readframes(chunk)
-                while data:
+                while data and not self._interrupt.is_set():
                     stream.write(data)
                     data = wf.readframes(chunk)
                 stream.stop_stream()
@@ -112,25 +158,28 @@ class PyaudioPlayer(AbstractPlayer):
         except Exception as e:
             logger.error(f"播放音频失败: {e}")
 
-    def stop(self):
-        super().stop()
+    def shutdown(self):
+        super().shutdown()
         if self.p:
             self.p.terminate()
 
 
 class PygamePlayer(AbstractPlayer):
     def __init__(self, *args, **kwargs):
+        import pygame
+
+        self.pygame = pygame
         super(PygamePlayer, self).__init__(*args, **kwargs)
         pygame.mixer.init()
 
     def do_playing(self, audio_file):
         try:
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(100)
+            while self.pygame.mixer.music.get_busy():
+                self.pygame.time.Clock().tick(100)
             logger.debug("PygamePlayer 加载音频中")
-            pygame.mixer.music.load(audio_file)
+            self.pygame.mixer.music.load(audio_file)
             logger.debug("PygamePlayer 加载音频结束，开始播放")
-            pygame.mixer.music.play()
+            self.pygame.mixer.music.play()
             logger.debug(f"播放完成：{audio_file}")
         except Exception as e:
             logger.error(f"播放音频失败: {e}")
@@ -140,18 +189,21 @@ class PygamePlayer(AbstractPlayer):
         return (
             self.is_playing
             or (not self.play_queue.empty())
-            or pygame.mixer.music.get_busy()
+            or self.pygame.mixer.music.get_busy()
         )
 
     def stop(self):
         super().stop()
-        pygame.mixer.music.stop()
+        self.pygame.mixer.music.stop()
 
 
 class PygameSoundPlayer(AbstractPlayer):
     """支持预加载"""
 
     def __init__(self, *args, **kwargs):
+        import pygame
+
+        self.pygame = pygame
         super(PygameSoundPlayer, self).__init__(*args, **kwargs)
         pygame.mixer.init()
 
@@ -160,9 +212,13 @@ class PygameSoundPlayer(AbstractPlayer):
             logger.debug("PygameSoundPlayer 播放音频中")
             current_sound.play()  # 播放音频
             while (
-                pygame.mixer.get_busy()
+                self.pygame.mixer.get_busy()
             ):  # current_sound.get_busy():  # 检查当前音频是否正在播放
-                pygame.time.Clock().tick(100)  # 每秒检查100次
+                if self._interrupt.is_set():
+                    self.pygame.mixer.stop()
+                    logger.debug("PygameSoundPlayer 播放被打断")
+                    return
+                self.pygame.time.Clock().tick(100)  # 每秒检查100次
             del current_sound
             logger.debug("PygameSoundPlayer 播放完成")
         except Exception as e:
@@ -171,31 +227,62 @@ class PygameSoundPlayer(AbstractPlayer):
     def play(self, data):
         logger.info(f"play file {data}")
         audio_file = self.to_wav(data)
-        sound = pygame.mixer.Sound(audio_file)
+        sound = self.pygame.mixer.Sound(audio_file)
         self.play_queue.put(sound)
 
     def stop(self):
         super().stop()
+        self.pygame.mixer.stop()
 
 
 class SoundDevicePlayer(AbstractPlayer):
+    def __init__(self, *args, **kwargs):
+        import sounddevice
+
+        self.sd = sounddevice
+        super(SoundDevicePlayer, self).__init__(*args, **kwargs)
+
+    def play_stream(self, stream):
+        logger.info(f"play stream {stream.file}")
+        self.play_queue.put(stream)
+
+    def _play_pcm_stream(self, stream):
+        with self.sd.RawOutputStream(
+            samplerate=stream.sample_rate, channels=1, dtype="int16"
+        ) as out:
+            for data in stream:
+                if self._interrupt.is_set():
+                    logger.debug(f"播放被打断：{stream.file}")
+                    out.abort()
+                    return
+                out.write(data)
+        logger.debug(f"播放完成：{stream.file}")
+
     def do_playing(self, audio_file):
+        if not isinstance(audio_file, str):
+            return self._play_pcm_stream(audio_file)
         try:
             wf = wave.open(audio_file, "rb")
             data = wf.readframes(wf.getnframes())
-            sd.play(np.frombuffer(data, dtype=np.int16), samplerate=wf.getframerate())
-            sd.wait()
+            self.sd.play(
+                np.frombuffer(data, dtype=np.int16), samplerate=wf.getframerate()
+            )
+            self.sd.wait()
             logger.debug(f"播放完成：{audio_file}")
         except Exception as e:
             logger.error(f"播放音频失败: {e}")
 
     def stop(self):
         super().stop()
-        sd.stop()
+        self.sd.stop()
 
 
 class PydubPlayer(AbstractPlayer):
+    """pydub 的 play 阻塞到播放结束且无法中途停止，打断只清空待播队列，当前音频会播完"""
+
     def do_playing(self, audio_file):
+        from pydub import AudioSegment
+
         try:
             audio = AudioSegment.from_file(audio_file)
             audio.play()
@@ -205,21 +292,29 @@ class PydubPlayer(AbstractPlayer):
 
     def stop(self):
         super().stop()
-        # Pydub does not provide a stop method
+        # Pydub does not provide a stop method, the current file plays to the end
 
 
 class PlaysoundPlayer(AbstractPlayer):
+    def __init__(self, *args, **kwargs):
+        from playsound3 import playsound
+
+        self.playsound = playsound
+        super(PlaysoundPlayer, self).__init__(*args, **kwargs)
+
     def do_playing(self, audio_file):
         try:
-            playsound(audio_file)
+            # 非阻塞播放，便于在打断时停止
+            sound = self.playsound(audio_file, block=False)
+            while sound.is_alive():
+                if self._interrupt.wait(0.05):
+                    sound.stop()
+                    logger.debug(f"播放被打断：{audio_file}")
+                    return
             logger.debug(f"播放完成：{audio_file}")
         except Exception as e:
             logger.error(f"播放音频失败: {e}")
 
-    def stop(self):
-        super().stop()
-        # playsound does not provide a stop method
-
 
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
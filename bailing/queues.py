@@ -0,0 +1,101 @@
+import queue
+import time
+
+from bailing import logger
+
+
+class BoundedQueue(queue.Queue):
+    """
+    有界队列，队列满时按溢出策略处理，并记录丢弃次数与最高水位。
+
+    溢出策略:
+        block: 阻塞生产者直到有空位（与 queue.Queue 相同）
+        drop_oldest: 丢弃最旧的一个可丢弃元素（由 droppable 判定），没有可丢弃元素时阻塞
+        coalesce: 新元素与队尾元素都可丢弃时，用新元素替换队尾元素，否则按 drop_oldest 处理
+    """
+
+    POLICIES = ("block", "drop_oldest", "coalesce")
+
+    def __init__(self, name, maxsize=0, policy="block", droppable=None):
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {policy}, expected {self.POLICIES}"
+            )
+        super().__init__(maxsize)
+        self.name = name
+        self.policy = policy
+        self.droppable = droppable or (lambda item: False)
+        self.put_count = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.high_water = 0
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                action = self._make_room(item)
+                if action == "coalesced":
+                    # 新元素已替换队尾元素，不增加队列长度
+                    self.put_count += 1
+                    self.not_empty.notify()
+                    return
+                if action is None:
+                    self.blocked += 1
+                    if not block:
+                        raise queue.Full
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while self._qsize() >= self.maxsize:
+                        remaining = None
+                        if deadline is not None:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise queue.Full
+                        self.not_full.wait(remaining)
+            self._put(item)
+            self.put_count += 1
+            self.unfinished_tasks += 1
+            self.high_water = max(self.high_water, self._qsize())
+            self.not_empty.notify()
+
+    def _make_room(self, item):
+        """
+        按溢出策略腾出空间，调用时已持有锁。
+        返回 "coalesced"（已替换队尾）、"dropped"（已丢弃最旧元素）或 None（需要阻塞）
+        """
+        if (
+            self.policy == "coalesce"
+            and self.queue
+            and self.droppable(item)
+            and self.droppable(self.queue[-1])
+        ):
+            self.queue[-1] = item
+            self.coalesced += 1
+            return "coalesced"
+        if self.policy in ("drop_oldest", "coalesce"):
+            for i, old in enumerate(self.queue):
+                if self.droppable(old):
+                    del self.queue[i]
+                    # 被丢弃的元素不会再调用 task_done
+                    self.unfinished_tasks -= 1
+                    self.dropped += 1
+                    return "dropped"
+        return None
+
+    def stats(self):
+        return {
+            "size": self.qsize(),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "put": self.put_count,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "blocked": self.blocked,
+            "high_water": self.high_water,
+        }
+
+
+def log_queue_stats(queues):
+    """输出各队列的统计信息，queues 为 {名称: 提供 stats() 的对象}"""
+    for name, q in queues.items():
+        logger.info(f"队列 {name} 统计: {q.stats()}")
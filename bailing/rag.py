@@ -282,6 +282,10 @@ class RAG:
         # 重新加载文档
         self.load_documents()
 
+    def warmup(self) -> None:
+        """执行一次嵌入计算，提前加载嵌入模型"""
+        self.embedding_function(["warmup"])
+
     def get_collection_info(self) -> Dict[str, Any]:
         """获取集合信息"""
         try:
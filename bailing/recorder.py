@@ -1,15 +1,19 @@
+import asyncio
+import os
 import time
+import wave
 from abc import ABC, abstractmethod
 import threading
 import queue
-import pyaudio
 
 from bailing import logger
+from bailing.audio_buffer import AudioRingBuffer
 
 
 class AbstractRecorder(ABC):
     @abstractmethod
     def start_recording(self, audio_queue: queue.Queue):
+        """开始录音，将 PCM 数据写入 audio_queue（queue.Queue 或 AudioRingBuffer，均提供 put）"""
         pass
 
     @abstractmethod
@@ -19,10 +23,22 @@ class AbstractRecorder(ABC):
 
 class RecorderPyAudio(AbstractRecorder):
     def __init__(self, config):
+        import pyaudio
+
+        self.pyaudio = pyaudio
         self.format = pyaudio.paInt16
         self.channels = 1
         self.rate = 16000
         self.chunk = 512  # Buffer size
+        # blocking: 独立线程循环 stream.read；callback: 由 PortAudio 回调批量送帧
+        self.mode = config.get("mode", "blocking")
+        # callback 模式下每次回调的采样点数，需为 chunk 的整数倍
+        self.frames_per_buffer = config.get("frames_per_buffer", 2048)
+        if self.frames_per_buffer % self.chunk:
+            raise ValueError(
+                f"frames_per_buffer must be a multiple of {self.chunk}, "
+                f"got {self.frames_per_buffer}"
+            )
         self.py_audio = pyaudio.PyAudio()
         self.stream = None
         self.thread = None
@@ -32,6 +48,10 @@ class RecorderPyAudio(AbstractRecorder):
         if self.running:
             raise RuntimeError("Stream already running")
 
+        if self.mode == "callback":
+            self._start_callback_stream(audio_queue)
+            return
+
         def stream_thread():
             try:
                 self.stream = self.py_audio.open(
@@ -53,6 +73,33 @@ class RecorderPyAudio(AbstractRecorder):
         self.thread = threading.Thread(target=stream_thread)
         self.thread.start()
 
+    def _start_callback_stream(self, audio_queue):
+        """回调模式：无需 Python 读线程，每次回调一次性写入 frames_per_buffer 个采样点"""
+        step = self.chunk * 2
+        # AudioRingBuffer 可以一次写入多帧，queue.Queue 则需要按 chunk 拆分
+        batched = not isinstance(audio_queue, queue.Queue)
+
+        def callback(in_data, frame_count, time_info, status):
+            if status:
+                logger.debug(f"PortAudio input status: {status}")
+            if batched:
+                audio_queue.put(in_data)
+            else:
+                for i in range(0, len(in_data), step):
+                    audio_queue.put(in_data[i : i + step])
+            return None, self.pyaudio.paContinue
+
+        self.stream = self.py_audio.open(
+            format=self.format,
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=callback,
+        )
+        self.running = True
+        self.stream.start_stream()
+
     def stop_recording(self):
         if not self.running:
             return
@@ -75,6 +122,245 @@ class RecorderPyAudio(AbstractRecorder):
         self.stop_recording()
 
 
+class WavFileRecorder(AbstractRecorder):
+    """
+    从 WAV 文件或目录回放音频，用于无声卡环境下的压测与回归。
+    realtime 为 True 时按实际时长送帧（可用 speed 加速），否则尽可能快地送帧。
+    """
+
+    def __init__(self, config):
+        self.path = config.get("path", "tmp/replay")
+        self.realtime = config.get("realtime", True)
+        self.speed = config.get("speed", 1.0)
+        self.loop = config.get("loop", False)
+        # 每个音频文件之后补充的静音，保证 VAD 能检测到语音结束
+        self.silence_ms = config.get("silence_ms", 1000)
+        # 非实时模式下允许积压的最大帧数，避免写满环形缓冲区
+        self.max_backlog = config.get("max_backlog", 256)
+        self.rate = 16000
+        self.chunk = 512
+        self.thread = None
+        self.running = False
+        self.finished = threading.Event()
+        self.frames_sent = 0
+        self.elapsed = 0.0
+
+    def _list_files(self):
+        if os.path.isdir(self.path):
+            files = [
+                os.path.join(self.path, f)
+                for f in sorted(os.listdir(self.path))
+                if f.lower().endswith(".wav")
+            ]
+        else:
+            files = [self.path]
+        if not files:
+            raise ValueError(f"No wav files found in {self.path}")
+        return files
+
+    def _read_pcm(self, file_path):
+        with wave.open(file_path, "rb") as wf:
+            if (
+                wf.getframerate() != self.rate
+                or wf.getnchannels() != 1
+                or wf.getsampwidth() != 2
+            ):
+                raise ValueError(
+                    f"{file_path} must be 16kHz mono int16, got "
+                    f"{wf.getframerate()}Hz/{wf.getnchannels()}ch/{wf.getsampwidth() * 8}bit"
+                )
+            return wf.readframes(wf.getnframes())
+
+    def _chunks(self, pcm):
+        step = self.chunk * 2
+        for i in range(0, len(pcm), step):
+            data = pcm[i : i + step]
+            if len(data) < step:
+                data += b"\x00" * (step - len(data))
+            yield data
+        silence = b"\x00" * step
+        for _ in range(int(self.silence_ms * self.rate / 1000 / self.chunk)):
+            yield silence
+
+    def start_recording(self, audio_queue: queue.Queue):
+        if self.running:
+            raise RuntimeError("Stream already running")
+        files = self._list_files()
+        frame_duration = self.chunk / self.rate / self.speed
+
+        def replay_thread():
+            start_time = time.monotonic()
+            try:
+                while self.running:
+                    for file_path in files:
+                        logger.info(f"回放音频文件: {file_path}")
+                        for data in self._chunks(self._read_pcm(file_path)):
+                            if not self.running:
+                                return
+                            if self.realtime:
+                                # 按绝对时间对齐，避免 sleep 误差累积
+                                target = start_time + self.frames_sent * frame_duration
+                                delay = target - time.monotonic()
+                                if delay > 0:
+                                    time.sleep(delay)
+                            elif hasattr(audio_queue, "qsize"):
+                                while (
+                                    self.running
+                                    and audio_queue.qsize() >= self.max_backlog
+                                ):
+                                    time.sleep(0.001)
+                            audio_queue.put(data)
+                            self.frames_sent += 1
+                    if not self.loop:
+                        break
+            except Exception as e:
+                logger.error(f"Error in replay: {e}")
+            finally:
+                self.elapsed = time.monotonic() - start_time
+                audio_seconds = self.frames_sent * self.chunk / self.rate
+                logger.info(
+                    f"回放结束: 音频 {audio_seconds:.2f} 秒, 耗时 {self.elapsed:.2f} 秒, "
+                    f"{audio_seconds / max(self.elapsed, 1e-6):.1f} 倍实时"
+                )
+                self.running = False
+                self.finished.set()
+
+        self.running = True
+        self.finished.clear()
+        self.frames_sent = 0
+        self.thread = threading.Thread(target=replay_thread, daemon=True)
+        self.thread.start()
+
+    def stop_recording(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+            self.thread = None
+
+
+class RemoteStream:
+    """一个远程客户端的音频流：独立的环形缓冲区，以及线程安全的回传通道"""
+
+    def __init__(self, session_id, buffer, socket, loop):
+        self.session_id = session_id
+        self.buffer = buffer
+        self.closed = False
+        self._socket = socket
+        self._loop = loop
+
+    def send(self, payload):
+        """从任意线程向客户端发送 JSON 消息"""
+        if self.closed:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self._socket.send_json(payload), self._loop
+            )
+        except RuntimeError as e:
+            logger.debug(f"会话 {self.session_id} 回传失败: {e}")
+
+
+class WebSocketRecorder(AbstractRecorder):
+    """
+    通过 WebSocket 接收多个远程客户端的 16kHz 单声道 int16 PCM。
+    客户端连接 ws://host:port/pcm/<session_id> 并发送二进制帧，
+    每个连接拥有独立的环形缓冲区，由 Robot 为其创建单独的 VAD/ASR 会话。
+    """
+
+    multi_session = True
+
+    def __init__(self, config):
+        self.host = config.get("host", "0.0.0.0")
+        self.port = config.get("port", 5100)
+        self.path = config.get("path", "/pcm").rstrip("/")
+        self.max_sessions = config.get("max_sessions", 16)
+        self.buffer_capacity = config.get("buffer_capacity", 1875)
+        self.streams = {}
+        self.on_open = None
+        self.on_close = None
+        self.server = None
+        self.thread = None
+        self.running = False
+
+    def set_session_handlers(self, on_open, on_close):
+        """设置会话建立/断开时的回调，参数为 RemoteStream"""
+        self.on_open = on_open
+        self.on_close = on_close
+
+    def _build_app(self):
+        from litestar import Litestar, WebSocket, websocket
+        from litestar.exceptions import WebSocketDisconnect
+
+        @websocket(f"{self.path}/{{session_id:str}}")
+        async def pcm_handler(socket: WebSocket, session_id: str) -> None:
+            await socket.accept()
+            if session_id in self.streams or len(self.streams) >= self.max_sessions:
+                logger.warning(f"拒绝远程会话 {session_id}: 重复或超出上限")
+                await socket.close(code=1013)
+                return
+
+            stream = RemoteStream(
+                session_id,
+                AudioRingBuffer(capacity=self.buffer_capacity),
+                socket,
+                asyncio.get_running_loop(),
+            )
+            self.streams[session_id] = stream
+            logger.info(f"远程会话已连接: {session_id}")
+            # 客户端分帧不一定按 2 字节对齐，多出的半个采样留到下一帧
+            carry = b""
+            try:
+                if self.on_open:
+                    # 创建会话会加载 VAD 模型，放到线程中执行，避免阻塞其它会话的收流
+                    await asyncio.to_thread(self.on_open, stream)
+                while self.running:
+                    data = carry + await socket.receive_bytes()
+                    cut = len(data) - len(data) % 2
+                    carry = data[cut:]
+                    if cut:
+                        stream.buffer.put(data[:cut])
+            except WebSocketDisconnect:
+                pass
+            except Exception as e:
+                logger.error(f"远程会话 {session_id} 出错: {e}")
+            finally:
+                stream.closed = True
+                stream.buffer.flush()
+                self.streams.pop(session_id, None)
+                if self.on_close:
+                    await asyncio.to_thread(self.on_close, stream)
+                logger.info(f"远程会话已断开: {session_id}")
+
+        return Litestar(route_handlers=[pcm_handler])
+
+    def start_recording(self, audio_queue: queue.Queue):
+        """启动 WebSocket 服务；音频按会话写入各自的缓冲区，不使用 audio_queue"""
+        if self.running:
+            raise RuntimeError("Stream already running")
+        import uvicorn
+
+        config = uvicorn.Config(
+            self._build_app(), host=self.host, port=self.port, log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.running = True
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        logger.info(
+            f"远程音频服务已启动: ws://{self.host}:{self.port}{self.path}/<session_id>"
+        )
+
+    def stop_recording(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.server:
+            self.server.should_exit = True
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
     cls = globals().get(class_name)
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from bailing import logger
+from bailing.utils import read_json_file, write_json_file
+
+_CJK_PATTERN = re.compile(r"[\u3400-\u9fff]")
+_WORD_PATTERN = re.compile(r"\w")
+
+
+class ResponseCache:
+    """
+    语义响应缓存：以用户问题的嵌入向量为键，保存回复文本和合成好的音频文件。
+
+    命中条件为余弦相似度不低于 threshold 且未过期；超过 max_entries 时按最近使用淘汰。
+    documents 目录中的文档发生变化时，缓存整体失效，避免回答引用过时的知识库内容。
+    与时间、天气等实时信息相关的问题（exclude_patterns）不参与缓存。
+
+    “为什么”“然后呢”这类追问的含义取决于上文，调用方传入上一轮回复作为 context，
+    与问题一起计算嵌入，只有上文也相近时才会命中。
+    过短的问题（少于 min_chars 个字）不参与缓存；以中文为主的问题使用更严格的 cjk_threshold，
+    因为以英文为主的嵌入模型对中文短句的相似度普遍偏高。
+    """
+
+    def __init__(
+        self,
+        embedding_function,
+        cache_dir="tmp/response_cache",
+        threshold=0.92,
+        max_entries=200,
+        ttl=86400,
+        documents_dir="documents",
+        exclude_patterns=None,
+        check_interval=30,
+        play_dir="tmp/",
+        min_chars=4,
+        cjk_threshold=0.96,
+        first_turn_only=True,
+    ):
+        """
+        Args:
+            embedding_function: 嵌入函数，接收字符串列表返回向量列表（与 RAG 共用）
+            cache_dir: 缓存音频与索引的保存目录
+            threshold: 命中所需的最低余弦相似度
+            max_entries: 最多缓存的问答条数
+            ttl: 缓存有效期（秒），0 表示不过期
+            documents_dir: 知识库文档目录，内容变化时缓存失效
+            exclude_patterns: 不缓存的问题（正则），如询问时间、天气
+            check_interval: 检查文档是否变化的最小间隔（秒）
+            play_dir: 命中时生成的待播放音频副本所在目录
+            min_chars: 参与缓存的问题的最少字数（不计标点与空白）
+            cjk_threshold: 以中文为主的问题命中所需的最低相似度，取与 threshold 中较大者
+            first_turn_only: 只在对话的第一轮使用缓存，之后的轮次不查询也不写入
+        """
+        self.embedding_function = embedding_function
+        self.cache_dir = Path(cache_dir)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.documents_dir = Path(documents_dir)
+        self.exclude = [re.compile(p, re.IGNORECASE) for p in exclude_patterns or []]
+        self.check_interval = check_interval
+        self.play_dir = play_dir
+        self.min_chars = min_chars
+        self.cjk_threshold = cjk_threshold
+        self.first_turn_only = first_turn_only
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / "index.json"
+        self._lock = threading.Lock()
+        # key -> entry，按最近使用排序，末尾为最近使用
+        self.entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self.hits = 0
+        self.misses = 0
+
+        self.fingerprint = self._documents_fingerprint()
+        self._last_check = time.time()
+        self._load()
+
+    def _documents_fingerprint(self):
+        """根据文档的路径、大小和修改时间计算指纹"""
+        digest = hashlib.sha256()
+        if self.documents_dir.exists():
+            for path in sorted(self.documents_dir.glob("**/*")):
+                if path.is_file():
+                    stat = path.stat()
+                    digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    def _load(self):
+        if not self.index_file.exists():
+            return
+        data = read_json_file(str(self.index_file)) or {}
+        if data.get("fingerprint") != self.fingerprint:
+            logger.info("知识库文档已变化，清空响应缓存")
+            self._clear_files(data.get("entries", []))
+            self._save()
+            return
+        for entry in data.get("entries", []):
+            if all(os.path.exists(f) for f in entry["audio_files"]):
+                entry["embedding"] = np.asarray(entry["embedding"], dtype=np.float32)
+                self.entries[entry["key"]] = entry
+        self._rebuild_matrix()
+        logger.info(f"已加载 {len(self.entries)} 条响应缓存")
+
+    def _save(self):
+        entries = [
+            {**entry, "embedding": entry["embedding"].tolist()}
+            for entry in self.entries.values()
+        ]
+        write_json_file(
+            str(self.index_file), {"fingerprint": self.fingerprint, "entries": entries}
+        )
+
+    def _rebuild_matrix(self):
+        self._keys = list(self.entries.keys())
+        self._matrix = (
+            np.stack([self.entries[k]["embedding"] for k in self._keys])
+            if self._keys
+            else None
+        )
+
+    @staticmethod
+    def _clear_files(entries):
+        for entry in entries:
+            for f in entry.get("audio_files", []):
+                if os.path.exists(f):
+                    os.remove(f)
+
+    def _embed(self, text):
+        vector = np.asarray(self.embedding_function([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_documents(self):
+        """文档变化时清空缓存，按 check_interval 节流"""
+        now = time.time()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        fingerprint = self._documents_fingerprint()
+        if fingerprint != self.fingerprint:
+            logger.info("知识库文档已变化，清空响应缓存")
+            self.fingerprint = fingerprint
+            self._clear_files(self.entries.values())
+            self.entries.clear()
+            self._rebuild_matrix()
+            self._save()
+
+    def cacheable(self, query):
+        return (
+            bool(query)
+            and len(_WORD_PATTERN.findall(query)) >= self.min_chars
+            and not any(p.search(query) for p in self.exclude)
+        )
+
+    def threshold_for(self, query):
+        """以中文为主的问题使用更严格的阈值"""
+        words = _WORD_PATTERN.findall(query)
+        if words and len(_CJK_PATTERN.findall(query)) * 2 >= len(words):
+            return max(self.threshold, self.cjk_threshold)
+        return self.threshold
+
+    @staticmethod
+    def _key_text(query, context):
+        """参与嵌入的文本：有上文时取上一轮回复的末尾与问题拼接"""
+        if not context:
+            return query
+        return f"{context[-200:]}\n{query}"
+
+    def lookup(self, query, context=None):
+        """
+        查找语义相近的问题，命中时返回条目（含 text 与 audio_files），否则返回 None。
+        context 为上一轮回复，对话第一轮为 None。
+        返回的音频文件是缓存文件的副本，播放器可以随意处理。
+        """
+        if not self.cacheable(query):
+            return None
+        with self._lock:
+            self._check_documents()
+            if self._matrix is None:
+                # 缓存为空时不必计算嵌入
+                self.misses += 1
+                return None
+        start_time = time.time()
+        embedding = self._embed(self._key_text(query, context))
+        threshold = self.threshold_for(query)
+        with self._lock:
+            if self._matrix is None:
+                self.misses += 1
+                return None
+            scores = self._matrix @ embedding
+            best = int(np.argmax(scores))
+            key = self._keys[best]
+            entry = self.entries[key]
+            expired = self.ttl and time.time() - entry["created"] > self.ttl
+            if scores[best] < threshold or expired:
+                if expired:
+                    self._evict(key)
+                    self._save()
+                self.misses += 1
+                logger.debug(f"响应缓存未命中，最高相似度 {scores[best]:.3f}")
+                return None
+            self.entries.move_to_end(key)
+            entry["last_used"] = time.time()
+            self.hits += 1
+            audio_files = [self._materialize(f) for f in entry["audio_files"]]
+        logger.info(
+            f"响应缓存命中（相似度 {scores[best]:.3f}，原问题：{entry['query']}），"
+            f"查找耗时 {time.time() - start_time:.3f} 秒，命中 {self.hits} / 未命中 {self.misses}"
+        )
+        return {**entry, "audio_files": audio_files}
+
+    def _materialize(self, path):
+        """为缓存音频生成一个临时副本（优先硬链接），避免播放器的中间文件写入缓存目录"""
+        target = os.path.join(
+            self.play_dir, f"cache-{uuid.uuid4().hex}{os.path.splitext(path)[1]}"
+        )
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+        return target
+
+    def store(self, query, text, audio_files, context=None):
+        """保存一轮问答，audio_files 会被复制到缓存目录，context 与 lookup 相同"""
+        if not self.cacheable(query) or not text or not audio_files:
+            return
+        key_text = self._key_text(query, context)
+        embedding = self._embed(key_text)
+        key = hashlib.sha256(key_text.encode("utf-8")).hexdigest()[:16]
+        # 每次写入使用新的文件名，重复写入同一问题时旧条目的文件整体删除，不会残留
+        version = uuid.uuid4().hex[:8]
+        cached_files = []
+        for i, f in enumerate(audio_files):
+            target = self.cache_dir / f"{key}-{version}-{i}{os.path.splitext(f)[1]}"
+            shutil.copyfile(f, target)
+            cached_files.append(str(target))
+        with self._lock:
+            if key in self.entries:
+                self._evict(key)
+            self.entries[key] = {
+                "key": key,
+                "query": query,
+                "context": context,
+                "text": text,
+                "audio_files": cached_files,
+                "embedding": embedding,
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            while len(self.entries) > self.max_entries:
+                self._evict(next(iter(self.entries)))
+            self._rebuild_matrix()
+            self._save()
+        logger.debug(f"已缓存回复: {query}")
+
+    def _evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._clear_files([entry])
+        self._rebuild_matrix()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -1,18 +1,24 @@
 import json
-import queue
+import os
 import threading
 from abc import ABC
 from bailing import logger
 
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
 import argparse
 import time
 
-from bailing import recorder, player, asr, llm, tts, vad, memory, rag
+from bailing import recorder, player, asr, llm, tts, vad, memory, rag, transport
+from bailing.audio_buffer import AudioRingBuffer
+from bailing.session import StreamSession, BatchedVADRunner
+from bailing.queues import BoundedQueue, log_queue_stats
+from bailing.response_cache import ResponseCache
 from bailing.dialogue import Message, Dialogue
+from bailing.segmenter import SentenceSegmenter
+from bailing.tts import StreamingAudio
 from bailing.utils import (
     read_config,
-    is_segment,
+    CancellationToken,
 )
 # 添加RAG导入
 
@@ -35,66 +41,90 @@ sys_prompt = """
 4. 如果没有检索到相关内容，请基于你的知识正常回答。
 """
 
+# 缓存友好布局下系统提示词保持不变，历史摘要与检索结果随用户问题一起发送
+memory_in_user_message = "历史对话摘要会附在用户问题之前，没有摘要时不附加。"
+rag_in_user_message = "检索结果会附在用户问题之前，没有检索结果时不附加。"
+
 
 class Robot(ABC):
     def __init__(self, config_file, mcp_config=None):
         config = read_config(config_file)
-        self.audio_queue = queue.Queue()
-
-        self.recorder = recorder.create_instance(
-            config["selected_module"]["Recorder"],
-            config["Recorder"][config["selected_module"]["Recorder"]],
-        )
-
-        self.asr = asr.create_instance(
-            config["selected_module"]["ASR"],
-            config["ASR"][config["selected_module"]["ASR"]],
-        )
+        # LLM 与 Memory 共享的连接池参数，需在创建组件之前设置
+        transport.configure(config.get("HTTP"))
+        # 录音线程写入、VAD 线程零拷贝读取的预分配环形缓冲区
+        self.audio_buffer = AudioRingBuffer(**(config.get("AudioBuffer") or {}))
 
-        self.llm = llm.create_instance(
-            config["selected_module"]["LLM"],
-            config["LLM"][config["selected_module"]["LLM"]],
-        )
-
-        self.tts = tts.create_instance(
-            config["selected_module"]["TTS"],
-            config["TTS"][config["selected_module"]["TTS"]],
-        )
-
-        self.vad = vad.create_instance(
+        self.vad_config = (
             config["selected_module"]["VAD"],
             config["VAD"][config["selected_module"]["VAD"]],
         )
-
-        self.player = player.create_instance(
-            config["selected_module"]["Player"],
-            config["Player"][config["selected_module"]["Player"]],
-        )
+        components = self._create_components(config)
+        self.recorder = components["recorder"]
+        # 进程模式下模型只在工作进程中加载，主进程没有 ASR 实例
+        self.asr = components.get("asr")
+        self.llm = components["llm"]
+        self.tts = self._create_tts_cache(components["tts"], config)
+        # TTS 开启 streaming 且支持流式合成时，音频分块直接送入播放器
+        self.tts_streaming = getattr(self.tts, "streaming", False)
+        if self.tts_streaming and not self.tts.supports_streaming:
+            logger.warning(f"{type(self.tts).__name__} 不支持流式合成，使用整段合成")
+            self.tts_streaming = False
+        self.vad = components["vad"]
+        self.player = components["player"]
+        self.memory = components["memory"]
+        self.rag = components["rag"]
+        self.response_cache = self._create_response_cache(config)
 
         # self.MCP = mcp.create_instance(
         #     config["selected_module"]["MCP"],
         #     config["MCP"][config["selected_module"]["MCP"]],
         # )
 
-        self.memory = memory.Memory(config.get("Memory"))
-
-        # 初始化RAG系统
-        try:
-            self.rag = rag.create_rag_instance(documents_dir="documents")
-            logger.info("RAG系统初始化成功")
-        except Exception as e:
-            logger.warning(f"RAG系统初始化失败: {e}")
-            self.rag = None
+        # 主进程中的 ASR 模型被工作池、远程会话、微批调度与流式识别共享，调用需串行
+        self.asr_lock = threading.Lock()
+        # 识别在工作池中执行，双工循环不必等待识别完成
+        self.asr_pool = components.get("asr_pool") or self._create_asr_pool(
+            config, self.asr, self.asr_lock
+        )
+        # 流式识别有状态，需要按顺序送帧，使用单独的单线程执行
+        self.asr_stream_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="asr-stream"
+        )
 
         # 初始化对话相关组件
-        self.vad_queue = queue.Queue()
-        self.dialogue = Dialogue(config["Memory"]["dialogue_history_path"])
+        queues_config = config.get("Queues") or {}
+        vad_queue_config = queues_config.get("vad_queue") or {}
+        # 语音帧留在 audio_buffer 中，丢弃静音事件不会丢失音频
+        self.vad_queue = BoundedQueue(
+            "vad_queue",
+            maxsize=vad_queue_config.get("maxsize", 0),
+            policy=vad_queue_config.get("policy", "block"),
+            droppable=lambda item: item.get("vad_statue") is None,
+        )
+        self.queue_stats_interval = queues_config.get("stats_interval", 0)
+        # 上下文窗口的 token 预算，summarize 策略用 Memory 的模型为被裁剪的轮次生成摘要
+        self.dialogue_config = dict(config.get("Dialogue") or {})
+        if self.dialogue_config.get("policy") == "summarize":
+            self.dialogue_config["summarizer"] = self.memory.summarize
+        self.dialogue = Dialogue(
+            config["Memory"]["dialogue_history_path"], **self.dialogue_config
+        )
 
+        # 提示词布局：legacy 每轮把检索结果写入系统提示词；
+        # cache_friendly 保持系统提示词不变，摘要与检索结果附在当前用户消息上，便于服务端前缀缓存命中
+        self.prompt_layout = config.get("prompt_layout", "legacy")
+        # LLM 输出到 TTS 的流式断句参数
+        self.segmenter_config = config.get("Segmenter") or {}
         # 初始化系统提示词（延迟到需要时再设置）
         self._update_system_prompt()
 
         # 保证tts是顺序的
-        self.tts_queue = queue.Queue()
+        tts_queue_config = queues_config.get("tts_queue") or {}
+        self.tts_queue = BoundedQueue(
+            "tts_queue",
+            maxsize=tts_queue_config.get("maxsize", 0),
+            policy=tts_queue_config.get("policy", "block"),
+        )
         # 初始化线程池
         self.executor = ThreadPoolExecutor(max_workers=10)
 
@@ -106,55 +136,312 @@ class Robot(ABC):
 
         # 线程锁
         self.chat_lock = False
+        # 当前一轮对话的取消令牌，用户打断时取消
+        self.turn_token = None
 
         # 事件用于控制程序退出
         self.stop_event = threading.Event()
 
         self.callback = None
+        # 状态回调，预热开始与完成时上报是否就绪
+        self.status_callback = None
+
+        # 启动预热：各组件完成首次推理后才置为就绪
+        self.warmup_enabled = config.get("warmup", True)
+        self.warmup_times = {}
+        self.ready = threading.Event()
 
+        # 语音片段的帧序号（指向 audio_buffer），而非音频数据的拷贝
         self.speech = []
+        # 流式识别下一帧待送入 ASR 的帧序号，None 表示当前没有进行中的流式识别
+        self._stream_next_seq = None
+
+        # 远程多路音频会话，每路独立 VAD/ASR，共享同一个 ASR 模型
+        self.sessions = {}
+        self.vad_runner = None
+        # 多会话的 ASR 微批调度，把时间窗口内结束的语音合并为一次批量识别
+        scheduler_config = dict(config.get("ASRScheduler") or {})
+        if scheduler_config.get("enabled") and self.asr is None:
+            logger.warning("ASR 工作池为进程模式，微批调度不可用，会话识别交给工作进程")
+            scheduler_config["enabled"] = False
+        self.asr_scheduler = (
+            asr.ASRBatchScheduler(
+                self.asr,
+                window_ms=scheduler_config.get("window_ms", 5),
+                max_batch=scheduler_config.get("max_batch", 16),
+                lock=self.asr_lock,
+            )
+            if scheduler_config.get("enabled")
+            else None
+        )
+        if getattr(self.recorder, "multi_session", False):
+            self.recorder.set_session_handlers(self._open_session, self._close_session)
+
+    @staticmethod
+    def _create_asr_pool(config, asr_instance, lock=None):
+        asr_worker_config = config.get("ASRWorker") or {}
+        return asr.ASRWorkerPool(
+            asr_instance,
+            config["selected_module"]["ASR"],
+            config["ASR"][config["selected_module"]["ASR"]],
+            kind=asr_worker_config.get("type", "thread"),
+            workers=asr_worker_config.get("workers", 1),
+            lock=lock,
+        )
+
+    @staticmethod
+    def _create_rag():
+        try:
+            rag_instance = rag.create_rag_instance(documents_dir="documents")
+            logger.info("RAG系统初始化成功")
+            return rag_instance
+        except Exception as e:
+            logger.warning(f"RAG系统初始化失败: {e}")
+            return None
+
+    def _create_response_cache(self, config):
+        """常见问题的语义响应缓存，复用 RAG 的嵌入函数，需在配置中开启"""
+        cache_config = dict(config.get("ResponseCache") or {})
+        if not cache_config.pop("enabled", False):
+            return None
+        if self.rag is None:
+            logger.warning("RAG 未初始化，没有可用的嵌入函数，响应缓存不可用")
+            return None
+        try:
+            return ResponseCache(
+                self.rag.embedding_function,
+                documents_dir=str(self.rag.documents_dir),
+                **cache_config,
+            )
+        except Exception as e:
+            logger.warning(f"响应缓存初始化失败: {e}")
+            return None
+
+    @staticmethod
+    def _create_tts_cache(tts_instance, config):
+        """为 TTS 加上磁盘音频缓存，重复的问候、确认等语句不再重新合成，需在配置中开启"""
+        cache_config = dict(config.get("TTSCache") or {})
+        if not cache_config.pop("enabled", False):
+            return tts_instance
+        try:
+            return tts.CachedTTS(tts_instance, **cache_config)
+        except Exception as e:
+            logger.warning(f"TTS 缓存初始化失败: {e}")
+            return tts_instance
+
+    def _create_components(self, config):
+        """
+        并行创建相互独立的组件：模型加载与网络请求在线程池中重叠执行，
+        播放器在主线程中创建（部分音频库要求在主线程初始化）。
+        """
+        selected = config["selected_module"]
+
+        def builder(module, name):
+            return lambda: module.create_instance(
+                selected[name], config[name][selected[name]]
+            )
+
+        builders = {
+            "recorder": builder(recorder, "Recorder"),
+            "llm": builder(llm, "LLM"),
+            "tts": builder(tts, "TTS"),
+            "vad": lambda: vad.create_instance(*self.vad_config),
+            "memory": lambda: memory.Memory(config.get("Memory")),
+            "rag": self._create_rag,
+        }
+        # 进程模式的识别工作池在子进程中加载模型，主进程不再加载一份 ASR 模型
+        if (config.get("ASRWorker") or {}).get("type") == "process":
+            builders["asr_pool"] = lambda: self._create_asr_pool(config, None)
+        else:
+            builders["asr"] = builder(asr, "ASR")
+
+        init_config = config.get("Init") or {}
+        workers = init_config.get("parallel_workers") or len(builders)
+        timings = {}
+
+        def timed(name, build):
+            t = time.time()
+            try:
+                return build()
+            finally:
+                timings[name] = time.time() - t
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="init") as pool:
+            futures = {
+                name: pool.submit(timed, name, build)
+                for name, build in builders.items()
+            }
+            components = {"player": timed("player", builder(player, "Player"))}
+            for name, future in futures.items():
+                components[name] = future.result()
+
+        breakdown = ", ".join(
+            f"{name}={t:.2f}s"
+            for name, t in sorted(timings.items(), key=lambda item: -item[1])
+        )
+        logger.info(
+            f"组件初始化完成，总耗时 {time.time() - start_time:.2f} 秒"
+            f"（并行 {workers} 线程）: {breakdown}"
+        )
+        return components
 
     def listen_dialogue(self, callback):
         self.callback = callback
 
+    def listen_status(self, callback):
+        self.status_callback = callback
+
+    def _report_status(self):
+        if self.status_callback:
+            self.status_callback(
+                {
+                    "ready": self.ready.is_set(),
+                    "warmup": {k: round(v, 3) for k, v in self.warmup_times.items()},
+                }
+            )
+
     def _stream_vad(self):
         def vad_thread():
             while not self.stop_event.is_set():
                 try:
-                    data = self.audio_queue.get()
-                    vad_statue = self.vad.is_vad(data)
-                    self.vad_queue.put({"voice": data, "vad_statue": vad_statue})
+                    seq, frame = self.audio_buffer.get(timeout=0.5)
+                    if seq is None:
+                        continue
+                    vad_statue = self.vad.is_vad(frame)
+                    # 只传递帧序号，音频数据留在环形缓冲区中
+                    self.vad_queue.put({"seq": seq, "vad_statue": vad_statue})
                 except Exception as e:
                     logger.error(f"VAD 处理出错: {e}")
 
         consumer_audio = threading.Thread(target=vad_thread, daemon=True)
         consumer_audio.start()
 
+    def _open_session(self, stream):
+        """远程客户端连接时，为其创建独立的 VAD/ASR 会话"""
+        # 支持批量推理的 VAD 由所有会话共享，各会话只保留自己的循环状态
+        batched = getattr(self.vad, "supports_batch", False)
+        session = StreamSession(
+            stream,
+            self.vad if batched else vad.create_instance(*self.vad_config),
+            self._submit_session_recognition,
+            self._dispatch_session_text,
+        )
+        session.dialogue = Dialogue(
+            self.dialogue.dialogue_history_path, **self.dialogue_config
+        )
+        session.dialogue.set_system(self.prompt)
+        self.sessions[stream.session_id] = session
+        if batched:
+            if self.vad_runner is None:
+                self.vad_runner = BatchedVADRunner(self.vad)
+            self.vad_runner.add(session)
+        else:
+            session.start()
+
+    def _close_session(self, stream):
+        self.sessions.pop(stream.session_id, None)
+
+    def _recognize_shared(self, voice_data):
+        # 多个会话共享同一个 ASR 模型，串行调用
+        return self._call_asr(self.asr.recognizer, voice_data)
+
+    def _call_asr(self, method, *args):
+        with self.asr_lock:
+            return method(*args)
+
+    def _submit_session_recognition(self, voice_data):
+        """远程会话的识别请求：启用微批调度时合并识别，否则在线程池中串行识别"""
+        if self.asr_scheduler is not None:
+            return self.asr_scheduler.submit(voice_data)
+        if self.asr is None:
+            return self.asr_pool.submit(voice_data)
+        return self.executor.submit(self._recognize_shared, voice_data)
+
+    def _dispatch_session_text(self, session, text):
+        # 识别完成回调可能运行在 ASR 调度线程中，LLM 调用交给线程池，避免阻塞后续批次
+        self.executor.submit(self._on_session_text, session, text)
+
+    def _on_session_text(self, session, text):
+        """远程会话的识别结果：调用 LLM 并将回复以文本流的形式回传给客户端"""
+        if self.callback:
+            self.callback(
+                {"role": "user", "content": str(text), "session_id": session.session_id}
+            )
+        session.dialogue.put(Message(role="user", content=text))
+        response_message = []
+        try:
+            for content in self.llm.response(session.dialogue.get_llm_dialogue()):
+                if not content:
+                    continue
+                response_message.append(content)
+                session.stream.send({"type": "llm", "content": content})
+        except Exception as e:
+            logger.error(f"会话 {session.session_id} LLM 处理出错: {e}")
+        answer = "".join(response_message)
+        session.stream.send({"type": "llm_end", "content": answer})
+        session.dialogue.put(Message(role="assistant", content=answer))
+        if self.callback:
+            self.callback(
+                {
+                    "role": "assistant",
+                    "content": answer,
+                    "session_id": session.session_id,
+                }
+            )
+
     def _tts_priority(self):
         def priority_thread():
             while not self.stop_event.is_set():
                 try:
-                    future = self.tts_queue.get()
+                    future, cancel_token = self.tts_queue.get()
+                    if cancel_token is not None and cancel_token.cancelled:
+                        # 被打断的一轮，未开始的合成已取消，已合成的不再播放
+                        continue
                     try:
                         tts_file = future.result(timeout=5)
+                    except CancelledError:
+                        continue
                     except TimeoutError:
                         logger.error("TTS 任务超时")
                         continue
                     except Exception as e:
                         logger.error(f"TTS 任务出错: {e}")
                         continue
-                    if tts_file is None:
+                    if tts_file is None or (
+                        cancel_token is not None and cancel_token.cancelled
+                    ):
                         continue
-                    self.player.play(tts_file)
+                    if isinstance(tts_file, StreamingAudio):
+                        self.player.play_stream(tts_file)
+                    else:
+                        self.player.play(tts_file)
                 except Exception as e:
                     logger.error(f"tts_priority priority_thread: {e}")
 
         tts_priority = threading.Thread(target=priority_thread, daemon=True)
         tts_priority.start()
 
+    def _queue_stats(self):
+        """定期输出各队列的积压、丢弃与最高水位"""
+        queues = {
+            "audio_buffer": self.audio_buffer,
+            "vad_queue": self.vad_queue,
+            "tts_queue": self.tts_queue,
+        }
+
+        def stats_thread():
+            while not self.stop_event.wait(self.queue_stats_interval):
+                log_queue_stats(queues)
+
+        threading.Thread(target=stats_thread, daemon=True).start()
+
     def interrupt_playback(self):
         """中断当前的语音播放"""
         logger.info("Interrupting current playback.")
+        if self.turn_token is not None:
+            # 关闭 LLM 流、取消排队中的 TTS 合成，释放资源给新一轮对话
+            self.turn_token.cancel()
         self.player.stop()
 
     def shutdown(self):
@@ -162,22 +449,62 @@ class Robot(ABC):
         logger.info("Shutting down Robot...")
         self.stop_event.set()
         self.executor.shutdown(wait=True)
+        self.asr_pool.shutdown()
+        self.asr_stream_executor.shutdown(wait=False, cancel_futures=True)
         self.recorder.stop_recording()
         self.player.shutdown()
+        transport.close()
         logger.info("Shutdown complete.")
 
+    def warmup(self):
+        """对 VAD、ASR、TTS 和 RAG 嵌入各做一次推理并预先建立 LLM 连接，记录各组件耗时后置为就绪"""
+        components = {
+            "vad": self.vad.warmup,
+            "tts": self.tts.warmup,
+            "llm": self.llm.warmup,
+        }
+        # 进程模式的工作进程启动时已各自预热
+        if self.asr is not None:
+            components["asr"] = self.asr.warmup
+        if self.rag is not None:
+            components["rag"] = self.rag.warmup
+
+        start_time = time.time()
+        for name, warmup in components.items():
+            t = time.time()
+            try:
+                warmup()
+            except Exception as e:
+                logger.warning(f"{name} 预热失败: {e}")
+            self.warmup_times[name] = time.time() - t
+        breakdown = ", ".join(f"{k}={v:.2f}s" for k, v in self.warmup_times.items())
+        logger.info(f"预热完成，总耗时 {time.time() - start_time:.2f} 秒: {breakdown}")
+        self.ready.set()
+
     def start_recording_and_vad(self):
-        # 开始监听语音流
-        self.recorder.start_recording(self.audio_queue)
+        self._report_status()
+        if self.warmup_enabled:
+            self.warmup()
+        else:
+            self.ready.set()
+        self._report_status()
+        # 预热完成后才开始监听语音流，第一轮对话与稳定状态一样快
+        self.ready.wait()
+        self.recorder.start_recording(self.audio_buffer)
         logger.info("Started recording.")
         # vad 实时识别
         self._stream_vad()
         # tts优先级队列
         self._tts_priority()
+        if self.queue_stats_interval:
+            self._queue_stats()
 
     def _update_system_prompt(self, rag_context=""):
         """更新系统提示词，包含RAG上下文"""
         memory_content = self.memory.get_memory()
+        if self.prompt_layout == "cache_friendly":
+            memory_content = memory_in_user_message
+            rag_context = rag_in_user_message
         self.prompt = (
             sys_prompt.replace("{memory}", memory_content)
             .replace("{rag_context}", rag_context)
@@ -185,13 +512,33 @@ class Robot(ABC):
         )
 
         # 更新对话中的系统消息
-        if (
-            len(self.dialogue.dialogue) > 0
-            and self.dialogue.dialogue[0].role == "system"
-        ):
-            self.dialogue.dialogue[0] = Message(role="system", content=self.prompt)
-        else:
-            self.dialogue.put(Message(role="system", content=self.prompt))
+        self.dialogue.set_system(self.prompt)
+
+    def _build_llm_dialogue(self, rag_context=""):
+        """
+        组装发送给 LLM 的消息列表。缓存友好布局下历史摘要、更早的对话摘要与检索结果
+        只附加在本次请求的最后一条用户消息副本上，位于对话历史之后；
+        对话历史中保存的仍是原始问题，系统提示词与历史前缀逐轮保持不变。
+        """
+        if self.prompt_layout != "cache_friendly":
+            return self.dialogue.get_llm_dialogue()
+        messages = self.dialogue.get_llm_dialogue(include_summary=False)
+        sections = []
+        memory_content = self.memory.get_memory()
+        if memory_content:
+            sections.append(f"# 历史对话摘要:\n{memory_content}")
+        if self.dialogue.summary:
+            sections.append(f"# 更早的对话摘要:\n{self.dialogue.summary}")
+        if rag_context:
+            sections.append(f"# 文档知识库检索结果:\n{rag_context}")
+        if not sections:
+            return messages
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i]["role"] == "user":
+                sections.append(f"# 用户问题:\n{messages[i]['content']}")
+                messages[i] = {**messages[i], "content": "\n\n".join(sections)}
+                break
+        return messages
 
     def _get_rag_context(self, query: str) -> str:
         """获取RAG检索上下文"""
@@ -215,7 +562,8 @@ class Robot(ABC):
         data = self.vad_queue.get()
         # 识别到vad开始
         if self.vad_start:
-            self.speech.append(data)
+            self.speech.append(data["seq"])
+            self._feed_streaming_asr(data["seq"])
         vad_status = data.get("vad_statue")
         # 空闲的时候，取出耗时任务进行播放
         if (
@@ -227,8 +575,7 @@ class Robot(ABC):
             and self.chat_lock is False
         ):
             result = self.task_queue.get()
-            future = self.executor.submit(self.speak_and_play, result.response)
-            self.tts_queue.put(future)
+            self._submit_tts(result.response)
 
         """ 语音唤醒
         if time.time() - self.start_time>=60:
@@ -247,33 +594,86 @@ class Robot(ABC):
                     self.chat_lock = False
                     self.interrupt_playback()
                     self.vad_start = True
-                    self.speech.append(data)
+                    self.speech.append(data["seq"])
+                    self._start_streaming_asr(data["seq"])
                 else:
                     return
             else:  # 没有播放，正常
                 self.vad_start = True
-                self.speech.append(data)
+                self.speech.append(data["seq"])
+                self._start_streaming_asr(data["seq"])
+            # 连接可能已空闲过期，趁用户说话和识别的时间重新建立
+            transport.keep_warm(getattr(self.llm, "base_url", None), self.executor)
         elif "end" in vad_status and len(self.speech) > 0:
             try:
                 logger.debug(f"语音包的长度：{len(self.speech)}")
                 self.vad_start = False
-                voice_data = [d["voice"] for d in self.speech]
-                text, tmpfile = self.asr.recognizer(voice_data)
+                if self._stream_next_seq is not None:
+                    # 流式识别：语音过程中已增量解码，这里只需解码尾部
+                    self._feed_streaming_asr(data["seq"])
+                    self._stream_next_seq = None
+                    future = self.asr_stream_executor.submit(
+                        self._call_asr, self.asr.finish_stream
+                    )
+                else:
+                    # 按首尾帧序号取连续音频，中间被队列丢弃的静音事件不影响录音内容
+                    voice_data = self.audio_buffer.gather(
+                        range(self.speech[0], data["seq"] + 1)
+                    )
+                    future = self.asr_pool.submit(voice_data)
                 self.speech = []
             except Exception as e:
                 self.vad_start = False
                 self.speech = []
+                self._stream_next_seq = None
                 logger.error(f"ASR识别出错: {e}")
                 return
-            if not text.strip():
-                logger.debug("识别结果为空，跳过处理。")
+            # 识别结果异步返回，双工循环继续消费 VAD 事件，打断检测不受识别耗时影响
+            future.add_done_callback(self._on_asr_result)
+        return True
+
+    def _on_asr_result(self, future):
+        try:
+            text, _ = future.result()
+        except Exception as e:
+            logger.error(f"ASR识别出错: {e}")
+            return
+        if not text or not text.strip():
+            logger.debug("识别结果为空，跳过处理。")
+            return
+
+        logger.debug(f"ASR识别结果: {text}")
+        if self.callback:
+            self.callback({"role": "user", "content": str(text)})
+        self.executor.submit(self.chat, text)
+
+    def _start_streaming_asr(self, seq):
+        """VAD 检测到语音开始时启动流式识别"""
+        if not getattr(self.asr, "supports_streaming", False):
+            return
+        self.asr_stream_executor.submit(self._call_asr, self.asr.start_stream)
+        self._stream_next_seq = seq
+
+    def _feed_streaming_asr(self, seq):
+        """把截至 seq 的新音频送入流式识别，输出部分识别结果"""
+        if self._stream_next_seq is None or seq < self._stream_next_seq:
+            return
+        audio = self.audio_buffer.gather(range(self._stream_next_seq, seq + 1))
+        self._stream_next_seq = seq + 1
+
+        def accept():
+            try:
+                partial = self._call_asr(self.asr.accept_stream, audio)
+            except Exception as e:
+                logger.error(f"流式ASR识别出错: {e}")
                 return
+            if partial:
+                logger.debug(f"ASR部分识别结果: {partial}")
+                if self.callback:
+                    # 部分结果会被后续的部分结果或最终识别结果替换
+                    self.callback({"role": "user", "content": partial, "partial": True})
 
-            logger.debug(f"ASR识别结果: {text}")
-            if self.callback:
-                self.callback({"role": "user", "content": str(text)})
-            self.executor.submit(self.chat, text)
-        return True
+        self.asr_stream_executor.submit(accept)
 
     def run(self):
         try:
@@ -285,14 +685,24 @@ class Robot(ABC):
         finally:
             self.shutdown()
 
-    def speak_and_play(self, text):
+    def speak_and_play(self, text, cancel_token=None):
         if text is None or len(text) <= 0:
             logger.info(f"无需tts转换，query为空，{text}")
             return None
+        if cancel_token is not None and cancel_token.cancelled:
+            logger.debug(f"对话已被打断，跳过tts转换，{text}")
+            return None
+        if self.tts_streaming:
+            # 流式合成：立即返回，播放器收到第一个音频块即可开始播放
+            return self.tts.stream(text, cancel_token)
         tts_file = self.tts.to_tts(text)
         if tts_file is None:
             logger.error(f"tts转换失败，{text}")
             return None
+        if cancel_token is not None and cancel_token.cancelled:
+            # 合成期间被打断，丢弃生成的音频
+            os.remove(tts_file)
+            return None
         logger.debug(f"TTS 文件生成完毕{self.chat_lock}")
         # if self.chat_lock is False:
         #    return None
@@ -301,20 +711,129 @@ class Robot(ABC):
         # return True
         return tts_file
 
+    def _submit_tts(self, text, cancel_token=None):
+        """提交 TTS 合成任务，按提交顺序放入播放队列；打断时未开始的合成直接取消"""
+        future = self.executor.submit(self.speak_and_play, text, cancel_token)
+        if cancel_token is not None:
+            cancel_token.add_callback(future.cancel)
+        self.tts_queue.put((future, cancel_token))
+        return future
+
+    def _response_cache_context(self):
+        """
+        返回 (是否使用响应缓存, 上文)。对话第一轮没有上文；之后的轮次以上一轮回复为上文，
+        追问只会命中上文也相近的缓存，first_turn_only 时直接跳过。
+        """
+        if self.response_cache is None:
+            return False, None
+        for message in reversed(self.dialogue.dialogue):
+            if message.role == "assistant" and message.content:
+                if self.response_cache.first_turn_only:
+                    return False, None
+                return True, message.content
+        return True, None
+
+    def _play_cached_response(self, query, context=None):
+        """响应缓存命中时直接播放缓存的音频，跳过 LLM 与 TTS"""
+        try:
+            entry = self.response_cache.lookup(query, context)
+        except Exception as e:
+            logger.error(f"响应缓存查找出错: {e}")
+            return False
+        if entry is None:
+            return False
+        cancel_token = CancellationToken()
+        self.turn_token = cancel_token
+        for audio_file in entry["audio_files"]:
+            future = Future()
+            future.set_result(audio_file)
+            self.tts_queue.put((future, cancel_token))
+
+        self.dialogue.put(Message(role="user", content=query))
+        if self.callback:
+            self.callback({"role": "assistant", "content": entry["text"]})
+        self.dialogue.put(Message(role="assistant", content=entry["text"]))
+        self.dialogue.dump_dialogue()
+        return True
+
+    def _store_response(self, query, text, tts_futures, context=None):
+        """等待本轮所有 TTS 合成完成后写入响应缓存，有片段合成失败时不缓存"""
+        try:
+            audio_files = [future.result(timeout=60) for future in tts_futures]
+            audio_files = [
+                f.wait(timeout=60) if isinstance(f, StreamingAudio) else f
+                for f in audio_files
+            ]
+        except Exception as e:
+            logger.debug(f"TTS 未全部完成，不写入响应缓存: {e}")
+            return
+        if all(audio_files):
+            try:
+                self.response_cache.store(query, text, audio_files, context)
+            except Exception as e:
+                logger.error(f"写入响应缓存出错: {e}")
+
+    def _stream_to_tts(
+        self, query, rag_context, cancel_token, response_message, tts_futures
+    ):
+        """
+        调用 LLM 并把流式输出交给断句器，断出的片段立即提交 TTS。
+        回复内容追加到 response_message，TTS 任务追加到 tts_futures，LLM 调用失败时返回 False
+        """
+        try:
+            start_time = time.time()  # 记录开始时间
+            llm_responses = self.llm.response(
+                self._build_llm_dialogue(rag_context), cancel_token
+            )
+        except Exception as e:
+            self.chat_lock = False
+            logger.error(f"LLM 处理出错 {query}: {e}")
+            return False
+        segmenter = SentenceSegmenter(**self.segmenter_config)
+        # 提交 TTS 任务到线程池
+        for content in llm_responses:
+            if cancel_token.cancelled:
+                break
+            if not content:
+                continue
+            response_message.append(content)
+            end_time = time.time()  # 记录结束时间
+            logger.debug(
+                f"大模型返回时间时间: {end_time - start_time} 秒, 生成token={content}"
+            )
+            for segment_text in segmenter.feed(content):
+                tts_futures.append(self._submit_tts(segment_text, cancel_token))
+        # 处理剩余的响应
+        if not cancel_token.cancelled:
+            for segment_text in segmenter.flush():
+                tts_futures.append(self._submit_tts(segment_text, cancel_token))
+        logger.debug(f"本轮断句统计: {segmenter.summary()}")
+        return True
+
     def chat(self, query):
+        task_mode = hasattr(self, "start_task_mode") and self.start_task_mode
+        use_cache, cache_context = (
+            (False, None) if task_mode else self._response_cache_context()
+        )
+        if use_cache and self._play_cached_response(query, cache_context):
+            return True
+
         # 获取RAG上下文
         rag_context = self._get_rag_context(query)
 
-        # 更新系统提示词包含RAG上下文
-        self._update_system_prompt(rag_context)
+        if self.prompt_layout != "cache_friendly":
+            # 更新系统提示词包含RAG上下文
+            self._update_system_prompt(rag_context)
 
         self.dialogue.put(Message(role="user", content=query))
         response_message = []
-        start = 0
         self.chat_lock = True
+        cancel_token = CancellationToken()
+        self.turn_token = cancel_token
+        tts_futures = []
 
         # 判断是否支持 function call
-        if hasattr(self, "start_task_mode") and self.start_task_mode:
+        if task_mode:
             if (
                 hasattr(self.llm, "supports_function_call")
                 and self.llm.supports_function_call
@@ -325,58 +844,14 @@ class Robot(ABC):
                     "当前 LLM 不支持 function call，已自动降级为普通对话模式。"
                 )
                 # 降级为普通对话
-                try:
-                    start_time = time.time()
-                    llm_responses = self.llm.response(self.dialogue.get_llm_dialogue())
-                except Exception as e:
-                    self.chat_lock = False
-                    logger.error(f"LLM 处理出错 {query}: {e}")
+                if not self._stream_to_tts(
+                    query, rag_context, cancel_token, response_message, tts_futures
+                ):
                     return None
-                for content in llm_responses:
-                    response_message.append(content)
-                    end_time = time.time()
-                    logger.debug(
-                        f"大模型返回时间时间: {end_time - start_time} 秒, 生成token={content}"
-                    )
-                    if is_segment(response_message):
-                        segment_text = "".join(response_message[start:])
-                        if len(segment_text) <= max(2, start):
-                            continue
-                        future = self.executor.submit(self.speak_and_play, segment_text)
-                        self.tts_queue.put(future)
-                        start = len(response_message)
-                if start < len(response_message):
-                    segment_text = "".join(response_message[start:])
-                    future = self.executor.submit(self.speak_and_play, segment_text)
-                    self.tts_queue.put(future)
-        else:
-            # 提交 LLM 任务
-            try:
-                start_time = time.time()  # 记录开始时间
-                llm_responses = self.llm.response(self.dialogue.get_llm_dialogue())
-            except Exception as e:
-                self.chat_lock = False
-                logger.error(f"LLM 处理出错 {query}: {e}")
-                return None
-            # 提交 TTS 任务到线程池
-            for content in llm_responses:
-                response_message.append(content)
-                end_time = time.time()  # 记录结束时间
-                logger.debug(
-                    f"大模型返回时间时间: {end_time - start_time} 秒, 生成token={content}"
-                )
-                if is_segment(response_message):
-                    segment_text = "".join(response_message[start:])
-                    if len(segment_text) <= max(2, start):
-                        continue
-                    future = self.executor.submit(self.speak_and_play, segment_text)
-                    self.tts_queue.put(future)
-                    start = len(response_message)
-            # 处理剩余的响应
-            if start < len(response_message):
-                segment_text = "".join(response_message[start:])
-                future = self.executor.submit(self.speak_and_play, segment_text)
-                self.tts_queue.put(future)
+        elif not self._stream_to_tts(
+            query, rag_context, cancel_token, response_message, tts_futures
+        ):
+            return None
 
         self.chat_lock = False
         # 更新对话
@@ -384,6 +859,14 @@ class Robot(ABC):
             self.callback({"role": "assistant", "content": "".join(response_message)})
         self.dialogue.put(Message(role="assistant", content="".join(response_message)))
         self.dialogue.dump_dialogue()
+        if use_cache and not cancel_token.cancelled and tts_futures:
+            self.executor.submit(
+                self._store_response,
+                query,
+                "".join(response_message),
+                tts_futures,
+                cache_context,
+            )
         logger.debug(
             json.dumps(self.dialogue.get_llm_dialogue(), indent=4, ensure_ascii=False)
         )
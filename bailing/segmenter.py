@@ -0,0 +1,243 @@
+import re
+import time
+
+from bailing import logger
+
+# 句末标点：遇到时在长度达到 min_chars 后断句
+STRONG_PUNCTUATION = set("。！？!?；;\n")
+# 分句标点：只有长度达到当前目标长度时才断句
+WEAK_PUNCTUATION = set("，,、：:…")
+# 紧跟在标点之后、应归入前一段的字符
+CLOSING_CHARS = set("\"'”’）)]」』》】")
+# 以点结尾但不表示句末的英文缩写
+ABBREVIATIONS = {
+    "mr",
+    "mrs",
+    "ms",
+    "dr",
+    "prof",
+    "sr",
+    "jr",
+    "st",
+    "vs",
+    "etc",
+    "e.g",
+    "i.e",
+    "u.s",
+    "no",
+    "fig",
+    "inc",
+    "ltd",
+    "co",
+}
+_SPEAKABLE = re.compile(r"\w")
+_WORD_BEFORE_DOT = re.compile(r"([A-Za-z.]+)$")
+
+
+class SentenceSegmenter:
+    """
+    流式断句：逐块接收 LLM 输出，增量扫描新到达的文本，切分为交给 TTS 的片段。
+
+    第一段在 first_min_chars 处遇到任意标点即断开，尽快开始合成与播放；
+    之后每段的目标长度按 growth 倍数增长（上限 max_chars），减少 TTS 调用次数。
+    句末标点只要长度达到 min_chars 即断句，分句标点需达到当前目标长度，
+    超过 max_chars 仍无标点时在最近的分句标点或空格处强制断开。
+    小数、千分位、时间中的标点和英文缩写不会被当作断句点。
+    每次断句的原因与耗时记录在 decisions 中，便于调整参数。
+    """
+
+    def __init__(
+        self,
+        first_min_chars=4,
+        min_chars=8,
+        target_chars=16,
+        growth=1.5,
+        max_chars=80,
+    ):
+        """
+        Args:
+            first_min_chars: 第一段的最短长度，达到后遇到任意标点即断句
+            min_chars: 之后各段遇到句末标点时的最短长度
+            target_chars: 第二段遇到分句标点时的目标长度，之后按 growth 增长
+            growth: 目标长度的增长倍数
+            max_chars: 单段最大长度
+        """
+        self.first_min_chars = first_min_chars
+        self.min_chars = min_chars
+        self.target_chars = target_chars
+        self.growth = growth
+        self.max_chars = max_chars
+        self.reset()
+
+    def reset(self):
+        self._buf = ""
+        # 下一次扫描的起始位置，之前的部分已判定过不需要断句
+        self._pos = 0
+        # 最近一个可以强制断开的位置（分句标点或空格之后）
+        self._soft = 0
+        self._start_time = None
+        self.segments = 0
+        self.decisions = []
+
+    def _target(self):
+        if self.segments == 0:
+            return self.first_min_chars
+        target = self.target_chars * self.growth ** (self.segments - 1)
+        return min(self.max_chars, int(target))
+
+    def _classify(self, i):
+        """判断 buf[i] 是否为断句点：返回 strong、weak、wait（需要后续字符才能判断）或 None"""
+        buf = self._buf
+        c = buf[i]
+        prev = buf[i - 1] if i else ""
+        nxt = buf[i + 1] if i + 1 < len(buf) else None
+        if c in STRONG_PUNCTUATION:
+            return "strong"
+        if c == ".":
+            if nxt is None:
+                return "wait"
+            if nxt == "." or (prev.isdigit() and nxt.isdigit()):
+                # 省略号在最后一个点处判断；小数不断句
+                return None
+            if not (nxt.isspace() or nxt in CLOSING_CHARS):
+                # 网址、文件名等
+                return None
+            word = _WORD_BEFORE_DOT.search(buf[:i])
+            word = word.group(1).lower() if word else ""
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                # 缩写与姓名首字母
+                return None
+            return "strong"
+        if c in ",:" and prev.isdigit():
+            # 1,000 与 10:30
+            if nxt is None:
+                return "wait"
+            if nxt.isdigit():
+                return None
+        if c in WEAK_PUNCTUATION:
+            return "weak"
+        return None
+
+    def _cut_end(self, i):
+        """断句点之后连续的标点与右引号、右括号一并归入本段"""
+        j = i + 1
+        buf = self._buf
+        while j < len(buf) and (
+            buf[j] in CLOSING_CHARS or buf[j] in STRONG_PUNCTUATION or buf[j] in ".…"
+        ):
+            j += 1
+        return j
+
+    def _emit(self, end, reason):
+        segment, self._buf = self._buf[:end], self._buf[end:]
+        self._pos = 0
+        self._soft = 0
+        segment = segment.strip()
+        if not _SPEAKABLE.search(segment):
+            # 只有标点的片段无需合成
+            return None
+        decision = {
+            "index": self.segments,
+            "text": segment,
+            "reason": reason,
+            "chars": len(segment),
+            "target": self._target(),
+            "elapsed_ms": round((time.time() - self._start_time) * 1000),
+        }
+        self.decisions.append(decision)
+        logger.debug(f"断句: {decision}")
+        self.segments += 1
+        return segment
+
+    def feed(self, text):
+        """接收一块新文本，返回本次可以交给 TTS 的完整片段列表"""
+        if not text:
+            return []
+        if self._start_time is None:
+            self._start_time = time.time()
+        self._buf += text
+        segments = []
+        i = self._pos
+        while i < len(self._buf):
+            kind = self._classify(i)
+            if kind == "wait":
+                break
+            length = len(self._buf[: i + 1].strip())
+            if kind is not None:
+                end = self._cut_end(i)
+                if end == len(self._buf) and kind == "strong":
+                    # 标点后可能还有右引号或更多标点，等下一块文本再决定
+                    break
+                threshold = (
+                    self.first_min_chars
+                    if self.segments == 0
+                    else (self.min_chars if kind == "strong" else self._target())
+                )
+                if length >= threshold:
+                    segment = self._emit(end, kind)
+                    if segment:
+                        segments.append(segment)
+                    i = 0
+                    continue
+                self._soft = end
+                i = end
+                continue
+            if self._buf[i].isspace():
+                self._soft = i + 1
+            if length >= self.max_chars:
+                segment = self._emit(self._soft or i + 1, "max")
+                if segment:
+                    segments.append(segment)
+                i = 0
+                continue
+            i += 1
+        self._pos = i
+        return segments
+
+    def flush(self):
+        """LLM 输出结束时，返回剩余的文本"""
+        if self._start_time is None:
+            return []
+        segment = self._emit(len(self._buf), "flush") if self._buf else None
+        return [segment] if segment else []
+
+    def summary(self):
+        """本轮断句的统计：片段数、首段出现时间与平均长度"""
+        if not self.decisions:
+            return {"segments": 0}
+        return {
+            "segments": len(self.decisions),
+            "first_segment_ms": self.decisions[0]["elapsed_ms"],
+            "first_segment_chars": self.decisions[0]["chars"],
+            "avg_chars": round(
+                sum(d["chars"] for d in self.decisions) / len(self.decisions), 1
+            ),
+            "reasons": [d["reason"] for d in self.decisions],
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="模拟流式输出，查看断句结果")
+    parser.add_argument(
+        "text",
+        nargs="?",
+        default=(
+            "好的，我来帮你查一下。今天北京的气温是 3.5 度，比昨天低了 2 度，"
+            "大概有 1,000 人参加了上午 10:30 的活动。Dr. Smith said it was great! "
+            "另外，明天可能会下雨，出门记得带伞哦。"
+        ),
+    )
+    parser.add_argument("--chunk", type=int, default=2, help="每次送入的字符数")
+    args = parser.parse_args()
+
+    segmenter = SentenceSegmenter()
+    for k in range(0, len(args.text), args.chunk):
+        for seg in segmenter.feed(args.text[k : k + args.chunk]):
+            print(f"-> {seg}")
+    for seg in segmenter.flush():
+        print(f"-> {seg}")
+    for d in segmenter.decisions:
+        print(d)
+    print(segmenter.summary())
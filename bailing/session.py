@@ -0,0 +1,141 @@
+import threading
+
+from bailing import logger
+
+
+class StreamSession:
+    """
+    远程音频流的独立 VAD/ASR 会话。
+
+    每个会话持有自己的 VAD 实例和语音帧序号，识别异步提交，
+    识别结果通过 on_text(session, text) 交给 Robot 处理。
+    """
+
+    def __init__(self, stream, vad, submit_recognition, on_text):
+        """
+        Args:
+            stream: RemoteStream，提供 session_id、buffer、send 与 closed
+            vad: 该会话使用的 VAD 实例
+            submit_recognition: 提交识别任务，接收 int16 数组，返回结果为 (text, file) 的 Future
+            on_text: 识别出非空文本时的回调
+        """
+        self.stream = stream
+        self.session_id = stream.session_id
+        self.vad = vad
+        self.submit_recognition = submit_recognition
+        self.on_text = on_text
+        self.speech = []
+        self.vad_start = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        buffer = self.stream.buffer
+        while not (self.stream.closed and buffer.empty()):
+            seq, frame = buffer.get(timeout=0.5)
+            if seq is None:
+                continue
+            try:
+                self.feed(seq, self.vad.is_vad(frame))
+            except Exception as e:
+                logger.error(f"会话 {self.session_id} VAD 处理出错: {e}")
+        self.finish()
+        logger.debug(f"会话 {self.session_id} 处理线程退出")
+
+    def finish(self):
+        """连接断开时仍在说话，则把已有的语音送去识别"""
+        if self.speech:
+            self._finish_utterance()
+
+    def feed(self, seq, vad_status):
+        """处理一帧的 VAD 结果"""
+        if self.vad_start:
+            self.speech.append(seq)
+        if vad_status is None:
+            return
+        if "start" in vad_status:
+            self.vad_start = True
+            self.speech = [seq]
+        elif "end" in vad_status and self.speech:
+            self._finish_utterance()
+
+    def _finish_utterance(self):
+        self.vad_start = False
+        voice_data = self.stream.buffer.gather(self.speech)
+        self.speech = []
+        future = self.submit_recognition(voice_data)
+        future.add_done_callback(self._on_recognized)
+
+    def _on_recognized(self, future):
+        try:
+            text, _ = future.result()
+        except Exception as e:
+            logger.error(f"会话 {self.session_id} ASR识别出错: {e}")
+            return
+        if not text or not text.strip():
+            logger.debug(f"会话 {self.session_id} 识别结果为空，跳过处理。")
+            return
+        logger.debug(f"会话 {self.session_id} ASR识别结果: {text}")
+        self.stream.send({"type": "asr", "text": text})
+        self.on_text(self, text)
+
+
+class BatchedVADRunner:
+    """
+    用单个线程驱动所有会话的批量 VAD：每一轮从各会话缓冲区各取一帧，
+    合并为一次 process_batch 推理，再把结果分发给各会话。
+    """
+
+    def __init__(self, vad):
+        self.vad = vad
+        self.sessions = {}
+        # 任一会话的缓冲区有新数据或流结束时置位，没有数据时批处理线程阻塞等待
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, session):
+        with self._lock:
+            self.vad.add_stream(session.session_id)
+            self.sessions[session.session_id] = session
+        session.stream.buffer.add_listener(self._wakeup)
+
+    def _collect(self):
+        frames, seqs = {}, {}
+        with self._lock:
+            sessions = list(self.sessions.items())
+        for session_id, session in sessions:
+            buffer = session.stream.buffer
+            seq, frame = buffer.get(timeout=0)
+            if seq is not None:
+                frames[session_id] = frame
+                seqs[session_id] = seq
+            elif session.stream.closed and buffer.empty():
+                session.finish()
+                with self._lock:
+                    self.sessions.pop(session_id, None)
+                    self.vad.remove_stream(session_id)
+                logger.debug(f"会话 {session_id} 已移出批量 VAD")
+        return frames, seqs
+
+    def _run(self):
+        while True:
+            # 先清除再收集，收集期间到达的数据会重新置位，不会丢失唤醒
+            self._wakeup.clear()
+            frames, seqs = self._collect()
+            if not frames:
+                self._wakeup.wait()
+                continue
+            try:
+                results = self.vad.process_batch(frames)
+            except Exception as e:
+                logger.error(f"批量 VAD 处理出错: {e}")
+                continue
+            for session_id, vad_status in results.items():
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    session.feed(seqs[session_id], vad_status)
@@ -0,0 +1,119 @@
+import importlib.util
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from bailing import logger
+
+# 共享的 HTTP 传输层：LLM、Memory 与回调推送复用同一个带连接池的 httpx 客户端，
+# 保持长连接，避免每轮对话都重新进行 TCP/TLS 握手
+
+DEFAULT_CONFIG = {
+    "http2": True,
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 120,
+    "timeout": {"connect": 5, "read": 60, "write": 10, "pool": 5},
+    "prewarm": True,
+    "prewarm_timeout": 5,
+}
+
+_config = dict(DEFAULT_CONFIG)
+_client = None
+_lock = threading.Lock()
+# 各主机最近一次收到响应的时间，用于判断连接是否可能已被回收
+_last_activity = {}
+
+
+def configure(config):
+    """设置连接池参数，需在首次调用 get_client 之前完成"""
+    global _config
+    with _lock:
+        if _client is not None:
+            logger.warning("HTTP 客户端已创建，新的传输配置不会生效")
+            return
+        _config = {**DEFAULT_CONFIG, **(config or {})}
+
+
+def _origin(url):
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _record_activity(response):
+    _last_activity[_origin(response.request.url)] = time.monotonic()
+
+
+def _build_client():
+    http2 = _config.get("http2", False)
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1")
+        http2 = False
+    timeout = {**DEFAULT_CONFIG["timeout"], **(_config.get("timeout") or {})}
+    limits = httpx.Limits(
+        max_connections=_config.get("max_connections"),
+        max_keepalive_connections=_config.get("max_keepalive_connections"),
+        keepalive_expiry=_config.get("keepalive_expiry"),
+    )
+    logger.debug(f"创建共享 HTTP 客户端: http2={http2}, limits={limits}")
+    return httpx.Client(
+        http2=http2,
+        limits=limits,
+        timeout=httpx.Timeout(**timeout),
+        follow_redirects=True,
+        event_hooks={"response": [_record_activity]},
+    )
+
+
+def get_client():
+    """返回进程内共享的 httpx 客户端"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def prewarm(url):
+    """
+    向目标主机发送一次轻量请求，提前建立连接并放入连接池。
+    只关心连接本身，响应状态码不做检查。
+    """
+    if not url or not _config.get("prewarm", True):
+        return
+    origin = _origin(url)
+    start_time = time.time()
+    try:
+        get_client().head(origin, timeout=_config.get("prewarm_timeout"))
+        logger.debug(f"{origin} 连接预热耗时 {time.time() - start_time:.3f} 秒")
+    except httpx.HTTPError as e:
+        logger.warning(f"{origin} 连接预热失败: {e}")
+
+
+def keep_warm(url, executor=None):
+    """
+    连接空闲时间接近 keepalive_expiry 时在后台重新预热，
+    适合在用户开始说话时调用，让握手与 ASR 识别重叠。
+    """
+    if not url or not _config.get("prewarm", True):
+        return
+    idle = time.monotonic() - _last_activity.get(_origin(url), float("-inf"))
+    if idle < _config.get("keepalive_expiry", 0) * 0.8:
+        return
+    # 先记录，避免同一段语音内重复触发
+    _last_activity[_origin(url)] = time.monotonic()
+    if executor is not None:
+        executor.submit(prewarm, url)
+    else:
+        threading.Thread(target=prewarm, args=(url,), daemon=True).start()
+
+
+def close():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -1,29 +1,168 @@
 import asyncio
+import hashlib
+import json
 from bailing import logger
+from bailing.utils import read_json_file, write_json_file
 import os
+import queue
+import re
+import shutil
 import subprocess
+import threading
 import time
 import uuid
+import unicodedata
+import wave
 from abc import ABC, ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from gtts import gTTS
-import edge_tts
-import ChatTTS
-import torch
-import torchaudio
-import soundfile as sf
+
+# 各后端的第三方依赖在类初始化时按需导入，未选用的后端缺少依赖不影响其它后端
+
+
+class StreamingAudio:
+    """
+    流式合成的音频：生产线程从 TTS 的分块输出中读取 16 位单声道 PCM，
+    放入队列供播放器边收边播，同时写入 wav 文件，供不支持流式播放的播放器和缓存使用。
+    合成失败、没有输出音频或被打断时删除 wav 文件，error 记录失败原因，wait 返回 None。
+    """
+
+    _END = object()
+
+    def __init__(self, chunks, sample_rate, spool_file, cancel_token=None):
+        self.sample_rate = sample_rate
+        self.file = spool_file
+        self.cancel_token = cancel_token
+        self.first_chunk_time = None
+        # 合成总耗时（秒），合成结束后才有值
+        self.duration = None
+        self.error = None
+        self._queue = queue.Queue()
+        self._done = threading.Event()
+        self._start_time = time.time()
+        threading.Thread(target=self._produce, args=(chunks,), daemon=True).start()
+
+    def _produce(self, chunks):
+        try:
+            with wave.open(self.file, "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(self.sample_rate)
+                for chunk in chunks:
+                    if self.cancel_token is not None and self.cancel_token.cancelled:
+                        chunks.close()
+                        break
+                    if not chunk:
+                        continue
+                    if self.first_chunk_time is None:
+                        self.first_chunk_time = time.time() - self._start_time
+                        logger.debug(
+                            f"流式TTS首个音频块耗时 {self.first_chunk_time:.3f} 秒"
+                        )
+                    self._queue.put(chunk)
+                    wf.writeframes(chunk)
+            if self.cancel_token is not None and self.cancel_token.cancelled:
+                # 被打断的合成不保留音频文件
+                self._discard()
+                logger.debug(f"流式TTS合成被打断：{self.file}")
+            elif self.first_chunk_time is None:
+                raise RuntimeError("TTS 没有输出音频")
+            else:
+                self.duration = time.time() - self._start_time
+                logger.debug(f"流式TTS合成完成，耗时 {self.duration:.2f} 秒")
+        except Exception as e:
+            self.error = e
+            # 空的或只有部分内容的文件不能交给播放器和缓存
+            self._discard()
+            logger.error(f"流式TTS合成失败: {e}")
+        finally:
+            self._queue.put(self._END)
+            self._done.set()
+
+    def _discard(self):
+        if os.path.exists(self.file):
+            os.remove(self.file)
+
+    def __iter__(self):
+        """按到达顺序返回 PCM 块，合成结束后停止"""
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._END:
+                self._queue.put(self._END)
+                return
+            yield chunk
+
+    def wait(self, timeout=None):
+        """等待合成结束，返回完整的 wav 文件路径，失败或被取消时返回 None"""
+        if not self._done.wait(timeout):
+            return None
+        if self.error is not None or self.first_chunk_time is None:
+            return None
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            return None
+        return self.file
 
 
 class AbstractTTS(ABC):
     __metaclass__ = ABCMeta
+    # 是否实现了边合成边输出的 to_tts_stream
+    supports_streaming = False
+    # to_tts_stream 输出的 PCM 采样率
+    stream_sample_rate = 24000
+    # to_tts_stream 每块音频的时长（毫秒）
+    stream_chunk_ms = 100
 
     @abstractmethod
     def to_tts(self, text):
         pass
 
+    def to_tts_stream(self, text):
+        """
+        分块返回 16 位单声道 PCM（bytes）。
+        默认实现先用 to_tts 整段合成再解码分块输出，首块延迟与整段合成相同；
+        支持流式合成的后端覆盖此方法并将 supports_streaming 置为 True。
+        """
+        from pydub import AudioSegment
+
+        audio_file = self.to_tts(text)
+        if audio_file is None:
+            raise RuntimeError(f"{type(self).__name__} 合成失败")
+        try:
+            audio = (
+                AudioSegment.from_file(audio_file)
+                .set_channels(1)
+                .set_sample_width(2)
+                .set_frame_rate(self.stream_sample_rate)
+            )
+        finally:
+            os.remove(audio_file)
+        pcm = audio.raw_data
+        chunk_bytes = self.stream_sample_rate * 2 * self.stream_chunk_ms // 1000
+        for i in range(0, len(pcm), chunk_bytes):
+            yield pcm[i : i + chunk_bytes]
+
+    def stream(self, text, cancel_token=None):
+        """开始流式合成，立即返回 StreamingAudio，完整音频同时保存为 wav 文件"""
+        spool_file = os.path.join(
+            getattr(self, "output_file", None) or "tmp/",
+            f"tts-{datetime.now().date()}@{uuid.uuid4().hex}.wav",
+        )
+        return StreamingAudio(
+            self.to_tts_stream(text), self.stream_sample_rate, spool_file, cancel_token
+        )
+
+    def warmup(self, text="你好"):
+        """合成一句短文本，完成模型加载后的首次推理或网络连接，随后删除生成的文件"""
+        tts_file = self.to_tts(text)
+        if tts_file and os.path.exists(tts_file):
+            os.remove(tts_file)
+
 
 class GTTS(AbstractTTS):
     def __init__(self, config):
+        from gtts import gTTS
+
+        self.gTTS = gTTS
         self.output_file = config.get("output_file")
         self.lang = config.get("lang")
 
@@ -42,7 +181,7 @@ class GTTS(AbstractTTS):
         tmpfile = self._generate_filename(".aiff")
         try:
             start_time = time.time()
-            tts = gTTS(text=text, lang=self.lang)
+            tts = self.gTTS(text=text, lang=self.lang)
             tts.save(tmpfile)
             self._log_execution_time(start_time)
             return tmpfile
@@ -95,9 +234,20 @@ class MacTTS(AbstractTTS):
 
 
 class EdgeTTS(AbstractTTS):
+    supports_streaming = True
+
     def __init__(self, config):
+        import edge_tts
+
+        self.edge_tts = edge_tts
         self.output_file = config.get("output_file", "tmp/")
         self.voice = config.get("voice")
+        # 流式合成时 edge-tts 返回 mp3 分块，通过 ffmpeg 管道实时解码为 PCM
+        self.streaming = config.get("streaming", False)
+        self.ffmpeg = config.get("ffmpeg", "ffmpeg")
+        if self.streaming and shutil.which(self.ffmpeg) is None:
+            logger.warning(f"未找到 ffmpeg（{self.ffmpeg}），EdgeTTS 使用整段合成")
+            self.streaming = False
 
     def _generate_filename(self, extension=".wav"):
         return os.path.join(
@@ -111,7 +261,7 @@ class EdgeTTS(AbstractTTS):
         logger.debug(f"Execution Time: {execution_time:.2f} seconds")
 
     async def text_to_speak(self, text, output_file):
-        communicate = edge_tts.Communicate(
+        communicate = self.edge_tts.Communicate(
             text, voice=self.voice
         )  # Use your preferred voice
         await communicate.save(output_file)
@@ -127,9 +277,83 @@ class EdgeTTS(AbstractTTS):
             logger.info(f"Failed to generate TTS file: {e}")
             return None
 
+    def _feed_mp3(self, text, stdin, errors):
+        """在独立线程的事件循环中接收 edge-tts 的 mp3 分块并写入 ffmpeg，出错时记录到 errors"""
+
+        async def run():
+            communicate = self.edge_tts.Communicate(text, voice=self.voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    stdin.write(chunk["data"])
+                    stdin.flush()
+
+        try:
+            asyncio.run(run())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def to_tts_stream(self, text):
+        process = subprocess.Popen(
+            [
+                self.ffmpeg,
+                "-loglevel",
+                "error",
+                "-f",
+                "mp3",
+                "-i",
+                "pipe:0",
+                "-f",
+                "s16le",
+                "-ac",
+                "1",
+                "-ar",
+                str(self.stream_sample_rate),
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        errors = []
+        feeder = threading.Thread(
+            target=self._feed_mp3, args=(text, process.stdin, errors), daemon=True
+        )
+        feeder.start()
+        remainder = b""
+        try:
+            while True:
+                data = process.stdout.read1(4096)
+                if not data:
+                    break
+                # 保证每块都是完整的 16 位采样
+                data = remainder + data
+                cut = len(data) - len(data) % 2
+                remainder = data[cut:]
+                yield data[:cut]
+            feeder.join()
+            if errors:
+                raise errors[0]
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
 
 class CHATTTS(AbstractTTS):
     def __init__(self, config):
+        import ChatTTS
+        import torch
+        import torchaudio
+
+        self.ChatTTS = ChatTTS
+        self.torch = torch
+        self.torchaudio = torchaudio
         self.output_file = config.get("output_file", ".")
         self.chat = ChatTTS.Chat()
         self.chat.load(compile=False)  # Set to True for better performance
@@ -150,13 +374,13 @@ class CHATTTS(AbstractTTS):
         tmpfile = self._generate_filename(".wav")
         start_time = time.time()
         try:
-            params_infer_code = ChatTTS.Chat.InferCodeParams(
+            params_infer_code = self.ChatTTS.Chat.InferCodeParams(
                 spk_emb=self.rand_spk,  # add sampled speaker
                 temperature=0.3,  # using custom temperature
                 top_P=0.7,  # top P decode
                 top_K=20,  # top K decode
             )
-            params_refine_text = ChatTTS.Chat.RefineTextParams(
+            params_refine_text = self.ChatTTS.Chat.RefineTextParams(
                 prompt="[oral_2][laugh_0][break_6]",
             )
             wavs = self.chat.infer(
@@ -165,9 +389,11 @@ class CHATTTS(AbstractTTS):
                 params_infer_code=params_infer_code,
             )
             try:
-                torchaudio.save(tmpfile, torch.from_numpy(wavs[0]).unsqueeze(0), 24000)
+                self.torchaudio.save(
+                    tmpfile, self.torch.from_numpy(wavs[0]).unsqueeze(0), 24000
+                )
             except:
-                torchaudio.save(tmpfile, torch.from_numpy(wavs[0]), 24000)
+                self.torchaudio.save(tmpfile, self.torch.from_numpy(wavs[0]), 24000)
             self._log_execution_time(start_time)
             return tmpfile
         except Exception as e:
@@ -176,15 +402,21 @@ class CHATTTS(AbstractTTS):
 
 
 class KOKOROTTS(AbstractTTS):
+    supports_streaming = True
+
     def __init__(self, config):
         from kokoro import KPipeline
+        import soundfile
 
+        self.soundfile = soundfile
         self.output_file = config.get("output_file", ".")
         self.lang = config.get("lang", "z")
         self.pipeline = KPipeline(
             lang_code=self.lang
         )  # <= make sure lang_code matches voice
         self.voice = config.get("voice", "zm_yunyang")
+        # 流式合成时按管线切分的每一段音频依次输出
+        self.streaming = config.get("streaming", False)
 
     def _generate_filename(self, extension=".wav"):
         return os.path.join(
@@ -209,13 +441,291 @@ class KOKOROTTS(AbstractTTS):
             )
             for i, (gs, ps, audio) in enumerate(generator):
                 logger.debug(f"KOKOROTTS: i: {i}, gs：{gs}, ps：{ps}")  # i => index
-                sf.write(tmpfile, audio, 24000)  # save each audio file
+                self.soundfile.write(tmpfile, audio, 24000)  # save each audio file
             self._log_execution_time(start_time)
             return tmpfile
         except Exception as e:
             logger.error(f"Failed to generate TTS file: {e}")
             return None
 
+    def to_tts_stream(self, text):
+        import numpy as np
+
+        generator = self.pipeline(text, voice=self.voice, speed=1, split_pattern=r"\n+")
+        for gs, ps, audio in generator:
+            if audio is None:
+                continue
+            audio = np.asarray(audio, dtype=np.float32)
+            yield (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+class CachedTTS(AbstractTTS):
+    """
+    TTS 音频缓存：包装任意 AbstractTTS，以（后端、音色、参数、规范化文本）的 sha256 为键，
+    把合成结果保存在磁盘上。总大小超过 max_size_mb 时按最近使用时间（文件 mtime）淘汰。
+    同一文本并发合成时只调用一次后端，其余调用等待结果；命中时返回缓存文件的临时副本。
+    写入缓存优先硬链接合成结果，淘汰与索引落盘在后台线程完成，不拖慢未命中时的首次播放。
+    """
+
+    # 不影响合成结果、不参与缓存键的后端属性
+    IGNORED_PARAMS = {"output_file", "streaming", "ffmpeg"}
+    # 按键分片的锁数量；流式合成期间持有锁，分片多一些以减少不同文本之间的等待
+    LOCK_STRIPES = 256
+
+    def __init__(
+        self, tts, cache_dir="tmp/tts_cache", max_size_mb=200, stats_interval=20
+    ):
+        """
+        Args:
+            tts: 被包装的 TTS 实例
+            cache_dir: 缓存音频与索引的保存目录
+            max_size_mb: 缓存总大小上限（MB）
+            stats_interval: 每隔多少次合成输出一次命中统计，0 表示不输出
+        """
+        self.tts = tts
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.stats_interval = stats_interval
+        self.output_file = getattr(tts, "output_file", None) or "tmp/"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_file = os.path.join(self.cache_dir, "index.json")
+
+        self._lock = threading.Lock()
+        # 按键分片的锁，保证同一文本只合成一次，锁的数量固定
+        self._key_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        # 淘汰、索引落盘与无法硬链接时的复制在后台执行，不阻塞首次播放
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tts-cache"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._params = self._backend_params()
+        # key -> {"file", "size", "seconds"}
+        self.index = self._load_index()
+        self.total_bytes = sum(entry["size"] for entry in self.index.values())
+        logger.info(
+            f"TTS 缓存已加载 {len(self.index)} 条，共 {self.total_bytes / 1024 / 1024:.1f} MB"
+        )
+
+    @property
+    def supports_streaming(self):
+        return self.tts.supports_streaming
+
+    @property
+    def streaming(self):
+        return getattr(self.tts, "streaming", False)
+
+    def _backend_params(self):
+        """后端名称与影响合成结果的简单参数（音色、语言、语速等）"""
+        params = {
+            k: v
+            for k, v in vars(self.tts).items()
+            if not k.startswith("_")
+            and k not in self.IGNORED_PARAMS
+            and isinstance(v, (str, int, float, bool, type(None)))
+        }
+        return {"backend": type(self.tts).__name__, "params": params}
+
+    @staticmethod
+    def normalize(text):
+        """全角转半角、合并空白，使只有格式差异的文本命中同一条缓存"""
+        text = unicodedata.normalize("NFKC", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def cache_key(self, text, output="file"):
+        """
+        output 区分合成方式：file 为 to_tts 的输出，stream 为流式合成保存的 wav。
+        两者格式可能不同（如 EdgeTTS 整段合成得到的是 mp3 数据），不能互相命中。
+        """
+        payload = json.dumps(
+            {**self._params, "text": self.normalize(text), "output": output},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        index = read_json_file(self.index_file) or {}
+        # 丢弃文件已不存在的条目
+        return {k: v for k, v in index.items() if os.path.exists(v["file"])}
+
+    def _save_index(self):
+        write_json_file(self.index_file, self.index)
+
+    def _key_lock(self, key):
+        return self._key_locks[int(key, 16) % self.LOCK_STRIPES]
+
+    def _materialize(self, path):
+        """为缓存音频生成一个临时副本（优先硬链接），调用方可以随意处理或删除"""
+        target = os.path.join(
+            self.output_file,
+            f"tts-cache-{uuid.uuid4().hex}{os.path.splitext(path)[1]}",
+        )
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+        return target
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(entry["file"]):
+                self.total_bytes -= entry["size"]
+                del self.index[key]
+                return None
+            # 以 mtime 记录最近使用时间
+            os.utime(entry["file"])
+            self.hits += 1
+            self.saved_seconds += entry["seconds"]
+            # 持锁生成副本，避免后台淘汰在此期间删除缓存文件
+            audio_file = self._materialize(entry["file"])
+        self._log_stats()
+        return audio_file
+
+    def _store(self, key, audio_file, seconds):
+        """硬链接合成结果到缓存目录；无法硬链接（如跨文件系统）时在后台复制"""
+        target = os.path.join(self.cache_dir, key + os.path.splitext(audio_file)[1])
+        try:
+            if os.path.exists(target):
+                os.remove(target)
+            os.link(audio_file, target)
+        except OSError:
+            self._executor.submit(
+                self._copy_and_register, key, audio_file, target, seconds
+            )
+            return
+        self._register(key, target, seconds)
+
+    def _copy_and_register(self, key, audio_file, target, seconds):
+        try:
+            shutil.copyfile(audio_file, target)
+        except OSError as e:
+            logger.warning(f"写入 TTS 缓存失败: {e}")
+            return
+        self._register(key, target, seconds)
+
+    def _register(self, key, target, seconds):
+        size = os.path.getsize(target)
+        with self._lock:
+            previous = self.index.get(key)
+            if previous is not None:
+                self.total_bytes -= previous["size"]
+            self.index[key] = {"file": target, "size": size, "seconds": seconds}
+            self.total_bytes += size
+        self._executor.submit(self._persist)
+
+    def _persist(self):
+        with self._lock:
+            self._evict()
+            self._save_index()
+
+    def flush(self):
+        """等待后台的复制、淘汰与索引落盘完成"""
+        self._executor.submit(lambda: None).result()
+
+    def _evict(self):
+        """超过大小上限时删除最久未使用的文件"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        entries = sorted(
+            self.index.items(),
+            key=lambda item: (
+                os.path.getmtime(item[1]["file"])
+                if os.path.exists(item[1]["file"])
+                else 0
+            ),
+        )
+        for key, entry in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if os.path.exists(entry["file"]):
+                os.remove(entry["file"])
+            self.total_bytes -= entry["size"]
+            del self.index[key]
+            logger.debug(f"TTS 缓存淘汰: {entry['file']}")
+
+    def to_tts(self, text):
+        key = self.cache_key(text)
+        audio_file = self._lookup(key)
+        if audio_file is not None:
+            return audio_file
+        with self._key_lock(key):
+            # 等待期间其它线程可能已合成同一文本
+            audio_file = self._lookup(key)
+            if audio_file is not None:
+                return audio_file
+            start_time = time.time()
+            audio_file = self.tts.to_tts(text)
+            seconds = time.time() - start_time
+            with self._lock:
+                self.misses += 1
+            if audio_file is not None:
+                self._store(key, audio_file, seconds)
+        self._log_stats()
+        return audio_file
+
+    def stream(self, text, cancel_token=None):
+        """
+        命中时直接返回缓存文件；未命中时流式合成，合成完成后在后台写入缓存。
+        键锁一直持有到合成结束，同一文本的并发请求等待后直接命中缓存。
+        """
+        key = self.cache_key(text, "stream")
+        audio_file = self._lookup(key)
+        if audio_file is not None:
+            return audio_file
+        lock = self._key_lock(key)
+        lock.acquire()
+        try:
+            # 等待期间其它线程可能已合成同一文本
+            audio_file = self._lookup(key)
+            stream = None if audio_file else self.tts.stream(text, cancel_token)
+        except BaseException:
+            lock.release()
+            raise
+        if stream is None:
+            lock.release()
+            return audio_file
+        with self._lock:
+            self.misses += 1
+
+        def store():
+            try:
+                audio_file = stream.wait()
+                if audio_file is not None:
+                    self._store(key, audio_file, stream.duration)
+            finally:
+                lock.release()
+
+        threading.Thread(target=store, daemon=True).start()
+        self._log_stats()
+        return stream
+
+    def warmup(self, text="你好"):
+        self.tts.warmup(text)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.index),
+                "size_mb": round(self.total_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+            }
+
+    def _log_stats(self):
+        total = self.hits + self.misses
+        if self.stats_interval and total and total % self.stats_interval == 0:
+            logger.info(f"TTS 缓存统计: {self.stats()}")
+
 
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
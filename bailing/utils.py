@@ -2,6 +2,7 @@ import yaml
 import json
 import re
 import os
+import threading
 
 from bailing import logger
 
@@ -35,6 +36,42 @@ def read_config(config_path):
     return config
 
 
+class CancellationToken:
+    """
+    一轮对话的取消令牌：用户打断时由 Robot 调用 cancel()，
+    LLM 流式输出、TTS 合成与播放在各自的检查点查看 cancelled 并尽快退出。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"取消回调出错: {e}")
+
+    def add_callback(self, callback):
+        """注册取消时执行的回调（如关闭 HTTP 流），已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
 def is_segment(tokens):
     if tokens[-1] in (",", ".", "?", "，", "。", "？", "！", "!", ";", "；", ":", "："):
         return True
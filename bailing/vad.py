@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
+import importlib.util
 import logging
+import os
+import threading
 
 import numpy as np
-import torch
-from silero_vad import load_silero_vad, VADIterator
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +17,75 @@ class VAD(ABC):
     def reset_states(self):
         pass
 
+    def warmup(self, frames=4):
+        """用低幅噪声做几次推理，完成模型的首次分配与 JIT，随后重置状态"""
+        rng = np.random.default_rng(0)
+        for _ in range(frames):
+            self.is_vad((rng.standard_normal(512) * 100).astype(np.int16))
+        self.reset_states()
+
+
+class EnergyGate:
+    """
+    基于能量（RMS）与过零率（ZCR）的前置静音门限，带自适应噪声底。
+    明显静音的帧直接判定为静音，无需运行神经网络模型。
+    """
+
+    def __init__(self, config):
+        # 绝对能量下限（int16 幅度），低于此值一定视为静音
+        self.min_rms = config.get("min_rms", 150)
+        # 能量需超过噪声底的倍数才可能是语音
+        self.snr_ratio = config.get("snr_ratio", 2.0)
+        # 过零率高于该值且能量略高于噪声底时，视为清辅音而放行
+        self.zcr_threshold = config.get("zcr_threshold", 0.25)
+        # 检测到非静音后继续放行的帧数，避免切掉语音起始和弱音节
+        self.hangover_frames = config.get("hangover_frames", 8)
+        # 噪声底的指数平滑系数
+        self.noise_adapt = config.get("noise_adapt", 0.05)
+        self.reset_states()
+        self.checked = 0
+        self.skipped = 0
+
+    def reset_states(self):
+        self.noise_floor = float(self.min_rms)
+        self.hangover = 0
+
+    def is_silent(self, audio_int16):
+        self.checked += 1
+        if self.checked % 1000 == 0:
+            logger.debug(
+                f"VAD 前置门限跳过 {self.skipped}/{self.checked} 帧, "
+                f"噪声底 {self.noise_floor:.1f}"
+            )
+        samples = audio_int16.astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        signs = np.signbit(audio_int16)
+        zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / len(audio_int16)
+
+        threshold = max(self.min_rms, self.noise_floor * self.snr_ratio)
+        silent = rms < threshold and not (
+            zcr > self.zcr_threshold and rms > self.noise_floor * 1.5
+        )
+        if silent:
+            # 只用静音帧更新噪声底，避免被语音抬高
+            self.noise_floor += self.noise_adapt * (rms - self.noise_floor)
+            self.noise_floor = max(self.noise_floor, 1.0)
+            if self.hangover > 0:
+                self.hangover -= 1
+                return False
+            self.skipped += 1
+            return True
+        self.hangover = self.hangover_frames
+        return False
+
 
 class SileroVAD(VAD):
     def __init__(self, config):
+        import torch
+        from silero_vad import load_silero_vad, VADIterator
+
         logger.debug("Initializing SileroVAD with config: %s", config)
+        self.torch = torch
         self.model = load_silero_vad()
         self.sampling_rate = config.get("sampling_rate")
         self.threshold = config.get("threshold")
@@ -31,6 +97,25 @@ class SileroVAD(VAD):
             min_silence_duration_ms=self.min_silence_duration_ms,
         )
         logger.debug(f"VAD Iterator initialized with model {self.model}")
+        gate_config = config.get("pre_gate") or {}
+        self.gate = EnergyGate(gate_config) if gate_config.get("enabled") else None
+        self._gated = False
+
+    def _skip_by_gate(self, audio_int16):
+        """
+        前置门限判定为静音时跳过模型，只推进采样计数以保持时间戳一致；
+        门限重新放行时重置模型的循环状态，相当于从静音开始推理。
+        """
+        if self.gate is None or self.vad_iterator.triggered:
+            return False
+        if self.gate.is_silent(audio_int16):
+            self.vad_iterator.current_sample += len(audio_int16)
+            self._gated = True
+            return True
+        if self._gated:
+            self.model.reset_states()
+            self._gated = False
+        return False
 
     @staticmethod
     def int2float(sound):
@@ -42,9 +127,15 @@ class SileroVAD(VAD):
 
     def is_vad(self, data):
         try:
-            audio_int16 = np.frombuffer(data, dtype=np.int16)
+            audio_int16 = (
+                data
+                if isinstance(data, np.ndarray)
+                else np.frombuffer(data, dtype=np.int16)
+            )
+            if self._skip_by_gate(audio_int16):
+                return None
             audio_float32 = self.int2float(audio_int16)
-            vad_output = self.vad_iterator(torch.from_numpy(audio_float32))
+            vad_output = self.vad_iterator(self.torch.from_numpy(audio_float32))
             if vad_output is not None:
                 logger.debug(f"VAD output: {vad_output}")
             return vad_output
@@ -55,10 +146,311 @@ class SileroVAD(VAD):
     def reset_states(self):
         try:
             self.vad_iterator.reset_states()  # Reset model states after each audio
+            if self.gate is not None:
+                self.gate.reset_states()
+                self._gated = False
             logger.debug("VAD states reset.")
         except Exception as e:
             logger.error(f"Error resetting VAD states: {e}")
 
+    def warmup(self, frames=4):
+        # 绕过前置门限，确保模型真正执行推理
+        audio = np.random.default_rng(0).standard_normal(512).astype(np.float32) * 0.01
+        for _ in range(frames):
+            self.vad_iterator(self.torch.from_numpy(audio))
+        self.reset_states()
+
+
+class SpeechStateMachine:
+    """
+    单路音频的起止判定状态机，与 silero_vad.VADIterator 的逻辑一致，
+    但只接收语音概率，便于多路共享一次批量推理。
+    """
+
+    def __init__(
+        self,
+        threshold=0.5,
+        sampling_rate=16000,
+        min_silence_duration_ms=100,
+        speech_pad_ms=30,
+    ):
+        self.threshold = threshold
+        self.min_silence_samples = sampling_rate * min_silence_duration_ms / 1000
+        self.speech_pad_samples = sampling_rate * speech_pad_ms / 1000
+        self.reset_states()
+
+    def reset_states(self):
+        self.triggered = False
+        self.temp_end = 0
+        self.current_sample = 0
+
+    def __call__(self, speech_prob, window_size_samples):
+        self.current_sample += window_size_samples
+
+        if speech_prob >= self.threshold and self.temp_end:
+            self.temp_end = 0
+
+        if speech_prob >= self.threshold and not self.triggered:
+            self.triggered = True
+            speech_start = max(
+                0,
+                self.current_sample - self.speech_pad_samples - window_size_samples,
+            )
+            return {"start": int(speech_start)}
+
+        if speech_prob < self.threshold - 0.15 and self.triggered:
+            if not self.temp_end:
+                self.temp_end = self.current_sample
+            if self.current_sample - self.temp_end < self.min_silence_samples:
+                return None
+            speech_end = self.temp_end + self.speech_pad_samples - window_size_samples
+            self.temp_end = 0
+            self.triggered = False
+            return {"end": int(speech_end)}
+
+        return None
+
+
+class _SileroJitModel:
+    """
+    TorchScript Silero 模型的无状态封装：隐藏状态与上下文由调用方显式传入，
+    这样多路音频可以共用一个模型做批量推理。依赖 silero-vad 5.x 的内部子模块
+    _model/_model_8k，其 forward(x, state) 接收带上下文的输入。
+    """
+
+    def __init__(self, sampling_rate):
+        import torch
+        from silero_vad import load_silero_vad
+
+        self.torch = torch
+        self.model = load_silero_vad()
+        self.net = self.model._model if sampling_rate == 16000 else self.model._model_8k
+        self.context_size = 64 if sampling_rate == 16000 else 32
+
+    def initial_state(self):
+        return np.zeros((2, 128), dtype=np.float32)
+
+    def __call__(self, x, state):
+        """
+        Args:
+            x: (B, context_size + window) float32
+            state: (2, B, 128) float32
+        Returns:
+            (B,) 语音概率与新的隐藏状态 (2, B, 128)
+        """
+        with self.torch.no_grad():
+            out, new_state = self.net(
+                self.torch.from_numpy(x), self.torch.from_numpy(state)
+            )
+        return out.numpy().reshape(-1), new_state.numpy()
+
+
+class _SileroOnnxModel:
+    """
+    ONNX Runtime 版本的 Silero 模型，接口与 _SileroJitModel 相同，不依赖 torch。
+    相同模型文件与线程配置的 InferenceSession 在进程内共享。
+    """
+
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(
+        self, sampling_rate, model_path=None, intra_op_threads=1, inter_op_threads=1
+    ):
+        self.sampling_rate = np.array(sampling_rate, dtype=np.int64)
+        self.context_size = 64 if sampling_rate == 16000 else 32
+        self.session = self._get_session(
+            model_path or self.default_model_path(), intra_op_threads, inter_op_threads
+        )
+
+    @staticmethod
+    def default_model_path():
+        """定位 silero-vad 包自带的 onnx 模型，不导入该包（导入会加载 torch）"""
+        spec = importlib.util.find_spec("silero_vad")
+        if spec is None or not spec.submodule_search_locations:
+            raise FileNotFoundError("silero-vad is not installed, set model_path")
+        return os.path.join(
+            list(spec.submodule_search_locations)[0], "data", "silero_vad.onnx"
+        )
+
+    @classmethod
+    def _get_session(cls, model_path, intra_op_threads, inter_op_threads):
+        key = (model_path, intra_op_threads, inter_op_threads)
+        with cls._sessions_lock:
+            if key not in cls._sessions:
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = intra_op_threads
+                options.inter_op_num_threads = inter_op_threads
+                options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+                cls._sessions[key] = onnxruntime.InferenceSession(
+                    model_path,
+                    sess_options=options,
+                    providers=["CPUExecutionProvider"],
+                )
+                logger.debug(f"Loaded ONNX VAD session from {model_path}")
+            return cls._sessions[key]
+
+    def initial_state(self):
+        return np.zeros((2, 128), dtype=np.float32)
+
+    def __call__(self, x, state):
+        out, new_state = self.session.run(
+            None, {"input": x, "state": state, "sr": self.sampling_rate}
+        )
+        return out.reshape(-1), new_state
+
+
+class _VADStream:
+    """批量 VAD 中单路音频的状态：隐藏状态、上下文与起止状态机"""
+
+    def __init__(self, model, machine, gate=None):
+        self.model = model
+        self.machine = machine
+        self.gate = gate
+        self.gated = False
+        self.reset_states()
+
+    def reset_model_state(self):
+        self.state = self.model.initial_state()
+        self.context = np.zeros(self.model.context_size, dtype=np.float32)
+
+    def reset_states(self):
+        self.reset_model_state()
+        self.machine.reset_states()
+        if self.gate is not None:
+            self.gate.reset_states()
+            self.gated = False
+
+    def skip_by_gate(self, audio_int16):
+        """与 SileroVAD._skip_by_gate 相同的门限逻辑"""
+        if self.gate is None or self.machine.triggered:
+            return False
+        if self.gate.is_silent(audio_int16):
+            self.machine.current_sample += len(audio_int16)
+            self.gated = True
+            return True
+        if self.gated:
+            self.reset_model_state()
+            self.gated = False
+        return False
+
+
+class BatchedSileroVAD(VAD):
+    """
+    多路音频共享一个 Silero 模型的 VAD 引擎。
+    每路音频保留独立的循环状态，同一时刻各路的帧合并为一次批量前向计算。
+    """
+
+    supports_batch = True
+    default_stream = None
+
+    def __init__(self, config):
+        logger.debug("Initializing BatchedSileroVAD with config: %s", config)
+        self.sampling_rate = config.get("sampling_rate", 16000)
+        self.threshold = config.get("threshold", 0.5)
+        self.min_silence_duration_ms = config.get("min_silence_duration_ms", 100)
+        self.speech_pad_ms = config.get("speech_pad_ms", 30)
+        self.gate_config = config.get("pre_gate") or {}
+        self.model = self._load_model(config)
+        self.streams = {}
+        self.add_stream(self.default_stream)
+
+    def _load_model(self, config):
+        return _SileroJitModel(self.sampling_rate)
+
+    def add_stream(self, stream_id):
+        self.streams[stream_id] = _VADStream(
+            self.model,
+            SpeechStateMachine(
+                threshold=self.threshold,
+                sampling_rate=self.sampling_rate,
+                min_silence_duration_ms=self.min_silence_duration_ms,
+                speech_pad_ms=self.speech_pad_ms,
+            ),
+            EnergyGate(self.gate_config) if self.gate_config.get("enabled") else None,
+        )
+
+    def remove_stream(self, stream_id):
+        self.streams.pop(stream_id, None)
+
+    def process_batch(self, frames):
+        """
+        对多路音频各一帧做一次批量推理。
+
+        Args:
+            frames: {stream_id: int16 帧（bytes 或数组）}
+        Returns:
+            {stream_id: VAD 事件或 None}
+        """
+        results = {}
+        ids, streams, pcm = [], [], []
+        for stream_id, f in frames.items():
+            audio_int16 = (
+                f if isinstance(f, np.ndarray) else np.frombuffer(f, dtype=np.int16)
+            )
+            stream = self.streams[stream_id]
+            if stream.skip_by_gate(audio_int16):
+                results[stream_id] = None
+                continue
+            ids.append(stream_id)
+            streams.append(stream)
+            pcm.append(audio_int16)
+        if not ids:
+            return results
+
+        audio = SileroVAD.int2float(np.stack(pcm))
+        window = audio.shape[1]
+        x = np.concatenate([np.stack([s.context for s in streams]), audio], axis=1)
+        state = np.stack([s.state for s in streams], axis=1)
+
+        probs, new_state = self.model(x, state)
+
+        for i, (stream_id, stream) in enumerate(zip(ids, streams)):
+            stream.state = new_state[:, i]
+            stream.context = x[i, -self.model.context_size :]
+            results[stream_id] = stream.machine(float(probs[i]), window)
+        return results
+
+    def is_vad(self, data):
+        try:
+            vad_output = self.process_batch({self.default_stream: data})[
+                self.default_stream
+            ]
+            if vad_output is not None:
+                logger.debug(f"VAD output: {vad_output}")
+            return vad_output
+        except Exception as e:
+            logger.error(f"Error in VAD processing: {e}")
+            return None
+
+    def reset_states(self):
+        self.streams[self.default_stream].reset_states()
+
+    def warmup(self, frames=4):
+        # 直接调用模型，不影响任何一路音频的状态
+        x = np.zeros((1, self.model.context_size + 512), dtype=np.float32)
+        state = self.model.initial_state()[:, None, :]
+        for _ in range(frames):
+            self.model(x, state)
+
+
+class SileroOnnxVAD(BatchedSileroVAD):
+    """
+    基于 ONNX Runtime 的 Silero VAD，不加载 torch。
+    默认 intra/inter-op 线程数均为 1，避免与 ASR、TTS 模型争抢 CPU；
+    同样支持多路批量推理与前置门限。
+    """
+
+    def _load_model(self, config):
+        return _SileroOnnxModel(
+            self.sampling_rate,
+            model_path=config.get("model_path"),
+            intra_op_threads=config.get("intra_op_threads", 1),
+            inter_op_threads=config.get("inter_op_threads", 1),
+        )
+
 
 def create_instance(class_name, *args, **kwargs):
     # 获取类对象
@@ -68,3 +460,131 @@ def create_instance(class_name, *args, **kwargs):
         return cls(*args, **kwargs)
     else:
         raise ValueError(f"Class {class_name} not found")
+
+
+def _benchmark_batch(vad_class, stream_counts, ticks):
+    """批量推理吞吐：各路数下批量与逐路推理的每秒帧数"""
+    import time
+
+    engine = vad_class(
+        {"sampling_rate": 16000, "threshold": 0.5, "min_silence_duration_ms": 200}
+    )
+    rng = np.random.default_rng(0)
+    print(f"{'streams':>8} {'batched fps':>12} {'sequential fps':>15} {'speedup':>8}")
+    for n in stream_counts:
+        frames = [
+            (rng.standard_normal((n, 512)) * 3000).astype(np.int16)
+            for _ in range(ticks)
+        ]
+        for stream_id in range(n):
+            engine.add_stream(stream_id)
+
+        start = time.perf_counter()
+        for tick in frames:
+            engine.process_batch({i: tick[i] for i in range(n)})
+        batched = n * ticks / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for tick in frames:
+            for i in range(n):
+                engine.process_batch({i: tick[i]})
+        sequential = n * ticks / (time.perf_counter() - start)
+
+        for stream_id in range(n):
+            engine.remove_stream(stream_id)
+        print(
+            f"{n:>8} {batched:>12.0f} {sequential:>15.0f} {batched / sequential:>7.2f}x"
+        )
+
+
+def _measure_backend(class_name, frames):
+    """在当前进程中测量单个后端的启动耗时、内存峰值与单帧延迟，输出 JSON"""
+    import json
+    import resource
+    import time
+
+    start = time.perf_counter()
+    engine = create_instance(
+        class_name,
+        {"sampling_rate": 16000, "threshold": 0.5, "min_silence_duration_ms": 200},
+    )
+    startup = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal((frames, 512)) * 3000).astype(np.int16)
+    latencies = []
+    for frame in audio:
+        t = time.perf_counter()
+        engine.is_vad(frame)
+        latencies.append(time.perf_counter() - t)
+    latencies = np.array(latencies) * 1000
+    print(
+        json.dumps(
+            {
+                "backend": class_name,
+                "startup_s": startup,
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+            }
+        )
+    )
+
+
+def _benchmark_backends(backends, frames):
+    """每个后端在独立子进程中运行，保证启动耗时与内存互不影响"""
+    import json
+    import subprocess
+    import sys
+
+    print(
+        f"{'backend':>16} {'startup s':>10} {'max rss MB':>11} {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for backend in backends:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "bailing.vad",
+                "--measure",
+                backend,
+                "--frames",
+                str(frames),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{r['backend']:>16} {r['startup_s']:>10.2f} {r['max_rss_mb']:>11.0f} "
+            f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VAD 性能测试")
+    parser.add_argument(
+        "--mode",
+        choices=["batch", "backends"],
+        default="batch",
+        help="batch: 多路批量吞吐；backends: 对比各后端启动耗时、内存与单帧延迟",
+    )
+    parser.add_argument(
+        "--backend", default="BatchedSileroVAD", help="batch 模式使用的引擎"
+    )
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--ticks", type=int, default=200, help="每路音频的帧数")
+    parser.add_argument("--backends", nargs="+", default=["SileroVAD", "SileroOnnxVAD"])
+    parser.add_argument("--frames", type=int, default=1000, help="单帧延迟测试的帧数")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure_backend(args.measure, args.frames)
+    elif args.mode == "backends":
+        _benchmark_backends(args.backends, args.frames)
+    else:
+        _benchmark_batch(globals()[args.backend], args.streams, args.ticks)
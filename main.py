@@ -7,9 +7,8 @@ except ImportError:
 
 import argparse
 import json
-import requests
 
-from bailing import robot
+from bailing import robot, transport
 from bailing.utils import load_mcp_config
 from bailing import logger
 
@@ -19,14 +18,23 @@ def push2web(payload):
         data = json.dumps(payload, ensure_ascii=False)
         url = "http://127.0.0.1:5000/add_message"
         headers = {"Content-Type": "application/json; charset=utf-8"}
-        response = requests.request(
-            "POST", url, headers=headers, data=data.encode("utf-8")
+        # 复用共享连接池，避免每条消息都新建连接
+        response = transport.get_client().post(
+            url, headers=headers, content=data.encode("utf-8")
         )
         logger.info(response.text)
     except Exception as e:
         logger.error(f"callback error：{payload}{e}")
 
 
+def push_status(payload):
+    try:
+        url = "http://127.0.0.1:5000/status"
+        transport.get_client().post(url, json=payload)
+    except Exception as e:
+        logger.error(f"status callback error：{payload}{e}")
+
+
 def main():
     # Create the parser
     parser = argparse.ArgumentParser(description="百聆 AI 聊天机器人")
@@ -53,6 +61,7 @@ def main():
     # 创建机器人实例
     bailing_robot = robot.Robot(config_path, mcp_config=mcp_config)
     bailing_robot.listen_dialogue(push2web)
+    bailing_robot.listen_status(push_status)
     bailing_robot.run()
 
 
@@ -0,0 +1,118 @@
+"""
+对话延迟基准：按 Robot 的流程调用 LLM（流式输出交给断句器），测量 N 次请求的
+首 token 时间（TTFT）、首个 TTS 片段时间与完整回复时间。
+
+    python server/fake_openai.py --port 8001 --ttft-ms 300 --tokens-per-sec 40
+    python server/bench_llm.py --url http://127.0.0.1:8001/v1 --requests 20
+
+也可以用 --llm 指定 config.yaml 中 LLM 下的某个配置（如 HedgedLLM），测量实际使用的 LLM。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bailing import llm
+from bailing.dialogue import Dialogue, Message
+from bailing.segmenter import SentenceSegmenter
+from bailing.utils import read_config
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_once(model, dialogue: Dialogue, query: str) -> dict[str, float]:
+    dialogue.put(Message(role="user", content=query))
+    segmenter = SentenceSegmenter()
+    start = time.perf_counter()
+    ttft = first_segment = None
+    reply = []
+    for content in model.response(dialogue.get_llm_dialogue()):
+        if not content:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        reply.append(content)
+        if segmenter.feed(content) and first_segment is None:
+            first_segment = time.perf_counter() - start
+    if segmenter.flush() and first_segment is None:
+        first_segment = time.perf_counter() - start
+    total = time.perf_counter() - start
+    dialogue.put(Message(role="assistant", content="".join(reply)))
+    # LLM 内部捕获了错误，流式输出中断或请求失败时通过 last_error 报告
+    error = getattr(model, "last_error", None)
+    if error is not None:
+        raise RuntimeError(f"LLM 请求失败或输出中断: {error}")
+    if ttft is None:
+        raise RuntimeError("LLM 没有返回内容")
+    return {"ttft": ttft, "first_segment": first_segment, "total": total}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 对话延迟基准")
+    parser.add_argument("--url", default="http://127.0.0.1:8001/v1")
+    parser.add_argument("--model", default="fake-model")
+    parser.add_argument("--api-key", default="sk-fake")
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--llm", help="使用 config.yaml 中 LLM 下的指定配置")
+    parser.add_argument("--requests", type=int, default=10, help="请求次数")
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=0,
+        help="OpenAI 客户端重试次数，默认不重试，注入的请求失败计为失败",
+    )
+    parser.add_argument(
+        "--multi-turn", action="store_true", help="多轮对话，上下文随请求次数增长"
+    )
+    parser.add_argument("--query", default="你好，请介绍一下你自己。")
+    args = parser.parse_args(argv)
+
+    if args.llm:
+        config = read_config(args.config)
+        model = llm.create_instance(args.llm, config["LLM"][args.llm])
+    else:
+        model = llm.create_instance(
+            "OpenAILLM",
+            {
+                "model_name": args.model,
+                "url": args.url,
+                "api_key": args.api_key,
+                "max_retries": args.max_retries,
+            },
+        )
+    model.warmup()
+
+    results, failures = [], 0
+    dialogue = None
+    for i in range(args.requests):
+        if dialogue is None or not args.multi_turn:
+            dialogue = Dialogue("tmp/")
+            dialogue.set_system("你是一个语音助手，回答简洁。")
+        try:
+            results.append(run_once(model, dialogue, args.query))
+        except Exception as e:
+            failures += 1
+            print(f"请求 {i} 失败: {e}")
+
+    print(f"requests={args.requests} ok={len(results)} failed={failures}")
+    if not results:
+        return
+    print(f"{'metric':>14} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for metric in ("ttft", "first_segment", "total"):
+        values = [r[metric] * 1000 for r in results if r[metric] is not None]
+        if values:
+            print(
+                f"{metric:>14} {sum(values) / len(values):>9.1f} "
+                f"{percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+本地模拟的 OpenAI 兼容流式服务，用于离线、可复现地测量对话延迟。
+
+支持 /chat/completions 与 /v1/chat/completions 的流式（SSE）与非流式响应、工具调用，
+可配置首 token 延迟、生成速度、抖动与故障注入，随机数由 --seed 固定。
+
+    python server/fake_openai.py --port 8001 --ttft-ms 300 --tokens-per-sec 40
+
+然后在 config.yaml 中把 LLM 的 url 指向 http://127.0.0.1:8001/v1 即可。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from typing import Any
+
+from litestar import Litestar, Request, get, head, post
+from litestar.response import Response, Stream
+
+DEFAULT_REPLY = (
+    "你好，我是百聆，很高兴和你聊天。今天想聊点什么呢？"
+    "我可以陪你聊天、回答问题，也可以帮你查一查资料。"
+)
+
+# 服务配置，由命令行参数填充
+settings: dict[str, Any] = {}
+# 请求序号，与种子一起决定每个请求的随机数，保证多次运行结果一致
+request_counter = itertools.count()
+# 上一次请求的消息，用于模拟服务端前缀缓存的命中数
+last_messages: list[dict[str, Any]] = []
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // settings["chars_per_token"])
+
+
+def split_tokens(text: str) -> list[str]:
+    size = settings["chars_per_token"]
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def jittered(rng: random.Random, base_ms: float) -> float:
+    """在基础延迟上叠加高斯抖动，返回秒"""
+    jitter = settings["jitter_ms"]
+    value = base_ms + (rng.gauss(0, jitter) if jitter else 0)
+    return max(0.0, value) / 1000
+
+
+def usage_for(messages: list[dict[str, Any]], completion_tokens: int) -> dict[str, Any]:
+    """按消息估算 token 用量，与上一次请求相同的前缀消息计为缓存命中"""
+    global last_messages
+    prompt_tokens = sum(
+        count_tokens(json.dumps(m, ensure_ascii=False)) for m in messages
+    )
+    cached_tokens = 0
+    for previous, current in zip(last_messages, messages):
+        if previous != current:
+            break
+        cached_tokens += count_tokens(json.dumps(current, ensure_ascii=False))
+    last_messages = messages
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        "prompt_cache_hit_tokens": cached_tokens,
+        "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+    }
+
+
+def pick_tool(data: dict[str, Any]):
+    """按 --tool-calls 决定是否返回工具调用，返回被调用的工具定义"""
+    tools = data.get("tools") or []
+    mode = settings["tool_calls"]
+    if not tools or mode == "never":
+        return None
+    if mode == "auto" and data.get("tool_choice") == "none":
+        return None
+    return tools[0]
+
+
+def chunk(completion_id: str, model: str, delta: dict[str, Any], finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def sse(payload) -> bytes:
+    if isinstance(payload, str):
+        return f"data: {payload}\n\n".encode()
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+
+async def stream_completion(data, rng: random.Random, tool, completion_id: str):
+    model = data.get("model", "fake-model")
+    interval_ms = 1000 / settings["tokens_per_sec"]
+    include_usage = (data.get("stream_options") or {}).get("include_usage", False)
+    abort = rng.random() < settings["abort_rate"]
+
+    await asyncio.sleep(jittered(rng, settings["ttft_ms"]))
+    yield sse(chunk(completion_id, model, {"role": "assistant", "content": ""}))
+
+    if tool is not None:
+        name = tool["function"]["name"]
+        arguments = settings["tool_args"]
+        pieces = split_tokens(arguments) or [""]
+        call_id = f"call_{uuid.uuid4().hex[:24]}"
+        first = {
+            "index": 0,
+            "id": call_id,
+            "type": "function",
+            "function": {"name": name, "arguments": ""},
+        }
+        yield sse(chunk(completion_id, model, {"tool_calls": [first]}))
+        for piece in pieces:
+            await asyncio.sleep(jittered(rng, interval_ms))
+            delta = {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+            yield sse(chunk(completion_id, model, delta))
+        completion_tokens, finish_reason = len(pieces), "tool_calls"
+    else:
+        tokens = split_tokens(settings["reply"])
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(jittered(rng, interval_ms))
+            if abort and i >= len(tokens) // 2:
+                # 模拟连接中途断开：不发送结束标记
+                raise ConnectionResetError("injected stream abort")
+            yield sse(chunk(completion_id, model, {"content": token}))
+        completion_tokens, finish_reason = len(tokens), "stop"
+
+    yield sse(chunk(completion_id, model, {}, finish_reason))
+    if include_usage:
+        yield sse(
+            {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage_for(data.get("messages", []), completion_tokens),
+            }
+        )
+    yield sse("[DONE]")
+
+
+async def full_completion(data, rng: random.Random, tool, completion_id: str):
+    model = data.get("model", "fake-model")
+    tokens = split_tokens(settings["tool_args"] if tool else settings["reply"])
+    delay = jittered(rng, settings["ttft_ms"]) + sum(
+        jittered(rng, 1000 / settings["tokens_per_sec"]) for _ in tokens[1:]
+    )
+    await asyncio.sleep(delay)
+    message = {"role": "assistant", "content": settings["reply"]}
+    if tool is not None:
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {
+                        "name": tool["function"]["name"],
+                        "arguments": settings["tool_args"],
+                    },
+                }
+            ],
+        }
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool else "stop",
+            }
+        ],
+        "usage": usage_for(data.get("messages", []), len(tokens)),
+    }
+
+
+@post(["/chat/completions", "/v1/chat/completions"], status_code=200)
+async def chat_completions(request: Request) -> Response:
+    data = await request.json()
+    index = next(request_counter)
+    rng = random.Random(f"{settings['seed']}:{index}")
+    completion_id = f"chatcmpl-fake-{index}"
+
+    if rng.random() < settings["fail_rate"]:
+        status = settings["fail_status"]
+        return Response(
+            {
+                "error": {
+                    "message": "injected failure",
+                    "type": "server_error",
+                    "code": status,
+                }
+            },
+            status_code=status,
+        )
+
+    tool = pick_tool(data)
+    if data.get("stream"):
+        return Stream(
+            stream_completion(data, rng, tool, completion_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+    return Response(await full_completion(data, rng, tool, completion_id))
+
+
+@get(["/models", "/v1/models"])
+async def models() -> dict[str, Any]:
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model"}]}
+
+
+@head("/")
+async def index() -> None:
+    """连接预热请求"""
+    return None
+
+
+app = Litestar(route_handlers=[chat_completions, models, index])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容流式服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--ttft-ms", type=float, default=300, help="首 token 延迟（毫秒）"
+    )
+    parser.add_argument("--tokens-per-sec", type=float, default=40, help="生成速度")
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0, help="延迟抖动的标准差（毫秒）"
+    )
+    parser.add_argument("--fail-rate", type=float, default=0, help="请求直接失败的概率")
+    parser.add_argument(
+        "--fail-status", type=int, default=500, help="失败时返回的状态码"
+    )
+    parser.add_argument(
+        "--abort-rate", type=float, default=0, help="流式输出中途断开的概率"
+    )
+    parser.add_argument(
+        "--tool-calls",
+        choices=["auto", "always", "never"],
+        default="auto",
+        help="请求带 tools 时是否返回工具调用：auto 除 tool_choice 为 none 外都调用第一个工具",
+    )
+    parser.add_argument(
+        "--tool-args", default="{}", help="工具调用的参数（JSON 字符串）"
+    )
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="固定的回复内容")
+    parser.add_argument(
+        "--chars-per-token", type=int, default=2, help="每个 token 的字符数"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    return parser.parse_args(argv)
+
+
+# 以模块方式被 uvicorn 加载时使用默认参数
+settings.update(vars(parse_args([])))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    settings.update(vars(args))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
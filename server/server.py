@@ -9,6 +9,9 @@ from litestar.contrib.jinja import JinjaTemplateEngine
 # 存储对话数据
 dialogue: List[Dict[str, Any]] = []
 
+# 机器人状态：预热完成前 ready 为 False，warmup 为各组件预热耗时（秒）
+status: Dict[str, Any] = {"ready": False, "warmup": {}}
+
 # 存储活跃的WebSocket连接
 active_connections: List[WebSocket] = []
 
@@ -20,8 +23,9 @@ async def websocket_handler(socket: WebSocket) -> None:
     active_connections.append(socket)
 
     try:
-        # 发送初始对话数据
+        # 发送初始对话数据与机器人状态
         await socket.send_json({"type": "update_dialogue", "data": dialogue})
+        await socket.send_json({"type": "status", "data": status})
 
         # 保持连接活跃
         while True:
@@ -40,6 +44,11 @@ async def websocket_handler(socket: WebSocket) -> None:
 
 async def broadcast_dialogue_update():
     """广播对话更新到所有连接的客户端"""
+    await broadcast({"type": "update_dialogue", "data": dialogue})
+
+
+async def broadcast(payload: Dict[str, Any]):
+    """广播消息到所有连接的客户端"""
     if not active_connections:
         return
 
@@ -47,7 +56,7 @@ async def broadcast_dialogue_update():
     disconnected = []
     for connection in active_connections[:]:
         try:
-            await connection.send_json({"type": "update_dialogue", "data": dialogue})
+            await connection.send_json(payload)
         except Exception:
             disconnected.append(connection)
 
@@ -74,8 +83,16 @@ async def add_message(data: Dict[str, Any]) -> Dict[str, str]:
         "audio_file": "",
         "tts_file": "",
         "vad_status": "",
+        # 流式识别的部分结果，由下一条消息替换
+        "partial": bool(data.get("partial")),
     }
-    dialogue.append(message)
+    # 同一角色的部分结果由新消息原地替换，中间可能插入了上一轮的回复
+    for i in range(len(dialogue) - 1, max(len(dialogue) - 3, -1), -1):
+        if dialogue[i].get("partial") and dialogue[i]["role"] == message["role"]:
+            dialogue[i] = message
+            break
+    else:
+        dialogue.append(message)
 
     # 异步广播更新
     await broadcast_dialogue_update()
@@ -83,6 +100,20 @@ async def add_message(data: Dict[str, Any]) -> Dict[str, str]:
     return {"status": "success"}
 
 
+@get("/status")
+async def get_status() -> Dict[str, Any]:
+    """返回机器人是否已完成预热"""
+    return status
+
+
+@post("/status")
+async def set_status(data: Dict[str, Any]) -> Dict[str, str]:
+    """机器人上报状态"""
+    status.update(data)
+    await broadcast({"type": "status", "data": status})
+    return {"status": "success"}
+
+
 # 配置模板引擎
 template_config = TemplateConfig(
     directory=Path(__file__).parent / "templates",
@@ -94,6 +125,8 @@ app = Litestar(
     route_handlers=[
         index,
         add_message,
+        get_status,
+        set_status,
         websocket_handler,
     ],
     template_config=template_config,
@@ -0,0 +1,4 @@
+import os
+
+# bailing 的日志写入 tmp/bailing.log，导入前确保目录存在
+os.makedirs("tmp", exist_ok=True)
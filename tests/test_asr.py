@@ -0,0 +1,164 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("funasr")
+
+from bailing import asr
+from bailing.asr import ASRBatchScheduler, ASRWorkerPool
+
+
+class FakeBatchASR:
+    """记录每次 recognize_batch 的批大小，第一批在 release 之前阻塞，便于积累请求"""
+
+    def __init__(self, results=None, error=None):
+        self.batches = []
+        self.results = results
+        self.error = error
+        self.release = threading.Event()
+
+    def recognize_batch(self, batch):
+        self.release.wait(2)
+        self.batches.append(len(batch))
+        if self.error is not None:
+            raise self.error
+        if self.results is not None:
+            return self.results
+        return [(f"text-{audio}", None) for audio in batch]
+
+
+def test_results_match_request_order():
+    asr = FakeBatchASR()
+    asr.release.set()
+    scheduler = ASRBatchScheduler(asr, window_ms=50)
+    futures = [scheduler.submit(i) for i in range(5)]
+    assert [f.result(2) for f in futures] == [(f"text-{i}", None) for i in range(5)]
+    assert sum(asr.batches) == 5
+
+
+def test_requests_within_window_share_a_batch():
+    asr = FakeBatchASR()
+    scheduler = ASRBatchScheduler(asr, window_ms=20, max_batch=4)
+    # 第一个请求单独成批并阻塞，期间到达的请求合并为后续批次
+    first = scheduler.submit(0)
+    futures = [scheduler.submit(i) for i in range(1, 7)]
+    asr.release.set()
+    first.result(2)
+    for f in futures:
+        f.result(2)
+    assert asr.batches[0] >= 1
+    assert max(asr.batches) <= 4
+    assert len(asr.batches) < 7
+    assert scheduler.utterances == 7
+
+
+def test_recognizer_blocks_for_the_result():
+    asr = FakeBatchASR()
+    asr.release.set()
+    scheduler = ASRBatchScheduler(asr, window_ms=1)
+    assert scheduler.recognizer("a") == ("text-a", None)
+
+
+def test_batch_error_fails_every_future():
+    asr = FakeBatchASR(error=RuntimeError("model crashed"))
+    scheduler = ASRBatchScheduler(asr, window_ms=50)
+    futures = [scheduler.submit(i) for i in range(3)]
+    asr.release.set()
+    for f in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            f.result(2)
+
+
+def test_result_count_mismatch_fails_every_future():
+    asr = FakeBatchASR(results=[("only one", None)])
+    scheduler = ASRBatchScheduler(asr, window_ms=50)
+    futures = [scheduler.submit(i) for i in range(3)]
+    asr.release.set()
+    for f in futures:
+        with pytest.raises(RuntimeError, match="recognize_batch"):
+            f.result(2)
+
+
+def test_cancelled_requests_are_skipped():
+    asr = FakeBatchASR()
+    scheduler = ASRBatchScheduler(asr, window_ms=50)
+    first = scheduler.submit(0)
+    cancelled = scheduler.submit(1)
+    kept = scheduler.submit(2)
+    assert cancelled.cancel()
+    asr.release.set()
+    assert first.result(2) == ("text-0", None)
+    assert kept.result(2) == ("text-2", None)
+    assert sum(asr.batches) == 2
+
+
+class ConcurrencyProbeASR:
+    """记录同时进入 recognizer 的最大调用数"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def recognizer(self, audio):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+        return audio, None
+
+
+def test_thread_pool_serializes_with_shared_lock():
+    model = ConcurrencyProbeASR()
+    lock = threading.Lock()
+    pool = ASRWorkerPool(model, "FunASR", {}, kind="thread", workers=4, lock=lock)
+    with lock:
+        # 其它调用方持有锁时工作池不会调用模型
+        futures = [pool.submit(i) for i in range(4)]
+        time.sleep(0.05)
+        assert model.max_active == 0
+    assert [f.result(2) for f in futures] == [(i, None) for i in range(4)]
+    assert model.max_active == 1
+    pool.shutdown()
+
+
+class FakeStreamingModel:
+    """每个完整 chunk 输出一个字，最后一次解码输出句号"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def generate(self, input, cache, is_final, **kwargs):
+        cache["chunks"] = cache.get("chunks", 0) + 1
+        if is_final:
+            return [{"text": "。"}]
+        return [{"text": "字"}]
+
+
+@pytest.fixture
+def streaming_asr(monkeypatch):
+    monkeypatch.setattr(asr, "AutoModel", FakeStreamingModel)
+    return asr.FunASRStreaming({"chunk_size": [0, 1, 0]})
+
+
+def test_streaming_partials_and_final(streaming_asr):
+    streaming_asr.start_stream()
+    assert streaming_asr.accept_stream(np.zeros(500, dtype=np.int16)) is None
+    assert streaming_asr.accept_stream(np.zeros(1500, dtype=np.int16)) == "字字"
+    assert streaming_asr.finish_stream() == ("字字。", None)
+    assert streaming_asr.finish_stream() == (None, None)
+
+
+def test_whole_utterance_does_not_disturb_open_stream(streaming_asr):
+    streaming_asr.start_stream()
+    streaming_asr.accept_stream(np.zeros(960, dtype=np.int16))
+    assert streaming_asr.recognizer(np.zeros(2880, dtype=np.int16)) == (
+        "字字字。",
+        None,
+    )
+    streaming_asr.accept_stream(np.zeros(960, dtype=np.int16))
+    assert streaming_asr.finish_stream() == ("字字。", None)
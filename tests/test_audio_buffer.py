@@ -0,0 +1,61 @@
+import threading
+import time
+
+import numpy as np
+
+from bailing.audio_buffer import AudioRingBuffer
+
+
+def frames(n, frame_size=4, start=0):
+    return np.arange(start, start + n * frame_size, dtype=np.int16)
+
+
+def test_partial_frames_are_joined():
+    buf = AudioRingBuffer(capacity=4, frame_size=4)
+    buf.put(frames(1)[:3].tobytes())
+    assert buf.empty()
+    buf.put(np.array([3, 4], dtype=np.int16).tobytes())
+    seq, view = buf.get(timeout=0)
+    assert seq == 0
+    assert view.tolist() == [0, 1, 2, 3]
+    buf.flush()
+    assert buf.get(timeout=0)[1].tolist() == [4, 0, 0, 0]
+
+
+def test_overrun_skips_to_oldest_valid_frame():
+    buf = AudioRingBuffer(capacity=4, frame_size=4)
+    buf.put(frames(6))
+    seq, view = buf.get(timeout=0)
+    assert seq == 2
+    assert view.tolist() == [8, 9, 10, 11]
+    assert buf.overruns == 1
+    assert buf.dropped_frames == 2
+    assert buf.high_water == 6
+
+
+def test_gather_skips_overwritten_frames():
+    buf = AudioRingBuffer(capacity=4, frame_size=2)
+    buf.put(frames(5, frame_size=2))
+    audio = buf.gather([0, 1, 3, 4])
+    assert audio.tolist() == [2, 3, 6, 7, 8, 9]
+    assert buf.gather([0]).size == 0
+
+
+def test_get_times_out_without_data():
+    buf = AudioRingBuffer(capacity=4, frame_size=4)
+    start = time.monotonic()
+    assert buf.get(timeout=0.05) == (None, None)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_get_is_woken_by_put():
+    buf = AudioRingBuffer(capacity=4, frame_size=4)
+    event = threading.Event()
+    buf.add_listener(event)
+    event.clear()
+    timer = threading.Timer(0.05, buf.put, args=(frames(1),))
+    timer.start()
+    seq, _ = buf.get(timeout=2)
+    timer.join()
+    assert seq == 0
+    assert event.is_set()
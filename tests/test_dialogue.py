@@ -0,0 +1,95 @@
+import threading
+
+from bailing.dialogue import Dialogue, Message, estimate_tokens
+
+
+def fill(dialogue, turns, text="你好" * 20):
+    for i in range(turns):
+        dialogue.put(Message(role="user", content=f"{i} {text}"))
+        dialogue.put(Message(role="assistant", content=f"{i} {text}"))
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 4
+    assert estimate_tokens("你好") == int(2 * 0.6) + 4
+    assert estimate_tokens("hello world") == int(11 * 0.3) + 4
+
+
+def test_unbounded_window_keeps_everything(tmp_path):
+    d = Dialogue(str(tmp_path))
+    d.set_system("system")
+    fill(d, 10)
+    messages = d.get_llm_dialogue()
+    assert len(messages) == 21
+    assert messages[0] == {"role": "system", "content": "system"}
+
+
+def test_trim_cuts_at_user_messages_and_keeps_prompt(tmp_path):
+    d = Dialogue(str(tmp_path), max_tokens=200, keep_ratio=0.5)
+    d.set_system("system")
+    fill(d, 10)
+    d.put(Message(role="user", content="last question"))
+    messages = d.get_llm_dialogue()
+    assert messages[0]["role"] == "system"
+    assert messages[1]["role"] == "user"
+    assert messages[-1]["content"] == "last question"
+    window_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    assert window_tokens <= 200
+    assert d.trimmed_messages > 0
+    # 完整历史不受裁剪影响
+    assert len(d.dialogue) == 22
+
+
+def test_trim_keeps_tool_call_groups(tmp_path):
+    d = Dialogue(str(tmp_path), max_tokens=120, keep_ratio=0.5)
+    fill(d, 3)
+    d.put(Message(role="user", content="查天气"))
+    d.put(Message(role="assistant", tool_calls=[{"id": "call_1"}]))
+    d.put(Message(role="tool", content="晴" * 40, tool_call_id="call_1"))
+    messages = d.get_llm_dialogue()
+    assert messages[0]["content"] == "查天气"
+    assert messages[1]["tool_calls"] == [{"id": "call_1"}]
+    assert messages[2]["tool_call_id"] == "call_1"
+
+
+def test_window_prefix_is_stable_after_trim(tmp_path):
+    d = Dialogue(str(tmp_path), max_tokens=300, keep_ratio=0.5)
+    fill(d, 10)
+    first = d.get_llm_dialogue()
+    d.put(Message(role="user", content="next"))
+    second = d.get_llm_dialogue()
+    assert second[: len(first)] == first
+
+
+def test_summarize_policy_adds_summary_header(tmp_path):
+    done = threading.Event()
+    calls = []
+
+    def summarizer(previous, text):
+        calls.append((previous, text))
+        done.set()
+        return "summary"
+
+    d = Dialogue(
+        str(tmp_path),
+        max_tokens=200,
+        keep_ratio=0.5,
+        policy="summarize",
+        summarizer=summarizer,
+    )
+    d.set_system("system")
+    fill(d, 10)
+    d.get_llm_dialogue()
+    assert done.wait(2)
+    assert calls[0][0] == ""
+    assert "user: 0" in calls[0][1]
+    for _ in range(100):
+        messages = d.get_llm_dialogue()
+        if len(messages) > 1 and messages[1]["role"] == "system":
+            break
+        threading.Event().wait(0.01)
+    assert contents(messages[:2]) == ["system", "更早的对话摘要:\nsummary"]
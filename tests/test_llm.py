@@ -0,0 +1,229 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bailing.llm import HedgedLLM, IncompleteStreamError, OpenAILLM, TTFTHistogram
+from bailing.utils import CancellationToken
+
+
+def stream_chunk(content=None, finish_reason=None):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)],
+        usage=None,
+    )
+
+
+class FakeStream:
+    """模拟 openai 的流式响应：可迭代、可关闭"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def openai_llm():
+    return OpenAILLM(
+        {"model_name": "fake", "url": "http://127.0.0.1:1/v1", "api_key": "sk-fake"}
+    )
+
+
+def test_complete_stream_has_no_error(openai_llm, monkeypatch):
+    chunks = [stream_chunk("你好"), stream_chunk(None, "stop")]
+    monkeypatch.setattr(openai_llm, "_create", lambda dialogue: FakeStream(chunks))
+    assert list(openai_llm.response([])) == ["你好", None]
+    assert openai_llm.last_error is None
+
+
+def test_truncated_stream_sets_last_error(openai_llm, monkeypatch):
+    chunks = [stream_chunk("你好"), stream_chunk("世界")]
+    monkeypatch.setattr(openai_llm, "_create", lambda dialogue: FakeStream(chunks))
+    assert list(openai_llm.response([])) == ["你好", "世界"]
+    assert isinstance(openai_llm.last_error, IncompleteStreamError)
+
+
+def test_cancelled_stream_is_not_an_error(openai_llm, monkeypatch):
+    token = CancellationToken()
+    chunks = [stream_chunk("你好"), stream_chunk("世界"), stream_chunk(None, "stop")]
+    monkeypatch.setattr(openai_llm, "_create", lambda dialogue: FakeStream(chunks))
+    replies = []
+    for content in openai_llm.response([], token):
+        replies.append(content)
+        token.cancel()
+    assert replies == ["你好"]
+    assert openai_llm.last_error is None
+
+
+def test_empty_histogram():
+    histogram = TTFTHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.summary() == {
+        "count": 0,
+        "failures": 0,
+        "p50_ms": None,
+        "p95_ms": None,
+        "buckets": {},
+    }
+
+
+def test_buckets_and_percentiles():
+    histogram = TTFTHistogram()
+    for ttft_ms in (50, 100, 150, 250, 6000):
+        histogram.record(ttft_ms)
+    histogram.failures += 1
+    summary = histogram.summary()
+    assert summary["buckets"] == {"<=100": 2, "<=200": 1, "<=300": 1, ">5000": 1}
+    assert summary["p50_ms"] == 150
+    assert summary["p95_ms"] == 6000
+    assert summary["failures"] == 1
+
+
+def test_percentiles_use_recent_window():
+    histogram = TTFTHistogram(window=3)
+    for ttft_ms in (5000, 5000, 5000, 100, 100, 100):
+        histogram.record(ttft_ms)
+    assert histogram.percentile(95) == 100
+    assert sum(histogram.counts) == 6
+
+
+class FakeProvider:
+    """
+    模拟服务商：delay 秒后开始输出 tokens；fail_before 时在首 token 之前出错，
+    fail_after 为输出若干 token 后出错。取消时像真实流一样被关闭。
+    """
+
+    def __init__(
+        self,
+        name,
+        delay=0.0,
+        tokens=("你好", "世界"),
+        fail_before=False,
+        fail_after=None,
+    ):
+        self.name = name
+        self.base_url = f"http://{name}/v1"
+        self.delay = delay
+        self.tokens = tokens
+        self.fail_before = fail_before
+        self.fail_after = fail_after
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def _create(self, dialogue, timeout=None, **kwargs):
+        self.calls += 1
+        return self
+
+    def _deltas(self, responses, token):
+        token.add_callback(self.closed.set)
+        if self.closed.wait(self.delay):
+            return
+        if self.fail_before:
+            raise RuntimeError(f"{self.name} failed")
+        for i, content in enumerate(self.tokens):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError(f"{self.name} broke mid-stream")
+            if self.closed.is_set():
+                return
+            yield SimpleNamespace(content=content, tool_calls=None)
+            time.sleep(0.01)
+
+
+def make_hedged(providers, **config):
+    hedged = HedgedLLM(
+        {
+            "providers": [
+                {"name": p.name, "url": p.base_url, "api_key": "sk-fake"}
+                for p in providers
+            ],
+            "adaptive_order": False,
+            "stats_interval": 0,
+            **config,
+        }
+    )
+    hedged.providers = providers
+    return hedged
+
+
+def test_hedge_fires_after_delay_and_faster_provider_wins():
+    slow = FakeProvider("slow", delay=2, tokens=("慢",))
+    fast = FakeProvider("fast", tokens=("快", "答"))
+    hedged = make_hedged([slow, fast], hedge_after_ms=50)
+    start = time.time()
+    assert list(hedged.response([])) == ["快", "答"]
+    assert time.time() - start < 1
+    assert fast.calls == 1
+    assert hedged.wins == {"slow": 0, "fast": 1}
+    assert hedged.last_error is None
+
+
+def test_no_hedge_when_primary_is_fast():
+    primary = FakeProvider("primary")
+    backup = FakeProvider("backup")
+    hedged = make_hedged([primary, backup], hedge_after_ms=500)
+    assert list(hedged.response([])) == ["你好", "世界"]
+    assert backup.calls == 0
+
+
+def test_fails_over_when_primary_errors_before_first_token():
+    broken = FakeProvider("broken", fail_before=True)
+    backup = FakeProvider("backup", tokens=("备用",))
+    hedged = make_hedged([broken, backup], hedge_after_ms=5000)
+    start = time.time()
+    assert list(hedged.response([])) == ["备用"]
+    # 出错后立即补发，不等 hedge_after
+    assert time.time() - start < 1
+    assert hedged.histograms["broken"].failures == 1
+    assert hedged.last_error is None
+
+
+def test_all_providers_fail():
+    providers = [FakeProvider(n, fail_before=True) for n in ("a", "b")]
+    hedged = make_hedged(providers, hedge_after_ms=5000)
+    assert list(hedged.response([])) == []
+    assert all(p.calls == 1 for p in providers)
+    assert isinstance(hedged.last_error, RuntimeError)
+
+
+def test_losing_attempt_is_cancelled_and_closed():
+    winner = FakeProvider("winner", tokens=("赢",))
+    loser = FakeProvider("loser", delay=2)
+    hedged = make_hedged([winner, loser], hedge_after_ms=0)
+    assert list(hedged.response([])) == ["赢"]
+    assert loser.calls == 1
+    assert loser.closed.wait(1)
+    # 残留请求结束后释放并发计数
+    deadline = time.time() + 1
+    while hedged._inflight and time.time() < deadline:
+        time.sleep(0.01)
+    assert hedged._inflight == 0
+
+
+def test_mid_stream_failure_is_not_failed_over():
+    flaky = FakeProvider("flaky", tokens=("一", "二", "三"), fail_after=1)
+    backup = FakeProvider("backup")
+    hedged = make_hedged([flaky, backup], hedge_after_ms=5000)
+    assert list(hedged.response([])) == ["一"]
+    assert backup.calls == 0
+    assert isinstance(hedged.last_error, RuntimeError)
+
+
+def test_caller_cancel_stops_every_attempt():
+    token = CancellationToken()
+    providers = [FakeProvider(n, delay=2) for n in ("a", "b")]
+    hedged = make_hedged(providers, hedge_after_ms=0)
+    threading.Timer(0.05, token.cancel).start()
+    assert list(hedged.response([], token)) == []
+    assert all(p.closed.wait(1) for p in providers)
+    assert hedged.last_error is None
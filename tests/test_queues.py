@@ -0,0 +1,80 @@
+import queue
+
+import pytest
+
+from bailing.queues import BoundedQueue
+
+
+def is_silence(item):
+    return item.get("vad_statue") is None
+
+
+def drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BoundedQueue("q", maxsize=1, policy="drop_newest")
+
+
+def test_block_policy_raises_when_full():
+    q = BoundedQueue("q", maxsize=1)
+    q.put(1)
+    with pytest.raises(queue.Full):
+        q.put(2, block=False)
+    with pytest.raises(queue.Full):
+        q.put(2, timeout=0.01)
+    assert q.stats()["blocked"] == 2
+
+
+def test_drop_oldest_drops_first_droppable_item():
+    q = BoundedQueue("q", maxsize=3, policy="drop_oldest", droppable=is_silence)
+    speech = {"vad_statue": {"start": 0}}
+    q.put(speech)
+    q.put({"id": 1})
+    q.put({"id": 2})
+    q.put({"id": 3})
+    assert drain(q) == [speech, {"id": 2}, {"id": 3}]
+    assert q.dropped == 1
+    assert q.high_water == 3
+
+
+def test_drop_oldest_blocks_without_droppable_items():
+    q = BoundedQueue("q", maxsize=1, policy="drop_oldest", droppable=is_silence)
+    q.put({"vad_statue": {"end": 1}})
+    with pytest.raises(queue.Full):
+        q.put({"id": 1}, block=False)
+
+
+def test_coalesce_replaces_droppable_tail():
+    q = BoundedQueue("q", maxsize=2, policy="coalesce", droppable=is_silence)
+    speech = {"vad_statue": {"start": 0}}
+    q.put(speech)
+    q.put({"id": 1})
+    q.put({"id": 2})
+    assert drain(q) == [speech, {"id": 2}]
+    assert q.coalesced == 1
+    assert q.stats()["put"] == 3
+
+
+def test_coalesce_falls_back_to_drop_oldest():
+    q = BoundedQueue("q", maxsize=2, policy="coalesce", droppable=is_silence)
+    speech = {"vad_statue": {"start": 0}}
+    q.put({"id": 1})
+    q.put(speech)
+    q.put({"id": 2})
+    assert drain(q) == [speech, {"id": 2}]
+    assert q.dropped == 1
+
+
+def test_dropped_items_do_not_block_join():
+    q = BoundedQueue("q", maxsize=1, policy="drop_oldest", droppable=is_silence)
+    q.put({"id": 1})
+    q.put({"id": 2})
+    q.get_nowait()
+    q.task_done()
+    q.join()
@@ -0,0 +1,134 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from bailing.response_cache import ResponseCache
+
+# 固定的嵌入向量：同一组内的问题相似度约 0.98，不同组正交
+VECTORS = {
+    "今天讲个笑话吧": [1.0, 0.0, 0.0],
+    "给我讲个笑话吧": [1.0, 0.2, 0.0],
+    "介绍一下你自己": [0.0, 1.0, 0.0],
+    "tell me a joke": [0.0, 0.0, 1.0],
+    "tell me a joke please": [0.0, 0.3, 1.0],
+}
+
+
+def embed(texts):
+    return [VECTORS.get(t.split("\n")[-1], [0.5, 0.5, 0.5]) for t in texts]
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    play_dir = tmp_path / "play"
+    play_dir.mkdir()
+
+    def make(**kwargs):
+        kwargs.setdefault("threshold", 0.9)
+        kwargs.setdefault("cjk_threshold", 0.95)
+        return ResponseCache(
+            embed,
+            cache_dir=str(tmp_path / "cache"),
+            documents_dir=str(documents),
+            play_dir=str(play_dir),
+            check_interval=0,
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "reply.wav"
+    path.write_bytes(b"RIFF")
+    return str(path)
+
+
+def test_hit_returns_a_copy_of_the_audio(make_cache, audio):
+    cache = make_cache()
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    entry = cache.lookup("给我讲个笑话吧")
+    assert entry["text"] == "从前有座山"
+    copy = entry["audio_files"][0]
+    assert copy != cache.entries[next(iter(cache.entries))]["audio_files"][0]
+    assert Path(copy).read_bytes() == b"RIFF"
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_below_threshold(make_cache, audio):
+    cache = make_cache()
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    assert cache.lookup("介绍一下你自己") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_cjk_queries_use_the_stricter_threshold(make_cache, audio):
+    cache = make_cache(threshold=0.9, cjk_threshold=0.99)
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    assert cache.lookup("给我讲个笑话吧") is None
+    cache.store("tell me a joke", "knock knock", [audio])
+    assert cache.lookup("tell me a joke please")["text"] == "knock knock"
+
+
+def test_short_and_excluded_queries_are_not_cached(make_cache, audio):
+    cache = make_cache(exclude_patterns=["笑话"])
+    assert not cache.cacheable("为什么")
+    assert not cache.cacheable("今天讲个笑话吧")
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    assert cache.stats()["entries"] == 0
+
+
+def test_context_is_part_of_the_key(make_cache, audio):
+    cache = make_cache()
+    vectors = {"上文 A": [1.0, 0.0, 0.0], "上文 B": [0.0, 1.0, 0.0]}
+    cache.embedding_function = lambda texts: [vectors[t.split("\n")[0]] for t in texts]
+    cache.store("然后怎么样了呢", "后来呢", [audio], context="上文 A")
+    assert cache.lookup("然后怎么样了呢", context="上文 B") is None
+    assert cache.lookup("然后怎么样了呢", context="上文 A")["text"] == "后来呢"
+
+
+def test_expired_entries_are_evicted(make_cache, audio):
+    cache = make_cache(ttl=10)
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    for entry in cache.entries.values():
+        entry["created"] -= 11
+    assert cache.lookup("今天讲个笑话吧") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction(make_cache, audio):
+    cache = make_cache(max_entries=1)
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    cache.store("介绍一下你自己", "我是百聆", [audio])
+    assert [e["query"] for e in cache.entries.values()] == ["介绍一下你自己"]
+
+
+def test_documents_change_invalidates_cache(make_cache, audio, tmp_path):
+    cache = make_cache()
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    (tmp_path / "documents" / "new.md").write_text("新文档")
+    assert cache.lookup("今天讲个笑话吧") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_is_reloaded(make_cache, audio):
+    cache = make_cache()
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    reloaded = make_cache()
+    assert reloaded.stats()["entries"] == 1
+    assert isinstance(next(iter(reloaded.entries.values()))["embedding"], np.ndarray)
+
+
+def test_restore_with_fewer_segments_removes_old_files(make_cache, audio, tmp_path):
+    cache = make_cache()
+    cache.store("今天讲个笑话吧", "从前有座山，山上有座庙", [audio, audio, audio])
+    cache.store("今天讲个笑话吧", "从前有座山", [audio])
+    audio_files = [p for p in (tmp_path / "cache").iterdir() if p.suffix == ".wav"]
+    assert len(cache.entries) == 1
+    assert [str(p) for p in audio_files] == cache.entries[next(iter(cache.entries))][
+        "audio_files"
+    ]
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+pytest.importorskip("funasr")
+pytest.importorskip("chromadb")
+
+from bailing.dialogue import Dialogue, Message
+from bailing.robot import Robot
+
+
+class FakeMemory:
+    def __init__(self, memory=""):
+        self.memory = memory
+
+    def get_memory(self):
+        return self.memory
+
+
+def make_robot(tmp_path, layout, memory=""):
+    # 只组装提示词，不创建录音、模型等组件
+    robot = Robot.__new__(Robot)
+    robot.prompt_layout = layout
+    robot.memory = FakeMemory(memory)
+    robot.dialogue = Dialogue(str(tmp_path))
+    robot._update_system_prompt()
+    return robot
+
+
+def run_turn(robot, query, rag_context="", answer="好的"):
+    if robot.prompt_layout != "cache_friendly":
+        robot._update_system_prompt(rag_context)
+    robot.dialogue.put(Message(role="user", content=query))
+    messages = robot._build_llm_dialogue(rag_context)
+    robot.dialogue.put(Message(role="assistant", content=answer))
+    return messages
+
+
+def encoded(messages):
+    return json.dumps(messages, ensure_ascii=False).encode("utf-8")
+
+
+def test_cache_friendly_prefix_is_byte_identical_across_turns(tmp_path):
+    robot = make_robot(tmp_path, "cache_friendly", memory="用户叫小明")
+    first = run_turn(robot, "第一个问题", rag_context="文档一")
+    robot.memory.memory = "用户叫小明，喜欢猫"
+    robot.dialogue.summary = "之前聊过天气"
+    second = run_turn(robot, "第二个问题", rag_context="文档二")
+    robot.dialogue.summary = "之前聊过天气和电影"
+    third = run_turn(robot, "第三个问题", rag_context="文档三")
+
+    # 上一轮请求中除最后一条用户消息外的部分，是下一轮请求的字节级前缀
+    assert encoded(second[: len(first) - 1]) == encoded(first[:-1])
+    assert encoded(third[: len(second) - 1]) == encoded(second[:-1])
+    assert len(second) - 1 == 3
+    assert "用户叫小明" not in second[0]["content"]
+    assert "文档一" not in second[0]["content"]
+    # 历史中保存的是原始问题
+    assert second[1] == {"role": "user", "content": "第一个问题"}
+
+
+def test_cache_friendly_dynamic_context_follows_history(tmp_path):
+    robot = make_robot(tmp_path, "cache_friendly", memory="用户叫小明")
+    run_turn(robot, "第一个问题")
+    robot.dialogue.summary = "之前聊过天气"
+    messages = run_turn(robot, "第二个问题", rag_context="文档二")
+
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    last = messages[-1]["content"]
+    assert last.index("用户叫小明") < last.index("之前聊过天气")
+    assert last.index("之前聊过天气") < last.index("文档二")
+    assert last.endswith("# 用户问题:\n第二个问题")
+    # 摘要不再作为系统消息插在历史之前
+    assert all("之前聊过天气" not in m["content"] for m in messages[:-1])
+
+
+def test_cache_friendly_without_dynamic_context_sends_plain_query(tmp_path):
+    robot = make_robot(tmp_path, "cache_friendly")
+    messages = run_turn(robot, "你好")
+    assert messages[-1] == {"role": "user", "content": "你好"}
+
+
+def test_legacy_layout_puts_context_in_system_prompt(tmp_path):
+    robot = make_robot(tmp_path, "legacy", memory="用户叫小明")
+    messages = run_turn(robot, "问题", rag_context="文档一")
+    assert "用户叫小明" in messages[0]["content"]
+    assert "文档一" in messages[0]["content"]
+    assert messages[-1] == {"role": "user", "content": "问题"}
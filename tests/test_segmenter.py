@@ -0,0 +1,62 @@
+import pytest
+
+from bailing.segmenter import SentenceSegmenter
+
+
+def segment(text, chunk=2, **kwargs):
+    segmenter = SentenceSegmenter(**kwargs)
+    segments = []
+    for i in range(0, len(text), chunk):
+        segments.extend(segmenter.feed(text[i : i + chunk]))
+    segments.extend(segmenter.flush())
+    return segments, segmenter
+
+
+def test_first_segment_breaks_early():
+    segments, _ = segment("好的呀，我来帮你查一下今天的天气情况。")
+    assert segments[0] == "好的呀，"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "今天的气温是 3.5 度左右。",
+        "大约有 1,000 人参加。",
+        "活动在上午 10:30 开始。",
+        "Dr. Smith said it was great.",
+        "Please visit example.com today.",
+    ],
+)
+def test_numbers_abbreviations_and_urls_do_not_split(text):
+    segments, _ = segment(text, first_min_chars=1)
+    assert segments == [text]
+
+
+def test_closing_quotes_stay_with_sentence():
+    segments, _ = segment("他说：“你好啊朋友。”然后就走了，再也没回来。", min_chars=4)
+    assert segments[0] == "他说：“你好啊朋友。”"
+
+
+def test_max_chars_cuts_at_last_soft_break():
+    text = "word " * 30
+    segments, segmenter = segment(text, chunk=5, max_chars=20)
+    assert all(len(s) <= 20 for s in segments)
+    assert "max" in [d["reason"] for d in segmenter.decisions]
+    assert " ".join(segments).split() == text.split()
+
+
+def test_punctuation_only_segments_are_dropped():
+    segments, _ = segment("你好。。。。", first_min_chars=1)
+    assert segments == ["你好。。。。"]
+    segments, _ = segment("……")
+    assert segments == []
+
+
+def test_summary_and_reset():
+    segments, segmenter = segment("你好，今天天气很好。我们出去走走吧。")
+    summary = segmenter.summary()
+    assert summary["segments"] == len(segments)
+    assert summary["reasons"][-1] in ("strong", "flush")
+    segmenter.reset()
+    assert segmenter.summary() == {"segments": 0}
+    assert segmenter.flush() == []
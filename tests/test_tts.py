@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+import uuid
+import wave
+
+import pytest
+
+from bailing.tts import AbstractTTS, CachedTTS, StreamingAudio
+from bailing.utils import CancellationToken
+
+
+def pcm_chunks(count, fail_after=None):
+    for i in range(count):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("synthesis failed")
+        yield bytes([i]) * 480
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool.wav")
+
+
+def test_stream_yields_chunks_and_spools_wav(spool):
+    stream = StreamingAudio(pcm_chunks(3), 24000, spool)
+    assert b"".join(stream) == b"".join(pcm_chunks(3))
+    assert stream.wait(2) == spool
+    with wave.open(spool, "rb") as wf:
+        assert wf.getframerate() == 24000
+        assert wf.getnframes() == 3 * 240
+    assert stream.first_chunk_time is not None
+    assert stream.duration is not None
+
+
+def test_failed_synthesis_removes_partial_spool(spool):
+    stream = StreamingAudio(pcm_chunks(3, fail_after=1), 24000, spool)
+    assert len(list(stream)) == 1
+    assert stream.wait(2) is None
+    assert isinstance(stream.error, RuntimeError)
+    assert not os.path.exists(spool)
+
+
+def test_empty_synthesis_is_an_error(spool):
+    stream = StreamingAudio(pcm_chunks(0), 24000, spool)
+    assert list(stream) == []
+    assert stream.wait(2) is None
+    assert stream.error is not None
+    assert not os.path.exists(spool)
+
+
+def test_cancelled_stream_is_discarded(spool):
+    token = CancellationToken()
+    token.cancel()
+    stream = StreamingAudio(pcm_chunks(3), 24000, spool, token)
+    assert list(stream) == []
+    assert stream.wait(2) is None
+    assert stream.error is None
+    assert not os.path.exists(spool)
+
+
+class FakeTTS(AbstractTTS):
+    def __init__(self, output_dir, voice="zh-CN-XiaoxiaoNeural"):
+        self.output_file = output_dir
+        self.voice = voice
+        # 只有简单类型的属性参与缓存键，记录调用用列表
+        self.calls = []
+
+    def to_tts(self, text):
+        self.calls.append(text)
+        time.sleep(0.05)
+        path = os.path.join(self.output_file, f"fake-{uuid.uuid4().hex}.wav")
+        with open(path, "wb") as f:
+            f.write(text.encode("utf-8") * 100)
+        return path
+
+    def to_tts_stream(self, text):
+        self.calls.append(text)
+        time.sleep(0.05)
+        yield b"\x00\x01" * 2400
+
+
+@pytest.fixture
+def backend(tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    return FakeTTS(str(output_dir))
+
+
+def make_cache(backend, tmp_path, **kwargs):
+    return CachedTTS(backend, cache_dir=str(tmp_path / "cache"), **kwargs)
+
+
+def test_cache_key_normalizes_text_and_includes_backend_params(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    assert cache.cache_key("你好，世界") == cache.cache_key("  你好,世界 ")
+    assert cache.cache_key("你好") != cache.cache_key("您好")
+    other = make_cache(FakeTTS(backend.output_file, voice="other"), tmp_path)
+    assert cache.cache_key("你好") != other.cache_key("你好")
+
+
+def test_hit_returns_a_copy_of_the_cached_audio(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    first = cache.to_tts("你好")
+    second = cache.to_tts("你好")
+    assert len(backend.calls) == 1
+    assert first != second
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
+    os.remove(second)
+    assert cache.to_tts("你好") is not None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_concurrent_misses_synthesize_once(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    threads = [
+        threading.Thread(target=cache.to_tts, args=("同一句话",)) for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(backend.calls) == 1
+    assert cache.stats()["hits"] == 3
+
+
+def test_evicts_least_recently_used(backend, tmp_path):
+    # 每条 900 字节，上限只容纳两条
+    cache = make_cache(backend, tmp_path, max_size_mb=2000 / 1024 / 1024)
+    cache.to_tts("第一句")
+    time.sleep(0.01)
+    cache.to_tts("第二句")
+    time.sleep(0.01)
+    cache.to_tts("第一句")
+    time.sleep(0.01)
+    cache.to_tts("第三句")
+    cache.flush()
+    assert cache.cache_key("第二句") not in cache.index
+    assert cache.cache_key("第一句") in cache.index
+    assert cache.cache_key("第三句") in cache.index
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_index_survives_restart(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    cache.to_tts("你好")
+    cache.flush()
+    reloaded = make_cache(backend, tmp_path)
+    assert reloaded.to_tts("你好") is not None
+    assert len(backend.calls) == 1
+
+
+def test_falls_back_to_background_copy_without_hardlinks(
+    backend, tmp_path, monkeypatch
+):
+    def no_link(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    cache = make_cache(backend, tmp_path)
+    cache.to_tts("你好")
+    cache.flush()
+    assert cache.to_tts("你好") is not None
+    assert len(backend.calls) == 1
+
+
+def test_stream_and_file_outputs_use_separate_keys(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    assert cache.cache_key("你好") != cache.cache_key("你好", "stream")
+    cache.to_tts("你好")
+    stream = cache.stream("你好")
+    assert isinstance(stream, StreamingAudio)
+    assert stream.wait(2) is not None
+    assert len(backend.calls) == 2
+
+
+def test_concurrent_stream_misses_synthesize_once(backend, tmp_path):
+    cache = make_cache(backend, tmp_path)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.stream("同一句话")))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(backend.calls) == 1
+    assert sum(isinstance(r, StreamingAudio) for r in results) == 1
+    assert cache.stats()["hits"] == 3
+
+
+def test_hit_is_copied_while_holding_the_lock(backend, tmp_path, monkeypatch):
+    cache = make_cache(backend, tmp_path)
+    cache.to_tts("你好")
+    materialize = cache._materialize
+    held = []
+
+    def check(path):
+        held.append(cache._lock.locked())
+        return materialize(path)
+
+    monkeypatch.setattr(cache, "_materialize", check)
+    assert cache.to_tts("你好") is not None
+    assert held == [True]
+
+
+class WavTTS(AbstractTTS):
+    """只实现整段合成的后端，输出 16kHz WAV"""
+
+    def __init__(self, output_dir, fail=False):
+        self.output_file = output_dir
+        self.fail = fail
+        self.files = []
+
+    def to_tts(self, text):
+        if self.fail:
+            return None
+        path = os.path.join(self.output_file, f"wav-{uuid.uuid4().hex}.wav")
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(b"\x00\x01" * 8000)
+        self.files.append(path)
+        return path
+
+
+def test_default_stream_synthesizes_then_chunks(tmp_path):
+    pytest.importorskip("pydub")
+    tts = WavTTS(str(tmp_path))
+    stream = tts.stream("你好")
+    chunks = list(stream)
+    # 0.5 秒音频重采样到 24kHz（重采样可能差几个采样点），每块 100ms
+    assert len(chunks) == 5
+    assert all(len(c) == 4800 for c in chunks[:-1])
+    assert abs(sum(len(c) for c in chunks) - 24000) <= 16
+    assert stream.wait(2) is not None
+    assert stream.error is None
+    assert not os.path.exists(tts.files[0])
+
+
+def test_default_stream_reports_synthesis_failure(tmp_path):
+    pytest.importorskip("pydub")
+    stream = WavTTS(str(tmp_path), fail=True).stream("你好")
+    assert list(stream) == []
+    assert stream.wait(2) is None
+    assert isinstance(stream.error, RuntimeError)
@@ -0,0 +1,77 @@
+import threading
+
+from bailing.utils import CancellationToken
+
+
+def test_cancel_sets_flag_once():
+    token = CancellationToken()
+    calls = []
+    token.add_callback(lambda: calls.append("a"))
+    assert not token.cancelled
+    token.cancel()
+    token.cancel()
+    assert token.cancelled
+    assert calls == ["a"]
+
+
+def test_callbacks_run_in_registration_order():
+    token = CancellationToken()
+    calls = []
+    for name in "abc":
+        token.add_callback(lambda name=name: calls.append(name))
+    token.cancel()
+    assert calls == ["a", "b", "c"]
+
+
+def test_callback_added_after_cancel_runs_immediately():
+    token = CancellationToken()
+    token.cancel()
+    calls = []
+    token.add_callback(lambda: calls.append("late"))
+    assert calls == ["late"]
+
+
+def test_failing_callback_does_not_stop_the_rest():
+    token = CancellationToken()
+    calls = []
+
+    def fail():
+        raise RuntimeError("close failed")
+
+    token.add_callback(fail)
+    token.add_callback(lambda: calls.append("after"))
+    token.cancel()
+    assert calls == ["after"]
+
+
+def test_child_tokens_follow_the_parent():
+    # 对冲请求为每个尝试创建子令牌，父令牌取消时全部取消
+    parent = CancellationToken()
+    children = [CancellationToken() for _ in range(3)]
+    for child in children:
+        parent.add_callback(child.cancel)
+
+    children[0].cancel()
+    assert not parent.cancelled
+    assert not children[1].cancelled
+
+    parent.cancel()
+    assert all(child.cancelled for child in children)
+
+
+def test_concurrent_cancel_runs_callbacks_once():
+    token = CancellationToken()
+    calls = []
+    token.add_callback(lambda: calls.append(1))
+    barrier = threading.Barrier(8)
+
+    def cancel():
+        barrier.wait()
+        token.cancel()
+
+    threads = [threading.Thread(target=cancel) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1]
@@ -0,0 +1,212 @@
+import numpy as np
+import pytest
+
+from bailing.vad import BatchedSileroVAD, EnergyGate, SpeechStateMachine
+
+WINDOW = 512
+
+
+def sine(rms, freq=100, sampling_rate=16000):
+    """低频正弦帧，过零率很低"""
+    t = np.arange(WINDOW) / sampling_rate
+    return (np.sin(2 * np.pi * freq * t) * rms * np.sqrt(2)).astype(np.int16)
+
+
+def hiss(amplitude):
+    """正负交替的帧，过零率接近 1，模拟清辅音"""
+    frame = np.full(WINDOW, amplitude, dtype=np.int16)
+    frame[1::2] = -amplitude
+    return frame
+
+
+SILENCE = np.zeros(WINDOW, dtype=np.int16)
+
+
+class TestEnergyGate:
+    def test_silence_is_gated(self):
+        gate = EnergyGate({})
+        assert gate.is_silent(SILENCE)
+        assert gate.is_silent(sine(100))
+        assert gate.skipped == 2
+
+    def test_loud_frames_pass(self):
+        gate = EnergyGate({})
+        assert not gate.is_silent(sine(3000))
+
+    def test_noise_floor_adapts_to_background(self):
+        fresh = EnergyGate({"hangover_frames": 0})
+        assert not fresh.is_silent(sine(400))
+
+        gate = EnergyGate({"hangover_frames": 0})
+        for _ in range(100):
+            assert gate.is_silent(sine(250))
+        assert gate.noise_floor == pytest.approx(250, rel=0.05)
+        # 噪声底升高后，同样的能量被视为背景噪声
+        assert gate.is_silent(sine(400))
+
+    def test_speech_does_not_raise_noise_floor(self):
+        gate = EnergyGate({"hangover_frames": 0})
+        for _ in range(20):
+            gate.is_silent(sine(3000))
+        assert gate.noise_floor == 150
+
+    def test_high_zcr_frames_pass_below_energy_threshold(self):
+        gate = EnergyGate({"hangover_frames": 0})
+        assert not gate.is_silent(hiss(250))
+        assert gate.is_silent(sine(250))
+
+    def test_hangover_after_speech(self):
+        gate = EnergyGate({"hangover_frames": 3})
+        assert not gate.is_silent(sine(3000))
+        assert [gate.is_silent(SILENCE) for _ in range(5)] == [
+            False,
+            False,
+            False,
+            True,
+            True,
+        ]
+
+    def test_reset_restores_noise_floor(self):
+        gate = EnergyGate({})
+        for _ in range(50):
+            gate.is_silent(sine(250))
+        gate.is_silent(sine(3000))
+        gate.reset_states()
+        assert gate.noise_floor == 150
+        assert gate.hangover == 0
+
+
+def run_machine(machine, probs):
+    events = []
+    for i, prob in enumerate(probs):
+        event = machine(prob, WINDOW)
+        if event is not None:
+            events.append((i, event))
+    return events
+
+
+class TestSpeechStateMachine:
+    def test_start_and_end_offsets(self):
+        # 100ms 静音 = 1600 采样，前后各补 30ms = 480 采样
+        machine = SpeechStateMachine()
+        probs = [0.1, 0.1, 0.9, 0.9] + [0.2] * 6
+        assert run_machine(machine, probs) == [
+            (2, {"start": 3 * WINDOW - 480 - WINDOW}),
+            (8, {"end": 5 * WINDOW + 480 - WINDOW}),
+        ]
+        assert not machine.triggered
+
+    def test_start_is_clamped_at_zero(self):
+        machine = SpeechStateMachine()
+        assert machine(0.9, WINDOW) == {"start": 0}
+
+    def test_hysteresis_keeps_speech_open(self):
+        # 介于 threshold - 0.15 与 threshold 之间的概率不结束语音
+        machine = SpeechStateMachine()
+        events = run_machine(machine, [0.9] + [0.4] * 20)
+        assert events == [(0, {"start": 0})]
+        assert machine.triggered
+
+    def test_short_pause_is_bridged(self):
+        machine = SpeechStateMachine()
+        probs = [0.9, 0.2, 0.2, 0.9, 0.2, 0.2, 0.2, 0.2, 0.2]
+        assert run_machine(machine, probs) == [
+            (0, {"start": 0}),
+            (8, {"end": 5 * WINDOW + 480 - WINDOW}),
+        ]
+
+    def test_reset_states(self):
+        machine = SpeechStateMachine()
+        machine(0.9, WINDOW)
+        machine.reset_states()
+        assert not machine.triggered
+        assert machine.current_sample == 0
+
+
+class FakeSileroModel:
+    """按输入帧的平均幅度给出语音概率，状态记录调用次数"""
+
+    context_size = 64
+
+    def __init__(self):
+        self.batches = []
+
+    def initial_state(self):
+        return np.zeros((2, 128), dtype=np.float32)
+
+    def __call__(self, x, state):
+        self.batches.append(x.shape[0])
+        probs = (np.abs(x[:, self.context_size :]).mean(axis=1) > 0.05).astype(
+            np.float32
+        )
+        return probs, state + 1
+
+
+class FakeBatchedVAD(BatchedSileroVAD):
+    def _load_model(self, config):
+        return FakeSileroModel()
+
+
+def loud(value=10000):
+    return np.full(WINDOW, value, dtype=np.int16)
+
+
+class TestBatchedSileroVAD:
+    def test_streams_share_one_forward_pass(self):
+        vad = FakeBatchedVAD({})
+        vad.add_stream("a")
+        vad.add_stream("b")
+        results = vad.process_batch({"a": loud(), "b": SILENCE})
+        assert vad.model.batches == [2]
+        assert results == {"a": {"start": 0}, "b": None}
+
+    def test_per_stream_state_and_context(self):
+        vad = FakeBatchedVAD({})
+        vad.add_stream("a")
+        vad.add_stream("b")
+        vad.process_batch({"a": loud(), "b": SILENCE})
+        vad.process_batch({"a": loud(12000)})
+        a, b = vad.streams["a"], vad.streams["b"]
+        assert np.all(a.state == 2)
+        assert np.all(b.state == 1)
+        assert a.context == pytest.approx(np.full(64, 12000 / 32768))
+        assert np.all(b.context == 0)
+
+    def test_events_follow_each_stream(self):
+        vad = FakeBatchedVAD({})
+        vad.add_stream("a")
+        vad.add_stream("b")
+        events = {"a": [], "b": []}
+        frames = [("a", "b")] * 3 + [("b",)] * 8
+        for i, speaking in enumerate(frames):
+            batch = {sid: loud() if sid in speaking else SILENCE for sid in "ab"}
+            for sid, event in vad.process_batch(batch).items():
+                if event is not None:
+                    events[sid].append((i, event))
+        assert events["a"] == [
+            (0, {"start": 0}),
+            (7, {"end": 4 * WINDOW + 480 - WINDOW}),
+        ]
+        assert events["b"] == [(0, {"start": 0})]
+
+    def test_gate_skips_model_and_resets_state_after_silence(self):
+        vad = FakeBatchedVAD({"pre_gate": {"enabled": True, "hangover_frames": 0}})
+        stream = vad.streams[None]
+        vad.is_vad(sine(100))
+        assert vad.model.batches == []
+        assert stream.machine.current_sample == WINDOW
+        assert stream.gated
+
+        assert vad.is_vad(loud()) == {"start": WINDOW - 480}
+        assert vad.model.batches == [1]
+        # 门限跳过之后重新从初始状态推理
+        assert np.all(stream.state == 1)
+        assert not stream.gated
+
+    def test_reset_states(self):
+        vad = FakeBatchedVAD({})
+        vad.is_vad(loud())
+        vad.reset_states()
+        stream = vad.streams[None]
+        assert np.all(stream.state == 0)
+        assert not stream.machine.triggered